@@ -6,3 +6,7 @@ class AntigenapiConfig(AppConfig):
 
     default_auto_field = "django.db.models.BigAutoField"
     name = "antigenapi"
+
+    def ready(self):
+        """Connect signal handlers."""
+        from antigenapi import signals  # noqa: F401
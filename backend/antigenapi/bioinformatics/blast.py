@@ -1,25 +1,108 @@
+import gzip
 import json
 import os
+import re
+import shutil
 import subprocess
+import tempfile
+import time
 from tempfile import TemporaryDirectory
-from typing import Optional
+from typing import Iterator, Optional
 
 import pandas as pd
-
-from antigenapi.utils.helpers import read_seqrun_results
-
-from ..models import SequencingRun
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db.models import Count, Sum
+from django.db.models.functions import Length
+
+from antigenapi.utils.cache import generation_cache_key, get_or_build
+from antigenapi.utils.helpers import (
+    iter_seqrun_results,
+    read_seqrun_results,
+    read_seqrun_results_many,
+    store_missing_airr_sequences,
+)
+
+from ..models import AirrSequence, DataGeneration, SequencingRun, SequencingRunResults
+from .align import SequenceDb, search_blast_json
 from .imgt import as_fasta_files
 
 # https://www.ncbi.nlm.nih.gov/books/NBK279684/table/appendices.T.options_common_to_all_blast/
 BLAST_FMT_MULTIPLE_FILE_BLAST_JSON = "15"
 BLAST_NUM_THREADS = 4
+BLAST_DB_NAME = "antigen.db"
+
+# Superseded BLAST databases are kept this long (seconds) after the next
+# generation is built, as other processes may still be searching them
+BLAST_DB_GRACE_PERIOD = 3600
+
+# Storage directory for full database FASTA exports
+FASTA_EXPORT_DIR = "fastaexports"
+
+# Searches up to this size (query residues x database residues) are run
+# in-process (see .align), rather than with blastp. Above about this size,
+# blastp against the stored database is faster. A full-length nanobody
+# (~130 aa) against 4,000 nanobodies is ~65M cells, ~0.25 s in-process.
+LOCAL_ALIGN_MAX_CELLS = 50_000_000
 
 # Thresholds for BLAST search results
 ALIGN_PERC_THRESHOLD = 90
 E_VALUE_THRESHOLD = 0.05
 
 
+def _fasta_records(airr_file: pd.DataFrame, query_type: str, nb_autoname_ambig):
+    """Get FASTA (name, sequence) records for sequencing results.
+
+    Args:
+        airr_file (pd.DataFrame): Sequencing results, from read_seqrun_results,
+          without records missing the query type's column
+        query_type (str): Query type - "full", "cdr3" or "cdr3_unagg"
+        nb_autoname_ambig (Iterable[str]): Nanobody autonames used by more than
+          one record in the database, which get a sequencing run suffix
+
+    Yields:
+        tuple[str, str]: Sequence name and sequence
+    """
+    if query_type == "cdr3":
+        for cdr3 in airr_file.cdr3_aa.unique():
+            yield f"CDR3: {cdr3}", cdr3
+        return
+
+    for row in airr_file.itertuples(index=False):
+        seq_name = row.nanobody_autoname
+        if seq_name in ("n/a (index not found)", "n/a (well unparseable)"):
+            # Fallback if ELISA data couldn't be matched
+            seq_name = row.sequence_id
+        if seq_name in nb_autoname_ambig:
+            seq_name += f".SR{row.sequencing_run}"
+
+        if query_type == "cdr3_unagg":
+            seq = row.cdr3_aa.replace(".", "")
+            seq_name += "[CDR3]"
+        else:
+            seq = row.sequence_alignment_aa.replace(".", "")
+        yield seq_name, seq
+
+
+def _add_fasta_record(fasta_data: dict[str, str], seq_name: str, seq: str) -> bool:
+    """Add a record to fasta_data, unless it's already there.
+
+    Raises:
+        ValueError: If fasta_data has a different sequence with the same name
+
+    Returns:
+        bool: True if the record was added
+    """
+    try:
+        if fasta_data[seq_name] != seq:
+            raise ValueError(f"Different sequences with same name! {seq_name}")
+    except KeyError:
+        fasta_data[seq_name] = seq
+        return True
+    return False
+
+
 def get_db_fasta(
     include_run: Optional[int] = None,
     query_type: str = "full",
@@ -47,11 +130,8 @@ def get_db_fasta(
     if include_run:
         airr_file = read_seqrun_results(include_run, usecols=usecols)
     else:
-        airr_file = pd.concat(
-            [
-                read_seqrun_results(seqrun, usecols=usecols)
-                for seqrun in SequencingRun.objects.values_list("pk", flat=True)
-            ]
+        airr_file = read_seqrun_results_many(
+            SequencingRun.objects.values_list("pk", flat=True), usecols=usecols
         )
 
     if not airr_file.empty:
@@ -70,31 +150,8 @@ def get_db_fasta(
             ].unique()
         )
 
-        if query_type == "cdr3":
-            cdr3s = set(airr_file.cdr3_aa.unique())
-            for cdr3 in cdr3s:
-                fasta_data[f"CDR3: {cdr3}"] = cdr3
-        else:
-            for _, row in airr_file.iterrows():
-                seq_name = row.nanobody_autoname
-                if seq_name in ("n/a (index not found)", "n/a (well unparseable)"):
-                    # Fallback if ELISA data couldn't be matched
-                    seq_name = row.sequence_id
-                if seq_name in nb_autoname_ambig:
-                    seq_name += f".SR{row.sequencing_run}"
-
-                if query_type == "cdr3_unagg":
-                    seq = row.cdr3_aa.replace(".", "")
-                    seq_name += "[CDR3]"
-                else:
-                    seq = row.sequence_alignment_aa.replace(".", "")
-                try:
-                    if fasta_data[seq_name] != seq:
-                        raise ValueError(
-                            f"Different sequences with same name! {seq_name}"
-                        )
-                except KeyError:
-                    fasta_data[seq_name] = seq
+        for seq_name, seq in _fasta_records(airr_file, query_type, nb_autoname_ambig):
+            _add_fasta_record(fasta_data, seq_name, seq)
 
     fasta_files = as_fasta_files(fasta_data, max_file_size=None)
     if fasta_files:
@@ -103,6 +160,90 @@ def get_db_fasta(
     return ""
 
 
+def iter_db_fasta(query_type: str = "full") -> Iterator[str]:
+    """Get the sequencing database in fasta format, one sequencing run at a time.
+
+    Produces the same records as get_db_fasta(query_type=query_type), without
+    holding the whole database in memory.
+
+    Args:
+        query_type (str): Query type - "full" sequence, "cdr3" (aggregate by
+          CDR3), or "cdr3_unagg" (CDR3 sequences with original labels)
+
+    Yields:
+        str: FASTA format chunks, which concatenate to the whole database
+    """
+    column = "cdr3_aa" if query_type.startswith("cdr3") else "sequence_alignment_aa"
+    usecols = ("sequence_id", column)
+
+    # Autonames must be disambiguated across the whole database up front
+    store_missing_airr_sequences(SequencingRunResults.objects.all())
+    nb_autoname_ambig = set(
+        AirrSequence.objects.filter(**{f"{column}__isnull": False})
+        .values("nanobody_autoname")
+        .annotate(n=Count("pk"))
+        .filter(n__gt=1)
+        .values_list("nanobody_autoname", flat=True)
+    )
+
+    fasta_data: dict[str, str] = {}
+    first = True
+    for _, airr_file in iter_seqrun_results(
+        SequencingRun.objects.values_list("pk", flat=True), usecols=usecols
+    ):
+        airr_file = airr_file[airr_file[column].notna()]
+
+        run_fasta_data = {
+            seq_name: seq
+            for seq_name, seq in _fasta_records(
+                airr_file, query_type, nb_autoname_ambig
+            )
+            if _add_fasta_record(fasta_data, seq_name, seq)
+        }
+        for fasta_file in as_fasta_files(run_fasta_data, max_file_size=None):
+            yield fasta_file if first else "\n" + fasta_file
+            first = False
+
+
+def get_db_fasta_file(compress: bool = False) -> str:
+    """Get the full sequence database FASTA from storage, building it if required.
+
+    Files are versioned by the sequences DataGeneration, and files from
+    older generations are removed when a new one is built.
+
+    Args:
+        compress (bool): Get a gzip compressed file
+
+    Returns:
+        str: Name of the file in default_storage
+    """
+    generation = DataGeneration.current(DataGeneration.SEQUENCES)
+    name = f"{FASTA_EXPORT_DIR}/antigenapp_database.{generation}.fasta"
+    if compress:
+        name += ".gz"
+    if default_storage.exists(name):
+        return name
+
+    with tempfile.TemporaryFile() as f:
+        if compress:
+            with gzip.GzipFile(fileobj=f, mode="wb", mtime=0) as gz:
+                for chunk in iter_db_fasta():
+                    gz.write(chunk.encode())
+        else:
+            for chunk in iter_db_fasta():
+                f.write(chunk.encode())
+        f.seek(0)
+        saved_name = default_storage.save(name, File(f))
+
+    _, filenames = default_storage.listdir(FASTA_EXPORT_DIR)
+    for filename in filenames:
+        match = re.match(r"antigenapp_database\.(\d+)[._]", filename)
+        if match and int(match.group(1)) < generation:
+            default_storage.delete(f"{FASTA_EXPORT_DIR}/{filename}")
+
+    return saved_name
+
+
 def get_sequencing_run_fasta(sequencing_run_id: int, query_type: str):
     """Get sequencing run in BLAST format.
 
@@ -141,6 +282,151 @@ def run_blastp_seq_run(
     return run_blastp(query_data, query_type, outfmt)
 
 
+def _run_blast_tool(args, cwd):
+    """Run a BLAST command line tool, raising an exception on failure."""
+    proc = subprocess.run(args, capture_output=True, cwd=cwd)
+
+    if proc.returncode != 0:
+        raise Exception(
+            f"{args[0]} returned exit code of "
+            f"{proc.returncode}\n\n"
+            f"STDOUT: {proc.stdout.decode()}\n\n"
+            f"STDERR: {proc.stderr.decode()}"
+        )
+
+
+def _remove_old_blast_dbs(type_dir: str):
+    """Delete BLAST databases superseded over BLAST_DB_GRACE_PERIOD ago.
+
+    A database is superseded when the next generation's is built (its
+    directory's modification time), so searches which started with it can
+    finish first.
+    """
+    generations = sorted(
+        int(entry) for entry in os.listdir(type_dir) if entry.isdigit()
+    )
+    now = time.time()
+    for old, new in zip(generations, generations[1:]):
+        try:
+            superseded = os.path.getmtime(os.path.join(type_dir, str(new)))
+        except OSError:
+            continue
+        if now - superseded > BLAST_DB_GRACE_PERIOD:
+            shutil.rmtree(os.path.join(type_dir, str(old)), ignore_errors=True)
+
+
+def get_blast_db(query_type: str = "full"):
+    """Get a BLAST database of all stored sequences, building it if required.
+
+    Databases are kept under settings.BLAST_DB_ROOT, versioned by the
+    sequences DataGeneration, so they are only rebuilt after results are
+    created, replaced or deleted (or their autonames change).
+
+    Args:
+        query_type (str): Query type - "full" sequence, "cdr3" (aggregate
+          by CDR3), or "cdr3_unagg" (CDR3 sequences with original labels)
+
+    Returns:
+        str or None: Database path for blastp -db, or None if the database
+          would be empty
+    """
+    generation = DataGeneration.current(DataGeneration.SEQUENCES)
+    type_dir = os.path.join(settings.BLAST_DB_ROOT, query_type)
+    db_dir = os.path.join(type_dir, str(generation))
+
+    if not os.path.isdir(db_dir):
+        db_data = get_db_fasta(query_type=query_type)
+        if not db_data:
+            return None
+
+        # Build in a scratch directory and rename into place, so concurrent
+        # workers never see a partially written database
+        os.makedirs(type_dir, exist_ok=True)
+        build_dir = tempfile.mkdtemp(prefix=".build-", dir=type_dir)
+        try:
+            with open(os.path.join(build_dir, "db.fasta"), "w") as f:
+                f.write(db_data)
+            _run_blast_tool(
+                [
+                    "makeblastdb",
+                    "-in",
+                    "db.fasta",
+                    "-dbtype",
+                    "prot",
+                    "-out",
+                    BLAST_DB_NAME,
+                ],
+                cwd=build_dir,
+            )
+            try:
+                os.rename(build_dir, db_dir)
+            except OSError:
+                # Another worker built this generation first
+                if not os.path.isdir(db_dir):
+                    raise
+        finally:
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+    _remove_old_blast_dbs(type_dir)
+
+    return os.path.join(db_dir, BLAST_DB_NAME)
+
+
+def _parse_fasta(fasta_data: str) -> list[tuple[str, str]]:
+    """Split FASTA format data into (title, sequence) records."""
+    records = []
+    for record in fasta_data.split(">")[1:]:
+        title, _, seq = record.partition("\n")
+        records.append((title.strip(), "".join(seq.split())))
+    return records
+
+
+# Process-local in-process search databases, by query type, with the
+# sequences generation they were built from
+_local_alignment_dbs: dict[str, tuple[int, SequenceDb]] = {}
+
+
+def get_local_alignment_db(query_type: str = "full") -> Optional[SequenceDb]:
+    """Get the database for in-process searches, building it if required.
+
+    Like get_blast_db, databases are rebuilt after the sequences generation
+    changes.
+
+    Args:
+        query_type (str): Query type, as for get_blast_db
+
+    Returns:
+        SequenceDb or None: The database, or None if it would be empty
+    """
+    generation = DataGeneration.current(DataGeneration.SEQUENCES)
+    cached = _local_alignment_dbs.get(query_type)
+    if cached is None or cached[0] != generation:
+        records = _parse_fasta(get_db_fasta(query_type=query_type))
+        cached = (generation, SequenceDb.from_records(records))
+        _local_alignment_dbs[query_type] = cached
+
+    db = cached[1]
+    return db if db.sequences else None
+
+
+def _db_residues(query_type: str) -> int:
+    """Get an upper bound on the residues in the search database.
+
+    Counted from the stored records, without building the database, and kept
+    in the shared cache until the sequences generation changes.
+    """
+    column = "cdr3_aa" if query_type.startswith("cdr3") else "sequence_alignment_aa"
+    content = get_or_build(
+        generation_cache_key(
+            "blast-db-residues", column, generations=(DataGeneration.SEQUENCES,)
+        ),
+        lambda: str(
+            AirrSequence.objects.aggregate(n=Sum(Length(column)))["n"] or 0
+        ).encode(),
+    )
+    return int(content)
+
+
 def run_blastp(
     query_data: str,
     query_type: str = "full",
@@ -148,57 +434,43 @@ def run_blastp(
 ):
     """Run blastp vs database.
 
+    Small searches, such as a single short query, are run in-process with the
+    same JSON output (see .align), which avoids the cost of starting blastp.
+
     Args:
-        sequencing_run_id (int): Sequencing run ID.
+        query_data (str): Query sequence(s) in FASTA format
         query_type (str): Query type - "full" sequence or "cdr3"
 
     Returns:
         str: Single file BLAST results as a string
     """
-    db_data = get_db_fasta(query_type=query_type)
-    if not db_data:
+    if outfmt == BLAST_FMT_MULTIPLE_FILE_BLAST_JSON:
+        queries = _parse_fasta(query_data)
+        query_residues = sum(len(seq) for _, seq in queries)
+        # Only build the in-process database if it's going to be searched
+        if query_residues * _db_residues(query_type) <= LOCAL_ALIGN_MAX_CELLS:
+            db = get_local_alignment_db(query_type)
+            if db is None:
+                return None
+            if query_residues * db.residues <= LOCAL_ALIGN_MAX_CELLS:
+                return search_blast_json(queries, db)
+
+    db_path = get_blast_db(query_type)
+    if db_path is None:
         return None
 
-    # Write the DB to disk as .fasta format
     with TemporaryDirectory() as tmp_dir:
-        fasta_filename = os.path.join(tmp_dir, "db.fasta")
-        with open(fasta_filename, "w") as f:
-            f.write(db_data)
-
-        # Run makeblastdb
-        mkdb_proc = subprocess.run(
-            [
-                "makeblastdb",
-                "-in",
-                "db.fasta",
-                "-dbtype",
-                "prot",
-                "-out",
-                "antigen.db",
-            ],
-            capture_output=True,
-            cwd=tmp_dir,
-        )
-
-        if mkdb_proc.returncode != 0:
-            raise Exception(
-                f"makeblastdb returned exit code of "
-                f"{mkdb_proc.returncode}\n\n"
-                f"STDOUT: {mkdb_proc.stdout.decode()}\n\n"
-                f"STDERR: {mkdb_proc.stderr.decode()}"
-            )
-
         # Write out query file
         fasta_filename = os.path.join(tmp_dir, "query.fasta")
         with open(fasta_filename, "w") as f:
             f.write(query_data)
 
         # Run blastp
-        blastp_proc = subprocess.run(
+        _run_blast_tool(
             [
                 "blastp",
                 "-db",
-                "antigen.db",
+                db_path,
                 "-query",
                 "query.fasta",
                 "-outfmt",
@@ -208,18 +480,9 @@ def run_blastp(
                 "-num_threads",
                 str(BLAST_NUM_THREADS),
             ],
-            capture_output=True,
             cwd=tmp_dir,
         )
 
-        if blastp_proc.returncode != 0:
-            raise Exception(
-                f"blastp returned exit code of "
-                f"{blastp_proc.returncode}\n\n"
-                f"STDOUT: {blastp_proc.stdout.decode()}\n\n"
-                f"STDERR: {blastp_proc.stderr.decode()}"
-            )
-
         # Read in the results file
         with open(os.path.join(tmp_dir, "antigen.results"), "r") as f:
             return f.read()
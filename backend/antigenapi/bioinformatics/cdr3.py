@@ -0,0 +1,236 @@
+from collections.abc import Iterable, Sequence
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from antigenapi.models import Clonotype, DataGeneration
+
+HAMMING = "hamming"
+LEVENSHTEIN = "levenshtein"
+METRICS = (HAMMING, LEVENSHTEIN)
+# Largest distance for API searches; short CDR3s match almost anything beyond it
+MAX_CDR3_DISTANCE = 3
+
+# Pairs of CDR3s compared at once when clustering
+_CLUSTER_BLOCK_SIZE = 1 << 22
+
+
+def _encode(sequence: str) -> np.ndarray:
+    return np.frombuffer(sequence.upper().encode("ascii", "replace"), np.uint8)
+
+
+class Cdr3Hit(NamedTuple):
+    """A CDR3 within the distance limit of a query."""
+
+    cdr3_aa: str
+    distance: int
+
+
+class Cdr3Index:
+    """CDR3 sequences bucketed by length, for vectorised neighbour searches.
+
+    Each bucket holds its sequences as one (sequences, length) byte array, so
+    a search compares the query against a whole bucket at once, and only
+    visits buckets whose lengths are close enough to the query's to match.
+    """
+
+    def __init__(self, sequences: Iterable[str]):
+        by_length: dict[int, list[str]] = {}
+        for seq in sequences:
+            by_length.setdefault(len(seq), []).append(seq.upper())
+        self._sequences = by_length
+        self._codes = {
+            length: np.frombuffer(
+                "".join(seqs).encode("ascii", "replace"), np.uint8
+            ).reshape(len(seqs), length)
+            for length, seqs in by_length.items()
+        }
+
+    def __len__(self):  # noqa: D105
+        return sum(len(seqs) for seqs in self._sequences.values())
+
+    def search(
+        self, query: str, max_distance: int, metric: str = HAMMING
+    ) -> list[Cdr3Hit]:
+        """Find the CDR3s within a distance of a query.
+
+        Args:
+            query (str): Query CDR3 amino acid sequence (case insensitive)
+            max_distance (int): Largest distance to include
+            metric (str): "hamming" (substitutions only, so same length
+              sequences) or "levenshtein" (substitutions, insertions and
+              deletions)
+
+        Returns:
+            list[Cdr3Hit]: Hits, in order of distance then sequence
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        q = _encode(query)
+        # Insertions and deletions allow lengths up to max_distance different
+        slack = max_distance if metric == LEVENSHTEIN else 0
+        lengths = range(max(0, len(q) - slack), len(q) + slack + 1)
+
+        hits: list[Cdr3Hit] = []
+        for length in lengths:
+            codes = self._codes.get(length)
+            if codes is None:
+                continue
+            if metric == HAMMING:
+                rows, distances = self._hamming(q, codes, max_distance)
+            else:
+                rows, distances = self._levenshtein(q, codes, max_distance)
+            seqs = self._sequences[length]
+            hits.extend(
+                Cdr3Hit(seqs[row], dist)
+                for row, dist in zip(rows.tolist(), distances.tolist())
+            )
+        hits.sort(key=lambda hit: (hit.distance, hit.cdr3_aa))
+        return hits
+
+    @staticmethod
+    def _hamming(q: np.ndarray, codes: np.ndarray, max_distance: int):
+        distances = (codes != q).sum(axis=1)
+        (rows,) = np.nonzero(distances <= max_distance)
+        return rows, distances[rows]
+
+    @staticmethod
+    def _levenshtein(q: np.ndarray, codes: np.ndarray, max_distance: int):
+        # Wagner-Fischer, one query residue at a time over the whole bucket.
+        # Insertions within a row are a running minimum of (D[j] - j) + j.
+        length = codes.shape[1]
+        offsets = np.arange(length + 1, dtype=np.int16)
+        rows = np.arange(len(codes))
+        prev = np.broadcast_to(offsets, (len(codes), length + 1))
+        for i, residue in enumerate(q, start=1):
+            cur = np.empty_like(prev)
+            cur[:, 0] = i
+            np.minimum(
+                prev[:, :-1] + (codes != residue), prev[:, 1:] + 1, out=cur[:, 1:]
+            )
+            cur = np.minimum.accumulate(cur - offsets, axis=1) + offsets
+            # Distances never drop below a row's minimum, so sequences that
+            # are already too far away can be dropped
+            keep = cur.min(axis=1) <= max_distance
+            if not keep.all():
+                rows, codes, cur = rows[keep], codes[keep], cur[keep]
+            prev = cur
+        distances = prev[:, length]
+        keep = distances <= max_distance
+        return rows[keep], distances[keep]
+
+
+def cluster_cdr3s(
+    sequences: Sequence[str],
+    identity: float,
+    keys: Sequence[int],
+    clusters: Optional[Sequence[Optional[int]]] = None,
+) -> list[int]:
+    """Single-linkage clustering of CDR3s into clonal families.
+
+    CDR3s are linked when they are the same length and at least a fraction
+    identity of their residues match; clusters are the connected groups of
+    linked CDR3s. Each length bucket is compared in blocks of vectorised
+    pairwise comparisons.
+
+    Clustering can be incremental: CDR3s with an existing cluster are only
+    compared with unclustered ones. That gives the same clusters as starting
+    afresh, as long as the existing clusters are from the same identity and
+    any cluster which has lost a CDR3 since is unclustered in full.
+
+    Args:
+        sequences (Sequence[str]): CDR3 amino acid sequences
+        identity (float): Smallest fraction of identical residues to link CDR3s
+        keys (Sequence[int]): Unique key of each CDR3, used for new cluster IDs
+        clusters (Sequence[Optional[int]], optional): Existing cluster of each
+          CDR3, or None to cluster it. All CDR3s are clustered if not given.
+
+    Returns:
+        list[int]: Cluster of each CDR3. Clusters containing existing ones take
+          the smallest existing cluster ID, otherwise the smallest key.
+    """
+    if clusters is None:
+        clusters = [None] * len(sequences)
+    parent = list(range(len(sequences)))
+
+    def _find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def _union(i, j):
+        i, j = _find(i), _find(j)
+        if i != j:
+            parent[max(i, j)] = min(i, j)
+
+    # Members of an existing cluster are already linked
+    cluster_members: dict[int, int] = {}
+    for i, cluster in enumerate(clusters):
+        if cluster is not None:
+            _union(i, cluster_members.setdefault(cluster, i))
+
+    by_length: dict[int, list[int]] = {}
+    for i, seq in enumerate(sequences):
+        by_length.setdefault(len(seq), []).append(i)
+
+    for length, members in by_length.items():
+        unclustered = np.array(
+            [row for row, i in enumerate(members) if clusters[i] is None],
+            dtype=np.intp,
+        )
+        if not len(unclustered):
+            continue
+        max_mismatches = int(length * (1 - identity) + 1e-9)
+        # One row per position, so each residue compares contiguous memory
+        codes = np.ascontiguousarray(
+            np.frombuffer(
+                "".join(sequences[i] for i in members)
+                .upper()
+                .encode("ascii", "replace"),
+                np.uint8,
+            )
+            .reshape(len(members), length)
+            .T
+        )
+        dtype = np.uint8 if length < 256 else np.uint16
+        block = max(1, _CLUSTER_BLOCK_SIZE // len(members))
+        for start in range(0, len(unclustered), block):
+            rows = unclustered[start : start + block]
+            mismatches = np.zeros((len(rows), len(members)), dtype=dtype)
+            for position in codes:
+                mismatches += position[rows, None] != position
+            row_idx, col_idx = np.nonzero(mismatches <= max_mismatches)
+            for row, col in zip(rows[row_idx].tolist(), col_idx.tolist()):
+                _union(members[row], members[col])
+
+    # Prefer existing cluster IDs, then keys
+    labels: dict[int, tuple[int, int]] = {}
+    roots = [_find(i) for i in range(len(sequences))]
+    for i, root in enumerate(roots):
+        cluster = clusters[i]
+        label = (0, cluster) if cluster is not None else (1, keys[i])
+        labels[root] = min(labels.get(root, label), label)
+    return [labels[root][1] for root in roots]
+
+
+# Process-local CDR3 index, by the sequences generation it was built from
+_cdr3_indexes: dict[int, Cdr3Index] = {}
+
+
+def get_cdr3_index() -> Cdr3Index:
+    """Get the index of all clonotype CDR3s, building it if required.
+
+    Like the BLAST databases, the index is rebuilt after the sequences
+    generation changes.
+
+    Returns:
+        Cdr3Index: Index of Clonotype CDR3s
+    """
+    generation = DataGeneration.current(DataGeneration.SEQUENCES)
+    index = _cdr3_indexes.get(generation)
+    if index is None:
+        index = Cdr3Index(Clonotype.objects.values_list("cdr3_aa", flat=True))
+        _cdr3_indexes.clear()
+        _cdr3_indexes[generation] = index
+    return index
@@ -1,12 +1,18 @@
+import collections
+import hashlib
 import io
 import itertools
 import os
 import re
 import sys
+import threading
 import time
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
 
 import pandas as pd
+import pyarrow.parquet as pq
 import requests
 from lxml import etree
 
@@ -23,6 +29,13 @@ def file_name_to_sequence_name(fn):
     return fn
 
 
+_DELETE_NUCLEOTIDES = str.maketrans("", "", "ACGTN")
+
+
+class SequenceFileError(ValueError):
+    """An uploaded sequence file can't be used."""
+
+
 def trim_sequence(seq):
     """Trim the sequence after start codon, if present."""
     if seq.startswith(">"):
@@ -32,10 +45,10 @@ def trim_sequence(seq):
         raise ValueError("File contains multiple sequences")
 
     # Remove whitespace, move to upper case
-    seq = re.sub(r"\s+", "", seq.upper())
+    seq = "".join(seq.upper().split())
 
     # Check codons
-    if not re.match("^[ACGTN]*$", seq):
+    if seq.translate(_DELETE_NUCLEOTIDES):
         raise ValueError("Sequence should only contain A,C,G,T,N")
 
     # Trim from start codon
@@ -47,30 +60,90 @@ def trim_sequence(seq):
     return seq
 
 
-def _load_sequences_zip(zip_file):
-    seq_data = {}
+def zip_sequence_members(zip_file):
+    """Map sequence names to the sequence files in a .zip, without reading them.
+
+    Only the .zip's central directory is read, so well names can be checked
+    before any file is decompressed.
+
+    Args:
+        zip_file: Path or file object of the .zip file
+
+    Returns:
+        dict[str, str]: .zip member names by sequence name, in .zip order
+    """
     with zipfile.ZipFile(zip_file, "r") as zip_ref:
-        for fn in zip_ref.namelist():
-            if not fn.endswith(SUFFIXES) or fn.startswith("__MACOSX"):
-                continue
+        return sequence_members(zip_ref.namelist())
 
-            # Convert the file name to a short sequence identifier
-            seq_name = os.path.basename(file_name_to_sequence_name(fn))
 
-            # Read the .seq file
+def sequence_members(filenames):
+    """Map sequence names to the sequence files among some .zip member names.
+
+    Args:
+        filenames (Iterable[str]): .zip member names
+
+    Returns:
+        dict[str, str]: .zip member names by sequence name
+    """
+    return {
+        # Convert the file name to a short sequence identifier
+        os.path.basename(file_name_to_sequence_name(fn)): fn
+        for fn in filenames
+        if fn.endswith(SUFFIXES) and not fn.startswith("__MACOSX")
+    }
+
+
+def iter_zip_sequences(zip_file, members=None, max_workers=4):
+    """Read and trim the sequence files in a .zip, as they are needed.
+
+    Files are decompressed and trimmed on a thread pool, a few ahead of the
+    consumer, so sequences can be used while later files are still read.
+
+    Args:
+        zip_file: Path or file object of the .zip file
+        members (dict[str, str], optional): .zip member names by sequence name,
+          from zip_sequence_members; read from the .zip if not given
+        max_workers (int): Files read at once
+
+    Yields:
+        tuple[str, str]: Sequence name and trimmed sequence, in .zip order
+
+    Raises:
+        SequenceFileError: If a sequence file is invalid
+    """
+    with zipfile.ZipFile(zip_file, "r") as zip_ref:
+        if members is None:
+            members = sequence_members(zip_ref.namelist())
+
+        def _read(fn):
+            # Member reads share the .zip's file handle under a lock;
+            # decompressing and trimming run in parallel
             with zip_ref.open(fn, "r") as f:
                 seq = f.read().decode("utf-8")
-
-            # Trim the sequence
             try:
-                seq = trim_sequence(seq)
+                return trim_sequence(seq)
             except ValueError as e:
-                raise ValueError(f"File {fn}: {str(e)}")
+                raise SequenceFileError(f"File {fn}: {str(e)}")
 
-            # Add to dictionary of sequences
-            seq_data[seq_name] = seq
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            pending = collections.deque()
+            names = iter(members.items())
+            try:
+                for name, fn in itertools.islice(names, max_workers * 2):
+                    pending.append((name, pool.submit(_read, fn)))
+                while pending:
+                    name, future = pending.popleft()
+                    seq = future.result()
+                    for next_name, next_fn in itertools.islice(names, 1):
+                        pending.append((next_name, pool.submit(_read, next_fn)))
+                    yield name, seq
+            finally:
+                for _, future in pending:
+                    future.cancel()
 
-    return seq_data
+
+def _load_sequences_zip(zip_file):
+    return dict(iter_zip_sequences(zip_file))
 
 
 def load_sequences(directory_or_zip):
@@ -125,50 +198,148 @@ def as_fasta_files(seq_data, max_file_size=50):
     return fasta_files
 
 
+def as_fasta_records(sequences):
+    """Convert sequence names and data to FASTA records, as they are needed.
+
+    Like as_fasta_files, sequences which are empty (no start codon) are left
+    out.
+
+    Args:
+        sequences (Iterable[tuple[str, str]]): Sequence names and sequences
+
+    Yields:
+        str: A FASTA record for each non-empty sequence
+    """
+    for name, seq in sequences:
+        if seq:
+            yield f"> {name}\n{seq}"
+
+
 _VQUEST_URL = "https://www.imgt.org/IMGT_vquest/analysis"
 _VQUEST_BATCH_SIZE = 50  # V-QUEST limit per request
 _VQUEST_TIMEOUT = (10, 120)  # (connect timeout, read timeout) in seconds
 
 
-def run_vquest(fasta_data, species="alpaca", receptor="IG", molecule_type="Unknown"):
-    """Submit FASTA sequences to the IMGT/V-QUEST web service and return results."""
-    records = [r for r in re.split(r"\n(?=>)", fasta_data) if r.strip()]
-    if not records:
-        raise ValueError("No sequences supplied")
+class _TokenBucket:
+    """A thread-safe token bucket, limiting how often requests are started."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, waiting for one to become available if necessary."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._last) * self.rate
+                )
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _submit_vquest_batch(data):
+    """POST one batch of sequences to V-QUEST, and return the files in its zip."""
+    response = requests.post(_VQUEST_URL, data=data, timeout=_VQUEST_TIMEOUT)
+    response.raise_for_status()
+    if "text/html" in response.headers.get("Content-Type", ""):
+        tree = etree.fromstring(response.content, etree.HTMLParser())
+        errors = [
+            e.strip()
+            for e in tree.xpath("//div[contains(@class,'form_error')]/text()")
+            if e.strip()
+        ]
+        raise ValueError(
+            "; ".join(errors) or "IMGT/V-QUEST returned an unexpected HTML response"
+        )
+    try:
+        with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
+            return {name: zf.read(name) for name in zf.namelist()}
+    except zipfile.BadZipFile:
+        raise ValueError("V-QUEST returned an unexpected non-ZIP response")
 
-    outputs = []
-    for i in range(0, len(records), _VQUEST_BATCH_SIZE):
-        if i > 0:
-            time.sleep(1)  # respect IMGT rate limits between batches
-        response = requests.post(
-            _VQUEST_URL,
-            data={
+
+class VquestCacheEntry(NamedTuple):
+    """The V-QUEST output for a single sequence."""
+
+    airr_header: str
+    airr_row: str
+    parameters: str
+
+
+def vquest_cache_key(sequence, species, receptor, molecule_type):
+    """Content-addressed cache key for the V-QUEST result of a sequence."""
+    return hashlib.sha256(
+        "\t".join((species, receptor, molecule_type, sequence.upper())).encode()
+    ).hexdigest()
+
+
+def _split_fasta_record(record):
+    """Split a FASTA record into its name and sequence."""
+    header, _, sequence = record.partition("\n")
+    return header.lstrip(">").strip(), re.sub(r"\s+", "", sequence)
+
+
+def _airr_row_with_id(entry: VquestCacheEntry, header, sequence_id):
+    """Map a cached AIRR row onto header's columns, with a new sequence_id."""
+    row = dict(zip(entry.airr_header.split("\t"), entry.airr_row.split("\t")))
+    row["sequence_id"] = sequence_id
+    return "\t".join(row.get(column, "") for column in header.split("\t"))
+
+
+def _run_vquest_records(
+    records, species, receptor, molecule_type, max_workers, requests_per_second
+):
+    """Submit FASTA records to V-QUEST in batches, and merge the results.
+
+    Each batch is submitted as soon as it is full, so V-QUEST works on early
+    batches while later records are still being produced.
+
+    Returns:
+        dict[str, str] or None: Merged results, or None if there were no records
+    """
+    rate_limit = _TokenBucket(requests_per_second)
+
+    def submit(batch):
+        rate_limit.acquire()
+        return _submit_vquest_batch(
+            {
                 "inputType": "inline",
                 "species": species,
                 "receptorOrLocusType": receptor,
                 "moleculeType": molecule_type,
-                "sequences": "\n".join(records[i : i + _VQUEST_BATCH_SIZE]),
+                "sequences": "\n".join(batch),
                 "resultType": "excel",
                 "xv_outputtype": 3,
-            },
-            timeout=_VQUEST_TIMEOUT,
+            }
         )
-        response.raise_for_status()
-        if "text/html" in response.headers.get("Content-Type", ""):
-            tree = etree.fromstring(response.content, etree.HTMLParser())
-            errors = [
-                e.strip()
-                for e in tree.xpath("//div[contains(@class,'form_error')]/text()")
-                if e.strip()
-            ]
-            raise ValueError(
-                "; ".join(errors) or "IMGT/V-QUEST returned an unexpected HTML response"
-            )
-        try:
-            with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
-                outputs.append({name: zf.read(name) for name in zf.namelist()})
-        except zipfile.BadZipFile:
-            raise ValueError("V-QUEST returned an unexpected non-ZIP response")
+
+    pool = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    futures = []
+    try:
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) == _VQUEST_BATCH_SIZE:
+                futures.append(pool.submit(submit, batch))
+                batch = []
+        if batch:
+            futures.append(pool.submit(submit, batch))
+        # Collect in batch order, whichever order they complete in
+        outputs = [future.result() for future in futures]
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    if not outputs:
+        return None
 
     try:
         result = {
@@ -190,6 +361,127 @@ def run_vquest(fasta_data, species="alpaca", receptor="IG", molecule_type="Unkno
     return result
 
 
+def _batched(iterable, size):
+    it = iter(iterable)
+    while batch := list(itertools.islice(it, size)):
+        yield batch
+
+
+def run_vquest(
+    fasta_data,
+    species="alpaca",
+    receptor="IG",
+    molecule_type="Unknown",
+    max_workers=1,
+    requests_per_second=1.0,
+    cache=None,
+):
+    """Submit FASTA sequences to the IMGT/V-QUEST web service and return results.
+
+    Sequences are sent in batches of 50 (the V-QUEST limit per request). Each
+    batch is sent as soon as it is full, so given an iterable of records, such
+    as from as_fasta_records, V-QUEST starts work before the last is read.
+
+    Args:
+        fasta_data (str or Iterable[str]): FASTA sequences, or FASTA records
+        species (str): V-QUEST species
+        receptor (str): V-QUEST receptor or locus type
+        molecule_type (str): V-QUEST molecule type
+        max_workers (int): Maximum number of batches in flight at once
+        requests_per_second (float): Maximum rate at which batches are
+          submitted, to respect IMGT's rate limits
+        cache (optional): Per-sequence result cache, keyed by vquest_cache_key.
+          Must provide get_many(keys), returning a dict of VquestCacheEntry
+          by key, and set_many(entries), taking the same. Only sequences
+          not in the cache are submitted to V-QUEST.
+
+    Returns:
+        dict[str, str]: Parameters.txt and vquest_airr.tsv file contents, with
+          AIRR records in input order. With a cache, records whose
+          sequence_id V-QUEST changed come last, and aren't cached.
+    """
+    if isinstance(fasta_data, str):
+        records = [r for r in re.split(r"\n(?=>)", fasta_data) if r.strip()]
+    else:
+        records = (r for r in fasta_data if r.strip())
+
+    if cache is None:
+        result = _run_vquest_records(
+            records, species, receptor, molecule_type, max_workers, requests_per_second
+        )
+        if result is None:
+            raise ValueError("No sequences supplied")
+        return result
+
+    names_keys = []
+    entries = {}
+    # Each uncached sequence is submitted once, even if it appears more than once
+    misses = {}
+
+    def _uncached_records():
+        # Check the cache a batch at a time, passing on misses as they're found
+        for batch in _batched(records, _VQUEST_BATCH_SIZE):
+            batch_keys = []
+            for record in batch:
+                name, sequence = _split_fasta_record(record)
+                batch_keys.append(
+                    (name, vquest_cache_key(sequence, species, receptor, molecule_type))
+                )
+            names_keys.extend(batch_keys)
+            entries.update(
+                cache.get_many({key for _, key in batch_keys} - entries.keys())
+            )
+            for record, (name, key) in zip(batch, batch_keys):
+                if key not in entries and key not in misses:
+                    misses[key] = (name, record)
+                    yield record
+
+    fresh = _run_vquest_records(
+        _uncached_records(),
+        species,
+        receptor,
+        molecule_type,
+        max_workers,
+        requests_per_second,
+    )
+    if not names_keys:
+        raise ValueError("No sequences supplied")
+
+    # Rows V-QUEST returned under a name which wasn't submitted, passed on
+    # uncached as they would be without the cache
+    unmatched_rows = []
+    if fresh is not None:
+        parameters = fresh["Parameters.txt"]
+        airr_header, *fresh_rows = fresh["vquest_airr.tsv"].splitlines()
+        id_col = airr_header.split("\t").index("sequence_id")
+        rows_by_name = {row.split("\t")[id_col]: row for row in fresh_rows}
+        new_entries = {
+            key: VquestCacheEntry(airr_header, rows_by_name[name], parameters)
+            for key, (name, _) in misses.items()
+            if name in rows_by_name
+        }
+        cache.set_many(new_entries)
+        entries.update(new_entries)
+        miss_names = {name for name, _ in misses.values()}
+        unmatched_rows = [
+            row for name, row in rows_by_name.items() if name not in miss_names
+        ]
+    else:
+        first_entry = entries[names_keys[0][1]]
+        airr_header = first_entry.airr_header
+        parameters = first_entry.parameters
+
+    airr_rows = [
+        _airr_row_with_id(entries[key], airr_header, name)
+        for name, key in names_keys
+        if key in entries
+    ] + unmatched_rows
+    return {
+        "Parameters.txt": parameters,
+        "vquest_airr.tsv": "\n".join([airr_header] + airr_rows) + "\n",
+    }
+
+
 AIRR_IMPORTANT_COLUMNS = (
     "sequence_id",
     "productive",
@@ -204,10 +496,78 @@ AIRR_IMPORTANT_COLUMNS = (
 )
 
 
+_AIRR_READ_CHUNK_SIZE = 1 << 20  # bytes read and cleaned at a time
+
+
+class _StrippedLinesReader(io.RawIOBase):
+    """Binary stream of a file's lines, with surrounding whitespace removed.
+
+    The file is read and cleaned a chunk at a time, so the cleaned contents
+    are never held in memory all at once.
+    """
+
+    def __init__(self, f, chunk_size=_AIRR_READ_CHUNK_SIZE):
+        self._chunks = self._stripped_chunks(f, chunk_size)
+        self._pending = memoryview(b"")
+
+    @staticmethod
+    def _stripped_chunks(f, chunk_size):
+        partial_line = b""
+        while chunk := f.read(chunk_size):
+            lines = (partial_line + chunk).split(b"\n")
+            partial_line = lines.pop()
+            if lines:
+                yield b"\n".join(line.strip() for line in lines) + b"\n"
+        if partial_line:
+            yield partial_line.strip() + b"\n"
+
+    def readable(self):  # noqa: D102
+        return True
+
+    def readinto(self, buffer):  # noqa: D102
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(chunk)
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+
 def read_airr_file(airr_file, usecols=AIRR_IMPORTANT_COLUMNS):
     """Read an AIRR file into a pandas dataframe."""
     # Clean up the CSVs! They seem to have an extra tab in some cases.
-    buffer = io.StringIO(
-        "\n".join(line.strip() for line in airr_file.read().decode("utf8").split("\n"))
-    )
-    return pd.read_csv(buffer, sep="\t", header=0, usecols=usecols)
+    buffer = io.BufferedReader(_StrippedLinesReader(airr_file))
+    return pd.read_csv(buffer, sep="\t", header=0, usecols=usecols, encoding="utf8")
+
+
+def write_airr_sidecar(airr_df):
+    """Serialise a parsed AIRR dataframe as a columnar (Parquet) sidecar.
+
+    Args:
+        airr_df (pd.DataFrame): AIRR file contents, as read by read_airr_file
+
+    Returns:
+        bytes: Parquet file contents
+    """
+    buffer = io.BytesIO()
+    airr_df.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+def read_airr_sidecar(sidecar_file, usecols=AIRR_IMPORTANT_COLUMNS):
+    """Read a columnar (Parquet) AIRR sidecar into a pandas dataframe.
+
+    Only the requested columns are read from the file. Columns are returned
+    in file order, matching read_airr_file.
+    """
+    parquet_file = pq.ParquetFile(sidecar_file)
+    columns = parquet_file.schema_arrow.names
+    if usecols is not None:
+        missing = set(usecols) - set(columns)
+        if missing:
+            raise ValueError(f"Usecols do not match columns, missing: {missing}")
+        columns = [c for c in columns if c in usecols]
+    return parquet_file.read(columns=columns).to_pandas()
@@ -0,0 +1,179 @@
+"""Unit tests for in-process local alignment, checked against a reference."""
+
+import json
+import random
+import time
+
+import pytest
+
+from antigenapi.bioinformatics import blast
+from antigenapi.bioinformatics.align import (
+    _MATRIX,
+    ALPHABET,
+    GAP_EXTEND,
+    GAP_OPEN,
+    SequenceDb,
+    align,
+    local_alignment_scores,
+    search_blast_json,
+)
+
+_AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+
+
+def _substitution(a, b):
+    return int(_MATRIX[ALPHABET.index(a), ALPHABET.index(b)])
+
+
+def _reference_score(query, target):
+    # Textbook Gotoh local alignment, one cell at a time
+    open_cost, neg_inf = GAP_OPEN + GAP_EXTEND, float("-inf")
+    H = [[0] * (len(target) + 1) for _ in range(len(query) + 1)]
+    E = [[neg_inf] * (len(target) + 1) for _ in range(len(query) + 1)]
+    F = [[neg_inf] * (len(target) + 1) for _ in range(len(query) + 1)]
+    best = 0
+    for i in range(1, len(query) + 1):
+        for j in range(1, len(target) + 1):
+            E[i][j] = max(H[i][j - 1] - open_cost, E[i][j - 1] - GAP_EXTEND)
+            F[i][j] = max(H[i - 1][j] - open_cost, F[i - 1][j] - GAP_EXTEND)
+            H[i][j] = max(
+                0,
+                H[i - 1][j - 1] + _substitution(query[i - 1], target[j - 1]),
+                E[i][j],
+                F[i][j],
+            )
+            best = max(best, H[i][j])
+    return best
+
+
+def _alignment_score(qseq, hseq):
+    score, gap = 0, None
+    for q, h in zip(qseq, hseq):
+        if "-" in (q, h):
+            side = "q" if q == "-" else "h"
+            score -= GAP_EXTEND if gap == side else GAP_OPEN + GAP_EXTEND
+            gap = side
+        else:
+            score += _substitution(q, h)
+            gap = None
+    return score
+
+
+def _mutate(rng, seq, n):
+    seq = list(seq)
+    for _ in range(n):
+        pos = rng.randrange(len(seq))
+        r = rng.random()
+        if r < 0.6:
+            seq[pos] = rng.choice(_AMINO_ACIDS)
+        elif r < 0.8:
+            del seq[pos]
+        else:
+            seq.insert(pos, rng.choice(_AMINO_ACIDS))
+    return "".join(seq)
+
+
+def _random_db(rng, n, length=60):
+    base = "".join(rng.choice(_AMINO_ACIDS) for _ in range(length))
+    return base, [_mutate(rng, base, rng.randint(0, 15)) for _ in range(n)]
+
+
+def test_scores_and_alignments_match_reference():
+    rng = random.Random(0)
+    base, targets = _random_db(rng, 40)
+    targets += ["W", "CARDYW", "".join(rng.choice(_AMINO_ACIDS) for _ in range(90))]
+    db = SequenceDb.from_records([(str(i), t) for i, t in enumerate(targets)])
+
+    for query in (base[5:40], "CARDY", _mutate(rng, base, 10)):
+        scores = local_alignment_scores(query, db)
+        for target, score in zip(targets, scores):
+            assert score == _reference_score(query, target)
+
+            aln = align(query, target)
+            assert aln.score == score
+            assert _alignment_score(aln.qseq, aln.hseq) == score
+            assert aln.qseq.replace("-", "") == query[aln.query_from - 1 : aln.query_to]
+            assert aln.hseq.replace("-", "") == target[aln.hit_from - 1 : aln.hit_to]
+
+
+def test_align_reports_blast_style_alignment():
+    aln = align("QVQLVESGGG", "XXQVKLVESGGGXX")
+
+    assert (aln.qseq, aln.hseq) == ("QVQLVESGGG", "QVKLVESGGG")
+    assert aln.midline == "QV+LVESGGG"
+    assert (aln.query_from, aln.query_to, aln.hit_from, aln.hit_to) == (1, 10, 3, 12)
+    assert (aln.identity, aln.positive, aln.gaps) == (9, 10, 0)
+
+    # A gap is opened when it's cheaper than the mismatches
+    aln = align("WWWWCCCCWWWW", "WWWWCCCCAWWWW")
+    assert (aln.qseq, aln.hseq) == ("WWWWCCCC-WWWW", "WWWWCCCCAWWWW")
+    assert aln.midline == "WWWWCCCC WWWW"
+    assert aln.gaps == 1
+
+
+def test_search_blast_json_is_parsed_like_blastp_output():
+    db = SequenceDb.from_records(
+        [("NB1", "QVQLVESGGGLVQAGGSLRLSCAASG"), ("NB2", "WWWWWWWW")]
+    )
+    blast_str = search_blast_json([("QuerySequence", "QVQLVESGGGLVQ")], db)
+
+    hits = json.loads(blast_str)["BlastOutput2"][0]["report"]["results"]["search"]
+    assert hits["query_len"] == 13
+    assert [h["description"][0]["title"] for h in hits["hits"]] == ["NB1"]
+
+    (res,) = blast.parse_blast_results(blast_str, "full")
+    assert res["subject_title"] == "NB1"
+    assert res["query_seq"] == res["subject_seq"] == "QVQLVESGGGLVQ"
+    assert res["align_perc"] == res["ident_perc"] == 100
+    assert res["e_value"] < 1e-3
+
+
+def test_run_blastp_runs_small_searches_in_process(monkeypatch):
+    monkeypatch.setattr(
+        blast.DataGeneration, "current", classmethod(lambda cls, name: 1)
+    )
+    monkeypatch.setattr(blast, "_db_residues", lambda query_type: 14)
+    monkeypatch.setattr(
+        blast, "get_db_fasta", lambda query_type: "> NB1\nQVQLVESGGG\n> NB2\nWWWW\n"
+    )
+
+    def _no_blast(query_type):
+        raise AssertionError("blastp used for a small search")
+
+    monkeypatch.setattr(blast, "get_blast_db", _no_blast)
+
+    results = json.loads(blast.run_blastp("> Q\nQVQLVESGGG", "full"))
+    (hit,) = results["BlastOutput2"][0]["report"]["results"]["search"]["hits"]
+    assert hit["description"][0]["title"] == "NB1"
+
+
+def test_run_blastp_uses_blast_for_large_searches(monkeypatch):
+    monkeypatch.setattr(
+        blast.DataGeneration, "current", classmethod(lambda cls, name: 1)
+    )
+    monkeypatch.setattr(blast, "_db_residues", lambda query_type: 10)
+    monkeypatch.setattr(blast, "LOCAL_ALIGN_MAX_CELLS", 50)
+    monkeypatch.setattr(blast, "get_blast_db", lambda query_type: None)
+
+    def _no_local_db(query_type):
+        raise AssertionError("In-process database built for a large search")
+
+    monkeypatch.setattr(blast, "get_local_alignment_db", _no_local_db)
+
+    assert blast.run_blastp("> Q\nQVQLVESGGG", "full") is None
+
+
+@pytest.mark.benchmark
+def test_benchmark_local_search():
+    rng = random.Random(0)
+    base, targets = _random_db(rng, 20_000, length=125)
+    db = SequenceDb.from_records([(f"NB{i}", t) for i, t in enumerate(targets)])
+
+    for query in (base[95:110], base):
+        start = time.perf_counter()
+        search_blast_json([("QuerySequence", query)], db)
+        elapsed = time.perf_counter() - start
+        print(
+            f"\nSearch {len(query)} aa query vs {len(targets)} sequences: "
+            f"{elapsed * 1000:.0f} ms"
+        )
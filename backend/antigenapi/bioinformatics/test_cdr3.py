@@ -0,0 +1,179 @@
+"""Unit tests for CDR3 neighbour searches, checked against a reference."""
+
+import random
+import time
+
+import pytest
+
+from antigenapi.bioinformatics.cdr3 import Cdr3Hit, Cdr3Index, cluster_cdr3s
+
+_AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+
+
+def _reference_levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(
+                min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            )
+        previous = current
+    return previous[-1]
+
+
+def _reference_hamming(a, b):
+    if len(a) != len(b):
+        return None
+    return sum(ca != cb for ca, cb in zip(a, b))
+
+
+def _random_cdr3s(rng, n, lengths=(8, 16)):
+    return list(
+        {
+            "".join(rng.choices(_AMINO_ACIDS[:6], k=rng.randint(*lengths)))
+            for _ in range(n)
+        }
+    )
+
+
+@pytest.mark.parametrize("max_distance", [0, 1, 2, 3])
+def test_search_matches_reference(max_distance):
+    rng = random.Random(max_distance)
+    # A small alphabet, so there are plenty of near neighbours
+    sequences = _random_cdr3s(rng, 2000)
+    index = Cdr3Index(sequences)
+    assert len(index) == len(sequences)
+
+    for query in rng.sample(sequences, 5) + _random_cdr3s(rng, 5):
+        for metric, reference in (
+            ("hamming", _reference_hamming),
+            ("levenshtein", _reference_levenshtein),
+        ):
+            expected = sorted(
+                (d, seq)
+                for seq in sequences
+                if (d := reference(query, seq)) is not None and d <= max_distance
+            )
+            hits = index.search(query, max_distance, metric)
+            assert [(hit.distance, hit.cdr3_aa) for hit in hits] == expected
+
+
+def test_search_indels():
+    index = Cdr3Index(["ARDYW", "ARDGYW", "ARYW", "GGGGG"])
+
+    assert index.search("ardyw", 1, "levenshtein") == [
+        Cdr3Hit("ARDYW", 0),
+        Cdr3Hit("ARDGYW", 1),
+        Cdr3Hit("ARYW", 1),
+    ]
+    # Hamming distance only compares CDR3s of the same length
+    assert index.search("ARDYW", 1) == [Cdr3Hit("ARDYW", 0)]
+
+
+def test_search_unknown_metric():
+    with pytest.raises(ValueError, match="Unknown metric"):
+        Cdr3Index(["ARDYW"]).search("ARDYW", 1, "blosum")
+
+
+def _reference_clusters(sequences, identity):
+    # Connected components of all linked pairs, as sets of sequences
+    components = []
+    for seq in sequences:
+        linked = [
+            c
+            for c in components
+            if any(
+                len(other) == len(seq)
+                and _reference_hamming(seq, other) <= len(seq) * (1 - identity) + 1e-9
+                for other in c
+            )
+        ]
+        merged = {seq}.union(*linked)
+        components = [c for c in components if c not in linked] + [merged]
+    return sorted(sorted(c) for c in components)
+
+
+def _partition(sequences, clusters):
+    groups = {}
+    for seq, cluster in zip(sequences, clusters):
+        groups.setdefault(cluster, set()).add(seq)
+    return sorted(sorted(group) for group in groups.values())
+
+
+@pytest.mark.parametrize("identity", [0.6, 0.8, 1.0])
+def test_cluster_cdr3s_matches_reference(identity):
+    rng = random.Random(int(identity * 10))
+    sequences = _random_cdr3s(rng, 300, lengths=(5, 8))
+    keys = list(range(100, 100 + len(sequences)))
+
+    clusters = cluster_cdr3s(sequences, identity, keys)
+    assert _partition(sequences, clusters) == _reference_clusters(sequences, identity)
+    # New clusters are labelled with their smallest key
+    for cluster in set(clusters):
+        assert cluster == min(k for k, c in zip(keys, clusters) if c == cluster)
+
+
+def test_cluster_cdr3s_incremental():
+    rng = random.Random(1)
+    sequences = _random_cdr3s(rng, 400, lengths=(5, 8))
+    keys = list(range(len(sequences)))
+    first = cluster_cdr3s(sequences[:300], 0.75, keys[:300])
+
+    clusters = cluster_cdr3s(sequences, 0.75, keys, clusters=first + [None] * 100)
+    assert _partition(sequences, clusters) == _partition(
+        sequences, cluster_cdr3s(sequences, 0.75, keys)
+    )
+    # Clusters keep their IDs unless merged into an older one
+    for old, new in zip(first, clusters):
+        assert new <= old
+
+
+def test_cluster_cdr3s_links_same_length_only():
+    assert cluster_cdr3s(
+        ["CARDYW", "CARDFW", "CARDW", "GGGGGG"], 0.8, keys=[4, 3, 2, 1]
+    ) == [3, 3, 2, 1]
+
+
+@pytest.mark.benchmark
+def test_benchmark_cdr3_search():
+    rng = random.Random(0)
+    sequences = [
+        "".join(rng.choices(_AMINO_ACIDS, k=rng.randint(8, 24))) for _ in range(200_000)
+    ]
+    start = time.perf_counter()
+    index = Cdr3Index(sequences)
+    build_time = time.perf_counter() - start
+    query = sequences[0]
+
+    for metric in ("hamming", "levenshtein"):
+        start = time.perf_counter()
+        hits = index.search(query, 2, metric)
+        elapsed = time.perf_counter() - start
+        print(
+            f"\n{metric} search of {len(sequences)} CDR3s (built in "
+            f"{build_time * 1000:.0f} ms): {elapsed * 1000:.1f} ms"
+        )
+        assert hits[0] == Cdr3Hit(query, 0)
+
+
+@pytest.mark.benchmark
+def test_benchmark_cdr3_clustering():
+    rng = random.Random(0)
+    sequences = [
+        "".join(rng.choices(_AMINO_ACIDS, k=rng.randint(8, 24))) for _ in range(50_000)
+    ]
+    keys = list(range(len(sequences)))
+
+    start = time.perf_counter()
+    clusters = cluster_cdr3s(sequences, 0.8, keys)
+    full_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cluster_cdr3s(sequences, 0.8, keys, clusters[:-500] + [None] * 500)
+    incremental_time = time.perf_counter() - start
+    print(
+        f"\nCluster {len(sequences)} CDR3s: full {full_time * 1000:.0f} ms, "
+        f"500 new {incremental_time * 1000:.0f} ms"
+    )
+    assert incremental_time < full_time
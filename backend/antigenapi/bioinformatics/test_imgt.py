@@ -1,12 +1,23 @@
 """Unit tests for run_vquest — use mock HTTP responses, no network required."""
 
+import http.server
 import io
+import random
+import threading
+import time
+import urllib.parse
 import zipfile
 from unittest.mock import MagicMock, patch
 
 import pytest
 
-from antigenapi.bioinformatics.imgt import run_vquest
+from antigenapi.bioinformatics.imgt import (
+    as_fasta_files,
+    as_fasta_records,
+    iter_zip_sequences,
+    load_sequences,
+    run_vquest,
+)
 
 # ---------------------------------------------------------------------------
 # Helpers
@@ -71,6 +82,28 @@ def test_single_batch(mock_post):
     assert len(lines) == 3  # header + 2 rows
 
 
+@patch("antigenapi.bioinformatics.imgt.requests.post")
+def test_batches_submitted_while_records_are_read(mock_post):
+    """Records from an iterable are submitted a batch at a time, as they come."""
+    consumed = []
+    consumed_at_post = []
+
+    def _records():
+        for i in range(120):
+            consumed.append(i)
+            yield f"> seq_{i}\nACGTACGT"
+
+    def _post(url, data, timeout):
+        consumed_at_post.append(len(consumed))
+        return _mock_zip_response(_HEADER + _airr_row(0))
+
+    mock_post.side_effect = _post
+    run_vquest(_records())
+
+    assert len(consumed_at_post) == 3
+    assert consumed_at_post[0] < 120
+
+
 @patch("antigenapi.bioinformatics.imgt.requests.post")
 def test_two_batch_merge(mock_post):
     """51 sequences → two POSTs; AIRR rows merged with a single header."""
@@ -193,3 +226,241 @@ def test_molecule_type_override(mock_post):
 
     _, kwargs = mock_post.call_args
     assert kwargs.get("data", {}).get("moleculeType") == "cDNA"
+
+
+# ---------------------------------------------------------------------------
+# Concurrent submission, against a local stub V-QUEST server
+# ---------------------------------------------------------------------------
+
+
+class _StubVquestHandler(http.server.BaseHTTPRequestHandler):
+    """Echoes each submitted sequence back as an AIRR row."""
+
+    def do_POST(self):  # noqa: N802
+        server = self.server
+        with server.lock:
+            server.start_times.append(time.monotonic())
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+
+        length = int(self.headers["Content-Length"])
+        form = urllib.parse.parse_qs(self.rfile.read(length).decode())
+        names = [
+            line[1:].strip()
+            for line in form["sequences"][0].splitlines()
+            if line.startswith(">")
+        ]
+        # Earlier batches take longer, so batches complete out of order
+        time.sleep(0.05 * (4 - len(server.start_times) % 4))
+
+        if "seq_fail" in names:
+            body, content_type = b"<html>oops</html>", "text/html"
+        else:
+            body = _make_zip(
+                {
+                    _PARAMS: "params",
+                    _AIRR: _HEADER + "".join(f"{n}\tT\tSEQ\n" for n in names),
+                }
+            )
+            content_type = "application/zip"
+
+        with server.lock:
+            server.in_flight -= 1
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_vquest(monkeypatch):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _StubVquestHandler)
+    server.lock = threading.Lock()
+    server.start_times = []
+    server.in_flight = 0
+    server.max_in_flight = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(
+        "antigenapi.bioinformatics.imgt._VQUEST_URL",
+        f"http://127.0.0.1:{server.server_address[1]}/",
+    )
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_concurrent_batches_merged_in_order(stub_vquest):
+    result = run_vquest(_fasta(180), max_workers=4, requests_per_second=100)
+
+    lines = _airr_lines(result)
+    assert lines[0] == _HEADER.strip()
+    assert [line.split("\t")[0] for line in lines[1:]] == [
+        f"seq_{i}" for i in range(180)
+    ]
+    assert len(stub_vquest.start_times) == 4
+    assert 1 < stub_vquest.max_in_flight <= 4
+
+
+def test_concurrent_batches_respect_max_workers(stub_vquest):
+    run_vquest(_fasta(180), max_workers=2, requests_per_second=100)
+
+    assert stub_vquest.max_in_flight <= 2
+
+
+def test_concurrent_batches_respect_rate_limit(stub_vquest):
+    run_vquest(_fasta(150), max_workers=3, requests_per_second=10)
+
+    starts = sorted(stub_vquest.start_times)
+    # Allow some slack for timer resolution
+    assert all(b - a >= 0.08 for a, b in zip(starts, starts[1:]))
+
+
+def test_concurrent_batch_error_raises(stub_vquest):
+    fasta = _fasta(120).replace("> seq_60\n", "> seq_fail\n")
+
+    with pytest.raises(ValueError, match="unexpected HTML response"):
+        run_vquest(fasta, max_workers=3, requests_per_second=100)
+
+
+# ---------------------------------------------------------------------------
+# Per-sequence result cache
+# ---------------------------------------------------------------------------
+
+
+class _DictCache:
+    def __init__(self):
+        self.entries = {}
+
+    def get_many(self, keys):
+        return {k: self.entries[k] for k in keys if k in self.entries}
+
+    def set_many(self, entries):
+        self.entries.update(entries)
+
+
+def _echo_post(url, data, timeout):
+    """Mock V-QUEST: one AIRR row per submitted sequence, echoing the sequence."""
+    records = [r for r in data["sequences"].split(">") if r.strip()]
+    rows = []
+    for record in records:
+        name, _, seq = record.partition("\n")
+        rows.append(f"{name.strip()}\tT\t{seq.strip()}\n")
+    return _mock_zip_response(_HEADER + "".join(rows), params="fresh params")
+
+
+def _fasta_seqs(seqs: dict[str, str]) -> str:
+    return "\n".join(f"> {name}\n{seq}" for name, seq in seqs.items())
+
+
+@patch("antigenapi.bioinformatics.imgt.requests.post", side_effect=_echo_post)
+def test_cache_only_submits_misses(mock_post):
+    cache = _DictCache()
+    run_vquest(_fasta_seqs({"a_A1": "AAAA", "b_A2": "CCCC"}), cache=cache)
+    assert len(cache.entries) == 2
+
+    result = run_vquest(
+        _fasta_seqs({"c_B1": "GGGG", "d_B2": "CCCC", "e_B3": "AAAA"}), cache=cache
+    )
+
+    _, kwargs = mock_post.call_args
+    assert kwargs["data"]["sequences"] == "> c_B1\nGGGG"
+    assert _airr_lines(result)[1:] == [
+        "c_B1\tT\tGGGG",
+        "d_B2\tT\tCCCC",
+        "e_B3\tT\tAAAA",
+    ]
+    assert result[_PARAMS] == "fresh params"
+
+
+@patch("antigenapi.bioinformatics.imgt.requests.post", side_effect=_echo_post)
+def test_cache_all_hits_skips_vquest(mock_post):
+    cache = _DictCache()
+    run_vquest(_fasta_seqs({"a_A1": "AAAA"}), cache=cache)
+    mock_post.reset_mock()
+
+    result = run_vquest(_fasta_seqs({"z_H12": "aaaa"}), cache=cache)
+
+    mock_post.assert_not_called()
+    assert _airr_lines(result) == [_HEADER.strip(), "z_H12\tT\tAAAA"]
+    assert result[_PARAMS] == "fresh params"
+
+
+@patch("antigenapi.bioinformatics.imgt.requests.post", side_effect=_echo_post)
+def test_cache_submits_repeated_sequences_once(mock_post):
+    result = run_vquest(
+        _fasta_seqs({"a_A1": "AAAA", "b_A2": "AAAA"}), cache=_DictCache()
+    )
+
+    _, kwargs = mock_post.call_args
+    assert kwargs["data"]["sequences"] == "> a_A1\nAAAA"
+    assert _airr_lines(result)[1:] == ["a_A1\tT\tAAAA", "b_A2\tT\tAAAA"]
+
+
+@patch("antigenapi.bioinformatics.imgt.requests.post", side_effect=_echo_post)
+def test_cache_key_includes_species(mock_post):
+    cache = _DictCache()
+    run_vquest(_fasta_seqs({"a_A1": "AAAA"}), cache=cache)
+    run_vquest(_fasta_seqs({"a_A1": "AAAA"}), species="human", cache=cache)
+
+    assert mock_post.call_count == 2
+    assert len(cache.entries) == 2
+
+
+def _renaming_post(url, data, timeout):
+    """Mock V-QUEST which rewrites the sequence_id of sequences named x_*."""
+    response = _echo_post(url, data, timeout)
+    with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
+        airr = zf.read("vquest_airr.tsv").decode().replace("x_", "renamed_")
+        params = zf.read("Parameters.txt").decode()
+    return _mock_zip_response(airr, params=params)
+
+
+@patch("antigenapi.bioinformatics.imgt.requests.post", side_effect=_renaming_post)
+def test_cache_passes_on_renamed_results_uncached(mock_post):
+    cache = _DictCache()
+    result = run_vquest(_fasta_seqs({"x_A1": "AAAA", "b_A2": "CCCC"}), cache=cache)
+
+    assert _airr_lines(result)[1:] == ["b_A2\tT\tCCCC", "renamed_A1\tT\tAAAA"]
+    assert len(cache.entries) == 1
+
+
+@pytest.mark.benchmark
+def test_benchmark_time_to_first_vquest_batch():
+    rng = random.Random(0)
+    buf = io.BytesIO()
+    n_files = 2000
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for i in range(n_files):
+            seq = "".join(rng.choices("ACGT", k=700))
+            zf.writestr(f"data/{i}_A{i % 12 + 1}.seq", f">{i}\n{seq}\n")
+
+    def _time_to_first_post(make_records):
+        first_post = []
+
+        def _post(url, data, timeout):
+            if not first_post:
+                first_post.append(time.perf_counter())
+            return _mock_zip_response(_HEADER + _airr_row(0))
+
+        with patch("antigenapi.bioinformatics.imgt.requests.post", side_effect=_post):
+            start = time.perf_counter()
+            run_vquest(make_records(), max_workers=4, requests_per_second=1e6)
+            end = time.perf_counter()
+        return first_post[0] - start, end - start
+
+    buffered = _time_to_first_post(
+        lambda: as_fasta_files(load_sequences(buf), max_file_size=None)[0]
+    )
+    streamed = _time_to_first_post(lambda: as_fasta_records(iter_zip_sequences(buf)))
+    print(
+        f"\nFirst V-QUEST batch from a {n_files} file .zip: "
+        f"read all first {buffered[0] * 1000:.0f} ms (total {buffered[1] * 1000:.0f}"
+        f" ms), streamed {streamed[0] * 1000:.0f} ms "
+        f"(total {streamed[1] * 1000:.0f} ms)"
+    )
+    assert streamed[0] < buffered[0]
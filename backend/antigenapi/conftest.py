@@ -0,0 +1,17 @@
+import pytest
+from django.core.cache import cache
+
+from antigenapi.bioinformatics import blast, cdr3
+from antigenapi.utils.frame_cache import airr_frame_cache, seqrun_frame_cache
+
+
+@pytest.fixture(autouse=True)
+def _clear_caches():
+    # Primary keys and data generations are reused between tests, so cached
+    # results mustn't be
+    yield
+    airr_frame_cache.clear()
+    seqrun_frame_cache.clear()
+    blast._local_alignment_dbs.clear()
+    cdr3._cdr3_indexes.clear()
+    cache.clear()
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from antigenapi.models import AirrSequence, SequencingRunResults
+from antigenapi.utils.helpers import read_airr_many, store_airr_sequences
+
+
+class Command(BaseCommand):
+    help = "Stores AIRR records from existing sequencing results files in the database."
+
+    def add_arguments(self, parser):
+        """Add arguments to the management command."""
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Re-store all results files, not just those missing records",
+        )
+
+    def handle(self, *args, **options):
+        """Management command to backfill AirrSequence rows."""
+        results = SequencingRunResults.objects.select_related(
+            "sequencing_run"
+        ).order_by("pk")
+        if not options["all"]:
+            results = results.exclude(pk__in=AirrSequence.objects.values("results_id"))
+
+        for srr, airr_df in read_airr_many(results):
+            self.stdout.write(f"Storing AIRR records for {srr}")
+            store_airr_sequences(srr, airr_df)
+
+        self.stdout.write(self.style.SUCCESS("AIRR records backfilled."))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from antigenapi.utils.helpers import cluster_clonotypes
+
+
+class Command(BaseCommand):
+    help = "Assigns clonotypes to clonal families by CDR3 similarity."
+
+    def add_arguments(self, parser):
+        """Add arguments to the management command."""
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Recluster all clonotypes, e.g. after changing "
+            "CDR3_CLUSTER_IDENTITY, not just unclustered ones",
+        )
+
+    def handle(self, *args, **options):
+        """Management command to cluster clonotypes."""
+        changed = cluster_clonotypes(full=options["full"])
+        self.stdout.write(self.style.SUCCESS(f"{changed} clonotype(s) reclustered."))
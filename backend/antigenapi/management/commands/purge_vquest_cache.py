@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from antigenapi.models import VquestResult
+
+
+class Command(BaseCommand):
+    help = "Removes cached IMGT/V-QUEST results, e.g. after an IMGT reference release."
+
+    def add_arguments(self, parser):
+        """Add arguments to the management command."""
+        parser.add_argument(
+            "--expired",
+            action="store_true",
+            help="Only remove results older than VQUEST_CACHE_MAX_AGE days",
+        )
+
+    def handle(self, *args, **options):
+        """Management command to purge the V-QUEST result cache."""
+        results = VquestResult.expired() if options["expired"] else VquestResult.objects
+        deleted, _ = results.all().delete()
+        self.stdout.write(self.style.SUCCESS(f"{deleted} cached results removed."))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from antigenapi.models import SequencingRunResults
+from antigenapi.utils.helpers import store_missing_airr_sequences
+from antigenapi.utils.jobs import run_next_job
+
+
+class Command(BaseCommand):
+    help = "Runs queued background jobs (BLAST, sequencing results uploads)."
+
+    def add_arguments(self, parser):
+        """Add arguments to the management command."""
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is empty, instead of waiting for more jobs",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=2.0,
+            help="Seconds to wait between checks of an empty queue",
+        )
+
+    def handle(self, *args, **options):
+        """Management command to run background jobs."""
+        # Results uploaded before their records were kept in the database
+        # aren't searchable until they're stored
+        store_missing_airr_sequences(SequencingRunResults.objects.all())
+
+        while True:
+            job = run_next_job()
+            if job is not None:
+                self.stdout.write(f"{job} finished")
+                continue
+            if options["once"]:
+                break
+            time.sleep(options["poll_interval"])
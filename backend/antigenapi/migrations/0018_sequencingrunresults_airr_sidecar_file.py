@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("antigenapi", "0017_sequencingrun_fill_horizontal"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="sequencingrunresults",
+            name="airr_sidecar_file",
+            field=models.FileField(blank=True, upload_to="uploads/sequencingresults/"),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("antigenapi", "0018_sequencingrunresults_airr_sidecar_file"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AirrSequence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("row_num", models.PositiveIntegerField()),
+                ("sequence_id", models.TextField()),
+                ("productive", models.TextField(null=True)),
+                ("stop_codon", models.TextField(null=True)),
+                ("sequence_alignment_aa", models.TextField(null=True)),
+                ("fwr1_aa", models.TextField(null=True)),
+                ("cdr1_aa", models.TextField(null=True)),
+                ("fwr2_aa", models.TextField(null=True)),
+                ("cdr2_aa", models.TextField(null=True)),
+                ("fwr3_aa", models.TextField(null=True)),
+                ("cdr3_aa", models.TextField(null=True)),
+                (
+                    "elisa_well",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="antigenapi.elisawell",
+                    ),
+                ),
+                (
+                    "results",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="antigenapi.sequencingrunresults",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["results", "row_num"],
+                "indexes": [
+                    models.Index(fields=["cdr3_aa"], name="airrsequence_cdr3_aa_idx")
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("results", "row_num"), name="unique_airr_row"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:20
+
+from django.db import migrations, models
+
+
+def delete_airr_sequences(apps, schema_editor):
+    # AirrSequence rows are derived from the AIRR files, and are re-stored
+    # (now with autonames) on next read or by backfill_airr_sequences
+    AirrSequence = apps.get_model("antigenapi", "AirrSequence")
+    AirrSequence.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("antigenapi", "0019_airrsequence"),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_airr_sequences, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name="airrsequence",
+            name="nanobody_autoname",
+            field=models.TextField(default=""),
+            preserve_default=False,
+        ),
+    ]
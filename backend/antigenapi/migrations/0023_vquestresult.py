@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("antigenapi", "0022_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VquestResult",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=64, unique=True)),
+                ("airr_header", models.TextField()),
+                ("airr_row", models.TextField()),
+                ("parameters", models.TextField()),
+                ("added_date", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def index_airr_sequences(apps, schema_editor):
+    AirrSequence = apps.get_model("antigenapi", "AirrSequence")
+    AirrSequenceKmer = apps.get_model("antigenapi", "AirrSequenceKmer")
+
+    kmers = []
+    for pk, full, cdr3 in AirrSequence.objects.values_list(
+        "pk", "sequence_alignment_aa", "cdr3_aa"
+    ).iterator():
+        for region, text in (("full", full), ("cdr3", cdr3)):
+            for kmer in {text[i : i + 3] for i in range(len(text or "") - 2)}:
+                kmers.append(AirrSequenceKmer(sequence_id=pk, region=region, kmer=kmer))
+        if len(kmers) >= 10000:
+            AirrSequenceKmer.objects.bulk_create(kmers)
+            kmers = []
+    AirrSequenceKmer.objects.bulk_create(kmers)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("antigenapi", "0023_vquestresult"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AirrSequenceKmer",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "region",
+                    models.CharField(
+                        choices=[("full", "Full sequence"), ("cdr3", "CDR3")],
+                        max_length=4,
+                    ),
+                ),
+                ("kmer", models.CharField(max_length=3)),
+                (
+                    "sequence",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="kmers",
+                        to="antigenapi.airrsequence",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["region", "kmer"], name="airrsequencekmer_lookup_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(index_airr_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:18
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def hash_airr_sequences(apps, schema_editor):
+    AirrSequence = apps.get_model("antigenapi", "AirrSequence")
+
+    sequences = []
+    for seq in AirrSequence.objects.filter(sequence_alignment_aa__isnull=False).only(
+        "pk", "sequence_alignment_aa"
+    ):
+        seq.sequence_hash = hashlib.sha256(
+            seq.sequence_alignment_aa.replace(".", "").encode()
+        ).hexdigest()
+        sequences.append(seq)
+    AirrSequence.objects.bulk_update(sequences, ["sequence_hash"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("antigenapi", "0024_airrsequencekmer"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="airrsequence",
+            name="sequence_hash",
+            field=models.CharField(db_index=True, max_length=64, null=True),
+        ),
+        migrations.RunPython(hash_airr_sequences, migrations.RunPython.noop),
+    ]
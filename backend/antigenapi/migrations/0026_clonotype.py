@@ -0,0 +1,103 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def build_clonotypes(apps, schema_editor):
+    AirrSequence = apps.get_model("antigenapi", "AirrSequence")
+    Clonotype = apps.get_model("antigenapi", "Clonotype")
+
+    sequences = AirrSequence.objects.exclude(cdr3_aa__isnull=True).exclude(cdr3_aa="")
+    Clonotype.objects.bulk_create(
+        (
+            Clonotype(
+                cdr3_aa=row["cdr3_aa"],
+                count=row["count"],
+                first_seen_run_id=row["first_seen_run"],
+            )
+            for row in sequences.values("cdr3_aa")
+            .annotate(
+                count=Count("pk"), first_seen_run=Min("results__sequencing_run_id")
+            )
+            .order_by()
+            .iterator()
+        ),
+        batch_size=1000,
+    )
+    clonotype_ids = dict(Clonotype.objects.values_list("cdr3_aa", "pk"))
+
+    Runs = Clonotype.runs.through
+    Runs.objects.bulk_create(
+        (
+            Runs(clonotype_id=clonotype_ids[cdr3], sequencingrun_id=run_id)
+            for cdr3, run_id in sequences.values_list(
+                "cdr3_aa", "results__sequencing_run_id"
+            )
+            .order_by()
+            .distinct()
+            .iterator()
+        ),
+        batch_size=1000,
+    )
+    Antigens = Clonotype.antigens.through
+    Antigens.objects.bulk_create(
+        (
+            Antigens(clonotype_id=clonotype_ids[cdr3], antigen_id=antigen_id)
+            for cdr3, antigen_id in sequences.exclude(elisa_well__isnull=True)
+            .values_list("cdr3_aa", "elisa_well__antigen_id")
+            .order_by()
+            .distinct()
+            .iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("antigenapi", "0025_airrsequence_sequence_hash"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Clonotype",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("cdr3_aa", models.TextField(unique=True)),
+                ("count", models.PositiveIntegerField()),
+                (
+                    "antigens",
+                    models.ManyToManyField(
+                        related_name="clonotypes", to="antigenapi.antigen"
+                    ),
+                ),
+                (
+                    "first_seen_run",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="antigenapi.sequencingrun",
+                    ),
+                ),
+                (
+                    "runs",
+                    models.ManyToManyField(
+                        related_name="clonotypes", to="antigenapi.sequencingrun"
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(build_clonotypes, migrations.RunPython.noop),
+    ]
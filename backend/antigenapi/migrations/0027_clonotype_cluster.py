@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("antigenapi", "0026_clonotype"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="clonotype",
+            name="cluster",
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -1,9 +1,12 @@
+import os
+from datetime import timedelta
 from itertools import product
 
 from auditlog.registry import auditlog
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.files import File
+from django.core.files.base import ContentFile
 from django.core.validators import (
     FileExtensionValidator,
     MinValueValidator,
@@ -12,13 +15,17 @@ from django.core.validators import (
 from django.db.models import (
     CASCADE,
     PROTECT,
+    SET_NULL,
     BooleanField,
+    F,
     FileField,
     ForeignKey,
+    Index,
     IntegerChoices,
     JSONField,
     ManyToManyField,
     Model,
+    TextChoices,
     UniqueConstraint,
 )
 from django.db.models.fields import (
@@ -27,13 +34,21 @@ from django.db.models.fields import (
     DateTimeField,
     FloatField,
     IntegerField,
+    PositiveBigIntegerField,
     PositiveIntegerField,
     PositiveSmallIntegerField,
     TextField,
 )
-from django.db.models.signals import post_init, post_save
-
-from .bioinformatics.imgt import read_airr_file
+from django.db.models.signals import post_init
+from django.utils import timezone
+
+from .bioinformatics.imgt import (
+    AIRR_IMPORTANT_COLUMNS,
+    VquestCacheEntry,
+    read_airr_file,
+    read_airr_sidecar,
+    write_airr_sidecar,
+)
 
 
 class Project(Model):
@@ -214,6 +229,11 @@ class SequencingRunResults(Model):
     airr_file: File = FileField(
         upload_to="uploads/sequencingresults/",
     )
+    # Columnar (Parquet) copy of airr_file, so readers can load only the
+    # columns they need. Written at upload time, or on first read for older rows.
+    airr_sidecar_file: File = FileField(
+        upload_to="uploads/sequencingresults/", blank=True
+    )
     added_by = ForeignKey(settings.AUTH_USER_MODEL, on_delete=PROTECT)
     added_date = DateTimeField(auto_now_add=True)
 
@@ -225,6 +245,130 @@ class SequencingRunResults(Model):
     def __str__(self):  # noqa: D105
         return f"SequencingRunResults {self.pk}"
 
+    def save_airr_sidecar(self, airr_df=None):
+        """Write the columnar sidecar for the AIRR file.
+
+        Args:
+            airr_df (pd.DataFrame, optional): All columns of the AIRR file, if
+              already parsed. Read from airr_file if not supplied.
+        """
+        if airr_df is None:
+            with self.airr_file.open("rb") as f:
+                airr_df = read_airr_file(f, usecols=None)
+
+        if self.airr_sidecar_file:
+            self.airr_sidecar_file.delete(save=False)
+
+        airr_basename = os.path.splitext(os.path.basename(self.airr_file.name))[0]
+        self.airr_sidecar_file.save(
+            f"{airr_basename}.parquet",
+            ContentFile(write_airr_sidecar(airr_df)),
+            save=False,
+        )
+        # Update the column directly, so writing a sidecar isn't audit logged
+        SequencingRunResults.objects.filter(pk=self.pk).update(
+            airr_sidecar_file=self.airr_sidecar_file.name
+        )
+
+    def read_airr(self, usecols=AIRR_IMPORTANT_COLUMNS):
+        """Read the AIRR file into a pandas dataframe, via the columnar sidecar.
+
+        Args:
+            usecols (Iterable[str], optional): Columns to read. Defaults to
+              AIRR_IMPORTANT_COLUMNS. None reads all columns.
+
+        Returns:
+            pd.DataFrame: Contents of AIRR file (IMGT)
+        """
+        if not self.airr_sidecar_file:
+            self.save_airr_sidecar()
+
+        with self.airr_sidecar_file.open("rb") as f:
+            return read_airr_sidecar(f, usecols=usecols)
+
+
+class AirrSequence(Model):
+    """A single V-QUEST (AIRR) record from a sequencing run results file."""
+
+    results: SequencingRunResults = ForeignKey(SequencingRunResults, on_delete=CASCADE)
+    row_num: int = PositiveIntegerField()  # Position in the AIRR file
+    elisa_well = ForeignKey(ElisaWell, null=True, on_delete=SET_NULL)
+    # Derived from the ELISA well's antigen, plate, library and cohort; kept up
+    # to date by antigenapi.signals
+    nanobody_autoname: str = TextField()
+    sequence_id: str = TextField()
+    productive = TextField(null=True)
+    stop_codon = TextField(null=True)
+    sequence_alignment_aa = TextField(null=True)
+    # Hash of sequence_alignment_aa without gaps, to look up nanobody sequences
+    sequence_hash = CharField(max_length=64, null=True, db_index=True)
+    fwr1_aa = TextField(null=True)
+    cdr1_aa = TextField(null=True)
+    fwr2_aa = TextField(null=True)
+    cdr2_aa = TextField(null=True)
+    fwr3_aa = TextField(null=True)
+    cdr3_aa = TextField(null=True)
+
+    class Meta:  # noqa: D106
+        constraints = [
+            UniqueConstraint(fields=["results", "row_num"], name="unique_airr_row")
+        ]
+        indexes = [Index(fields=["cdr3_aa"], name="airrsequence_cdr3_aa_idx")]
+        ordering = ["results", "row_num"]
+
+    def __str__(self):  # noqa: D105
+        return self.sequence_id
+
+
+class AirrSequenceKmer(Model):
+    """An amino acid k-mer occurring in a stored AIRR record.
+
+    An inverted index used to narrow down substring searches.
+    """
+
+    K = 3
+
+    class Region(TextChoices):
+        """Indexed AIRR columns."""
+
+        FULL = "full", "Full sequence"  # sequence_alignment_aa
+        CDR3 = "cdr3", "CDR3"  # cdr3_aa
+
+    sequence = ForeignKey(AirrSequence, on_delete=CASCADE, related_name="kmers")
+    region: str = CharField(max_length=4, choices=Region.choices)
+    kmer: str = CharField(max_length=K)
+
+    class Meta:  # noqa: D106
+        indexes = [Index(fields=["region", "kmer"], name="airrsequencekmer_lookup_idx")]
+
+    def __str__(self):  # noqa: D105
+        return f"{self.region}:{self.kmer}"
+
+
+class Clonotype(Model):
+    """A distinct CDR3 amino acid sequence, and where it has been seen.
+
+    Summarises the stored AIRR records with that CDR3, so database-wide counts
+    don't need a scan of every record. Kept up to date by
+    antigenapi.utils.helpers.refresh_clonotypes.
+    """
+
+    cdr3_aa: str = TextField(unique=True)
+    count: int = PositiveIntegerField()  # Number of stored AIRR records
+    # Earliest sequencing run with the CDR3
+    first_seen_run = ForeignKey(
+        SequencingRun, null=True, on_delete=SET_NULL, related_name="+"
+    )
+    runs = ManyToManyField(SequencingRun, related_name="clonotypes")
+    # Antigens of the ELISA wells the records were picked from
+    antigens = ManyToManyField(Antigen, related_name="clonotypes")
+    # Clonal family, from antigenapi.utils.helpers.cluster_clonotypes; None
+    # until clustered
+    cluster: int = PositiveIntegerField(null=True, blank=True, db_index=True)
+
+    def __str__(self):  # noqa: D105
+        return self.cdr3_aa
+
 
 class Nanobody(Model):
     """A named nanobody."""
@@ -239,33 +383,131 @@ class Nanobody(Model):
     def __str__(self):  # noqa: D105
         return self.name
 
-    @staticmethod
-    def post_save(sender, instance, created, **kwargs):
-        """Update seqruns if the sequence has changed."""
-        if instance.previous_sequence != instance.sequence or created:
-            srr_links = []
-            for sr in SequencingRunResults.objects.all():
-                airr_file = read_airr_file(
-                    sr.airr_file, usecols=("sequence_alignment_aa",)
-                )
-                seqs = set(
-                    airr_file.sequence_alignment_aa.dropna()
-                    .str.replace(".", "")
-                    .replace("*", "X")
-                    .unique()
-                )
-                print(seqs)
-                if instance.sequence in seqs:
-                    srr_links.append(sr)
-            instance.seqruns.set(srr_links)
-
     @staticmethod
     def remember_state(sender, instance, **kwargs):
         """Save the previous sequence to see if it's changed when saving."""
         instance.previous_sequence = instance.sequence
 
 
-post_save.connect(Nanobody.post_save, sender=Nanobody)
+class DataGeneration(Model):
+    """A counter, bumped whenever data that derived artifacts are built from changes.
+
+    Used to version caches (such as the BLAST database) across processes.
+    """
+
+    # Stored AIRR records (AirrSequence), including their autonames
+    SEQUENCES = "sequences"
+    # Projects, llamas, cohorts, libraries, antigens, ELISA plates, sequencing
+    # runs and nanobodies, as summarised by the dashboard and project report
+    RECORDS = "records"
+    # Clonotype clusters
+    CLUSTERS = "clusters"
+
+    name = CharField(max_length=32, unique=True)
+    value: int = PositiveBigIntegerField(default=0)
+
+    def __str__(self):  # noqa: D105
+        return f"{self.name}: {self.value}"
+
+    @classmethod
+    def current(cls, name: str) -> int:
+        """Get the current generation for name."""
+        return (
+            cls.objects.filter(name=name).values_list("value", flat=True).first() or 0
+        )
+
+    @classmethod
+    def bump(cls, name: str):
+        """Increment the generation for name."""
+        if not cls.objects.filter(name=name).update(value=F("value") + 1):
+            cls.objects.get_or_create(name=name)
+            cls.objects.filter(name=name).update(value=F("value") + 1)
+
+
+class VquestResult(Model):
+    """A cached IMGT/V-QUEST result for a single trimmed nucleotide sequence.
+
+    Used as the run_vquest cache, so repeat sequences aren't resubmitted.
+    Results expire after settings.VQUEST_CACHE_MAX_AGE days, as IMGT updates
+    its reference directory.
+    """
+
+    # imgt.vquest_cache_key of sequence, species, receptor and molecule type
+    key: str = CharField(max_length=64, unique=True)
+    airr_header: str = TextField()
+    airr_row: str = TextField()
+    parameters: str = TextField()
+    added_date = DateTimeField(auto_now_add=True)
+
+    def __str__(self):  # noqa: D105
+        return f"VquestResult {self.key}"
+
+    @staticmethod
+    def _expiry_cutoff():
+        return timezone.now() - timedelta(days=settings.VQUEST_CACHE_MAX_AGE)
+
+    @classmethod
+    def expired(cls):
+        """Get the cached results too old to use."""
+        return cls.objects.filter(added_date__lt=cls._expiry_cutoff())
+
+    @classmethod
+    def get_many(cls, keys) -> dict[str, VquestCacheEntry]:
+        """Get cached results by key, skipping keys not in the cache."""
+        return {
+            key: VquestCacheEntry(*entry)
+            for key, *entry in cls.objects.filter(
+                key__in=keys, added_date__gte=cls._expiry_cutoff()
+            ).values_list("key", "airr_header", "airr_row", "parameters")
+        }
+
+    @classmethod
+    def set_many(cls, entries: dict[str, VquestCacheEntry]):
+        """Cache results by key, replacing expired results."""
+        cls.expired().filter(key__in=entries).delete()
+        cls.objects.bulk_create(
+            [cls(key=key, **entry._asdict()) for key, entry in entries.items()],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+
+class Job(Model):
+    """A unit of background work, run by the run_jobs management command."""
+
+    class Status(TextChoices):
+        """Lifecycle of a job."""
+
+        PENDING = "pending"
+        RUNNING = "running"
+        SUCCEEDED = "succeeded"
+        FAILED = "failed"
+
+    kind: str = CharField(max_length=32)
+    params = JSONField(default=dict, blank=True)
+    # Uploaded file the job works on, if any (e.g. a sequencing results .zip)
+    input_file: File = FileField(upload_to="uploads/jobs/", blank=True)
+    status: str = CharField(
+        max_length=16, choices=Status.choices, default=Status.PENDING
+    )
+    result = JSONField(null=True, blank=True)
+    error: str = TextField(blank=True)
+    added_by = ForeignKey(settings.AUTH_USER_MODEL, on_delete=PROTECT)
+    added_date = DateTimeField(auto_now_add=True)
+    started_date = DateTimeField(null=True, blank=True)
+    # Updated periodically by the worker running the job, so jobs left
+    # running by a worker which died can be spotted and claimed again
+    heartbeat_date = DateTimeField(null=True, blank=True)
+    attempts: int = PositiveSmallIntegerField(default=0)
+    finished_date = DateTimeField(null=True, blank=True)
+
+    class Meta:  # noqa: D106
+        indexes = [Index(fields=["status", "added_date"], name="job_status_idx")]
+
+    def __str__(self):  # noqa: D105
+        return f"Job {self.pk} ({self.kind}, {self.status})"
+
+
 post_init.connect(Nanobody.remember_state, sender=Nanobody)
 
 auditlog.register(Project)
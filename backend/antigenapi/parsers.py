@@ -1,8 +1,44 @@
+import io
+import multiprocessing
+import zipfile
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from typing import NamedTuple, Optional
+
+import numpy as np
+import openpyxl
 import pandas as pd
+from openpyxl.cell.cell import ERROR_CODES
+from openpyxl.utils.exceptions import InvalidFileException
+
+# Cells holding the optical densities of wells A1-H12 in a plate reader
+# export (B16:M23), below its header block
+ELISA_MIN_ROW, ELISA_MAX_ROW = 16, 23
+ELISA_MIN_COL, ELISA_MAX_COL = 2, 13
+ELISA_WELL_COUNT = 96
+# Fewest files worth starting worker processes for; a file parses in a few
+# milliseconds, far less than it takes to start a process
+ELISA_POOL_MIN_FILES = 200
+
 
+def parse_elisa_file(elisa, engine: str = "openpyxl"):
+    """Parse ELISA Excel file into list.
+
+    Args:
+        elisa: Path or file-like object of the .xlsx file
+        engine (str): "openpyxl" to read only the plate's cells from a
+          read-only workbook (see read_elisa_wells), or "pandas" to read the
+          whole first sheet with pd.read_excel
+
+    Returns:
+        np.ndarray: The 96 optical densities, in well order (A1, A2, ..., H12)
+    """
+    if engine == "openpyxl":
+        return read_elisa_wells(elisa)
+    if engine != "pandas":
+        raise ValueError(f"Unknown ELISA parser engine: {engine}")
 
-def parse_elisa_file(elisa):
-    """Parse ELISA Excel file into list."""
     df = pd.read_excel(elisa)
     df = df.iloc[14:22, 1:13]
 
@@ -12,3 +48,108 @@ def parse_elisa_file(elisa):
     assert len(vals) == 96
 
     return vals
+
+
+def read_elisa_wells(elisa) -> np.ndarray:
+    """Read the well optical densities from an ELISA Excel file.
+
+    The workbook is opened read-only, and only the plate's cells (B16:M23)
+    of the first sheet are read, rather than the whole sheet. Cell values
+    convert to floats like pd.read_excel: empty and error cells are NaN, and
+    text raises unless it is a number.
+
+    Args:
+        elisa: Path or file-like object of the .xlsx file
+
+    Raises:
+        ValueError: If the file isn't an .xlsx file, or the plate's cells are
+          missing or not numeric
+
+    Returns:
+        np.ndarray: The 96 optical densities, in well order (A1, A2, ..., H12)
+    """
+    try:
+        workbook = openpyxl.load_workbook(elisa, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, KeyError, InvalidFileException) as e:
+        raise ValueError(f"Not a valid .xlsx file: {e}")
+    try:
+        rows = workbook.worksheets[0].iter_rows(
+            min_row=ELISA_MIN_ROW,
+            max_row=ELISA_MAX_ROW,
+            min_col=ELISA_MIN_COL,
+            max_col=ELISA_MAX_COL,
+            values_only=True,
+        )
+        vals = np.array(
+            [
+                np.nan if value in ERROR_CODES else value
+                for value in chain.from_iterable(rows)
+            ],
+            dtype=float,
+        )
+    finally:
+        workbook.close()
+
+    if len(vals) != ELISA_WELL_COUNT:
+        raise ValueError(
+            f"Expected {ELISA_WELL_COUNT} wells in the plate, found {len(vals)}"
+        )
+    return vals
+
+
+class ElisaParseResult(NamedTuple):
+    """Optical densities read from an ELISA file, or why they couldn't be."""
+
+    vals: Optional[np.ndarray]
+    error: Optional[str]
+
+
+def _read_elisa_content(content: bytes) -> ElisaParseResult:
+    try:
+        return ElisaParseResult(read_elisa_wells(io.BytesIO(content)), None)
+    except Exception as e:
+        # Returned as a message, so unpicklable errors can't break the pool
+        return ElisaParseResult(None, str(e) or type(e).__name__)
+
+
+def read_elisa_files(
+    contents: Sequence[bytes],
+    max_workers: int = 2,
+    min_pool_files: int = ELISA_POOL_MIN_FILES,
+) -> list[ElisaParseResult]:
+    """Read the well optical densities from several ELISA Excel files.
+
+    Large batches are parsed in a pool of worker processes, as parsing is
+    CPU bound. A file which can't be parsed gives an error, rather than
+    stopping the others.
+
+    Args:
+        contents (Sequence[bytes]): Contents of each .xlsx file
+        max_workers (int): Largest number of worker processes. Files are
+          parsed in this process if 1 or less.
+        min_pool_files (int): Fewest files to start worker processes for;
+          smaller batches are parsed in this process
+
+    Returns:
+        list[ElisaParseResult]: Optical densities or error of each file
+    """
+    if max_workers <= 1 or len(contents) < max(min_pool_files, 2):
+        return [_read_elisa_content(content) for content in contents]
+    max_workers = min(max_workers, len(contents))
+    # Forking a threaded web server process can copy locks held by its other
+    # threads, so workers are started from a clean server process instead
+    start_method = (
+        "forkserver"
+        if "forkserver" in multiprocessing.get_all_start_methods()
+        else "spawn"
+    )
+    with ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context(start_method)
+    ) as pool:
+        return list(
+            pool.map(
+                _read_elisa_content,
+                contents,
+                chunksize=max(1, len(contents) // (max_workers * 4)),
+            )
+        )
@@ -0,0 +1,153 @@
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_init,
+    post_save,
+    pre_delete,
+)
+
+from antigenapi.models import (
+    AirrSequence,
+    Antigen,
+    Cohort,
+    DataGeneration,
+    ElisaPlate,
+    ElisaWell,
+    Library,
+    Llama,
+    Nanobody,
+    Project,
+    SequencingRun,
+    SequencingRunResults,
+)
+from antigenapi.utils.frame_cache import airr_frame_cache
+from antigenapi.utils.helpers import (
+    link_nanobody,
+    refresh_clonotypes,
+    refresh_nanobody_autonames_for_plates,
+)
+
+# Fields which stored nanobody autonames (AirrSequence) are built from
+AUTONAME_FIELDS = {
+    Antigen: ("short_name",),
+    Cohort: ("cohort_num", "is_naive"),
+    Library: ("cohort_id", "sublibrary"),
+    ElisaPlate: ("library_id", "pan_round_concentration"),
+}
+
+
+# Models summarised by the dashboard stats and project report
+RECORDS_MODELS = (
+    Project,
+    Llama,
+    Cohort,
+    Library,
+    Antigen,
+    ElisaPlate,
+    SequencingRun,
+    SequencingRunResults,
+    Nanobody,
+)
+
+
+def _autoname_state(instance):
+    # Read from __dict__ so deferred fields don't trigger a query
+    return tuple(instance.__dict__.get(f) for f in AUTONAME_FIELDS[type(instance)])
+
+
+def _elisa_plate_ids(instance):
+    if isinstance(instance, ElisaPlate):
+        return {instance.pk}
+    if isinstance(instance, Library):
+        plates = ElisaPlate.objects.filter(library=instance)
+    elif isinstance(instance, Cohort):
+        plates = ElisaPlate.objects.filter(library__cohort=instance)
+    else:
+        plates = ElisaPlate.objects.filter(
+            pk__in=ElisaWell.objects.filter(antigen=instance).values("plate_id")
+        )
+    return set(plates.values_list("pk", flat=True))
+
+
+def schedule_autoname_refresh(elisa_plate_ids):
+    """Refresh stored autonames using some ELISA plates once the transaction commits.
+
+    Deferring to commit means ELISA wells rewritten later in the same
+    transaction are seen by the refresh.
+    """
+    elisa_plate_ids = set(elisa_plate_ids)
+    transaction.on_commit(
+        lambda: refresh_nanobody_autonames_for_plates(elisa_plate_ids)
+    )
+
+
+def remember_autoname_state(sender, instance, **kwargs):
+    """Save the autoname fields to see if they've changed when saving."""
+    instance._autoname_state = _autoname_state(instance)
+
+
+def refresh_autonames_on_change(sender, instance, created, **kwargs):
+    """Refresh stored autonames if a field they're built from has changed."""
+    state = _autoname_state(instance)
+    if created or state == instance._autoname_state:
+        return
+    instance._autoname_state = state
+    schedule_autoname_refresh(_elisa_plate_ids(instance))
+
+
+def refresh_autonames_on_plate_delete(sender, instance, **kwargs):
+    """Refresh stored autonames when an ELISA plate is deleted."""
+    schedule_autoname_refresh({instance.pk})
+
+
+def link_nanobody_on_change(sender, instance, created, **kwargs):
+    """Update a nanobody's seqruns if its sequence has changed."""
+    if instance.previous_sequence != instance.sequence or created:
+        link_nanobody(instance)
+
+
+def bump_records_generation(sender, action=None, **kwargs):
+    """Invalidate cached summaries of projects and their records."""
+    # m2m_changed is sent before and after each change; only count it once
+    if action is None or action.startswith("post_"):
+        DataGeneration.bump(DataGeneration.RECORDS)
+
+
+def evict_airr_frames(sender, instance, **kwargs):
+    """Drop cached AIRR frames when sequencing run results change."""
+    airr_frame_cache.evict(instance.pk)
+
+
+def remember_clonotypes(sender, instance, **kwargs):
+    """Note the CDR3s of sequencing run results which are being deleted."""
+    instance._clonotype_cdr3s = set(
+        AirrSequence.objects.filter(results=instance).values_list("cdr3_aa", flat=True)
+    )
+
+
+def refresh_clonotypes_on_delete(sender, instance, **kwargs):
+    """Update the clonotypes of deleted sequencing run results."""
+    refresh_clonotypes(getattr(instance, "_clonotype_cdr3s", ()))
+
+
+def bump_sequences_generation(sender, instance, **kwargs):
+    """Invalidate artifacts built from stored AIRR records."""
+    DataGeneration.bump(DataGeneration.SEQUENCES)
+
+
+for model in AUTONAME_FIELDS:
+    post_init.connect(remember_autoname_state, sender=model)
+    post_save.connect(refresh_autonames_on_change, sender=model)
+post_save.connect(link_nanobody_on_change, sender=Nanobody)
+post_delete.connect(refresh_autonames_on_plate_delete, sender=ElisaPlate)
+post_delete.connect(bump_sequences_generation, sender=SequencingRunResults)
+pre_delete.connect(remember_clonotypes, sender=SequencingRunResults)
+post_delete.connect(refresh_clonotypes_on_delete, sender=SequencingRunResults)
+post_save.connect(evict_airr_frames, sender=SequencingRunResults)
+post_delete.connect(evict_airr_frames, sender=SequencingRunResults)
+for model in RECORDS_MODELS:
+    post_save.connect(bump_records_generation, sender=model)
+    post_delete.connect(bump_records_generation, sender=model)
+m2m_changed.connect(bump_records_generation, sender=Cohort.antigens.through)
+m2m_changed.connect(bump_records_generation, sender=Cohort.projects.through)
@@ -0,0 +1,357 @@
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from antigenapi.models import (
+    AirrSequence,
+    AirrSequenceKmer,
+    Antigen,
+    Cohort,
+    DataGeneration,
+    Nanobody,
+    SequencingRun,
+    SequencingRunResults,
+)
+from antigenapi.utils.frame_cache import (
+    FrameCache,
+    airr_frame_cache,
+    seqrun_frame_cache,
+)
+from antigenapi.utils.helpers import (
+    _index_airr_sequences,
+    iter_seqrun_results,
+    link_results_nanobodies,
+    read_airr_sequences,
+    read_seqrun_results,
+    read_seqrun_results_many,
+    search_airr_sequences,
+    sequence_hash,
+    store_airr_sequences,
+)
+
+
+@override_settings(MEDIA_ROOT=Path(tempfile.TemporaryDirectory().name))
+class TestAirrSequences(TestCase):
+    def setUp(self):
+        call_command("load_fixtures", "example-smcd1")
+        # load_fixtures copies media to the root of MEDIA_ROOT, without "uploads/"
+        SequencingRunResults.objects.update(
+            airr_file="sequencingresults/SequencingResults_1_0_vquestairr.tsv"
+        )
+
+    def test_backfill_command_stores_records_with_elisa_wells(self):
+        call_command("backfill_airr_sequences")
+
+        srr = SequencingRunResults.objects.get()
+        airr_df = srr.read_airr()
+        sequences = AirrSequence.objects.filter(results=srr)
+        assert sequences.count() == len(airr_df)
+        assert list(sequences.values_list("sequence_id", flat=True)) == list(
+            airr_df["sequence_id"]
+        )
+        assert not sequences.filter(elisa_well__isnull=True).exists()
+
+    def test_read_airr_sequences_stores_on_first_read(self):
+        srr = SequencingRunResults.objects.get()
+        assert not AirrSequence.objects.exists()
+
+        df = read_airr_sequences(srr, usecols=("sequence_id", "cdr3_aa"))
+
+        assert list(df.columns) == ["sequence_id", "cdr3_aa"]
+        assert len(df) == AirrSequence.objects.count()
+        assert df["cdr3_aa"].tolist() == srr.read_airr()["cdr3_aa"].tolist()
+
+    def test_read_airr_sequences_caches_frames_until_results_change(self):
+        srr = SequencingRunResults.objects.get()
+        store_airr_sequences(srr)
+        usecols = ("sequence_id", "cdr3_aa")
+        df = read_airr_sequences(srr, usecols=usecols)
+        df["cdr3_aa"] = None
+
+        # Only the data generation is read
+        with self.assertNumQueries(1):
+            cached = read_airr_sequences(srr, usecols=usecols)
+        assert cached["cdr3_aa"].notna().all()
+        assert airr_frame_cache.info()[:2] == (1, 1)
+
+        srr.save()
+        with self.assertNumQueries(3):
+            read_airr_sequences(srr, usecols=usecols)
+        assert airr_frame_cache.info().misses == 2
+
+        # Records changed by another process aren't served from the cache
+        DataGeneration.bump(DataGeneration.SEQUENCES)
+        read_airr_sequences(srr, usecols=usecols)
+        assert airr_frame_cache.info().misses == 3
+
+        srr.delete()
+        assert airr_frame_cache.info().currsize == 0
+
+    def test_read_seqrun_results_uses_stored_records(self):
+        df = read_seqrun_results(1, usecols=("sequence_id", "cdr3_aa"))
+
+        assert len(df) == AirrSequence.objects.count()
+        assert df["nanobody_autoname"].str.startswith("SmCD1_").all()
+
+    def test_autonames_stored_with_elisa_data(self):
+        df = read_seqrun_results(
+            1,
+            usecols=("sequence_id", "elisa_plate_id", "elisa_optical_density"),
+        )
+
+        stored = AirrSequence.objects.select_related("elisa_well")
+        assert df["nanobody_autoname"].tolist() == [s.nanobody_autoname for s in stored]
+        assert df["elisa_plate_id"].tolist() == [s.elisa_well.plate_id for s in stored]
+        assert df["elisa_optical_density"].tolist() == [
+            s.elisa_well.optical_density for s in stored
+        ]
+        assert df["nanobody_autoname"].str.fullmatch(r"SmCD1_(50|10)[A-H]\d+_C15").all()
+
+    def test_autonames_refreshed_when_upstream_fields_change(self):
+        call_command("backfill_airr_sequences")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            antigen = Antigen.objects.get(short_name="SmCD1")
+            antigen.short_name = "SmCD1b"
+            antigen.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            cohort = Cohort.objects.get(cohort_num=15)
+            cohort.is_naive = True
+            cohort.save()
+
+        assert (
+            AirrSequence.objects.exclude(nanobody_autoname__startswith="SmCD1b_")
+            .exclude(nanobody_autoname__endswith="_CN15")
+            .count()
+            == 0
+        )
+
+    def test_autonames_not_refreshed_for_unrelated_changes(self):
+        call_command("backfill_airr_sequences")
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            antigen = Antigen.objects.get(short_name="SmCD1")
+            antigen.description = "Updated"
+            antigen.save()
+
+        assert callbacks == []
+
+    def test_sequences_generation_bumped_on_store_and_delete(self):
+        start = DataGeneration.current(DataGeneration.SEQUENCES)
+        call_command("backfill_airr_sequences")
+        stored = DataGeneration.current(DataGeneration.SEQUENCES)
+        SequencingRunResults.objects.get().delete()
+
+        assert start < stored < DataGeneration.current(DataGeneration.SEQUENCES)
+
+    def test_kmer_index_replaced_on_restore(self):
+        srr = SequencingRunResults.objects.get()
+        store_airr_sequences(srr)
+        count = AirrSequenceKmer.objects.count()
+        assert count > 0
+        store_airr_sequences(srr)
+
+        assert AirrSequenceKmer.objects.count() == count
+        assert not AirrSequenceKmer.objects.exclude(
+            sequence__in=AirrSequence.objects.all()
+        ).exists()
+
+    def test_search_matches_linear_scan(self):
+        df = read_seqrun_results(
+            1, usecols=("sequence_id", "sequence_alignment_aa", "cdr3_aa")
+        )
+        cdr3 = df["cdr3_aa"].dropna().iloc[0]
+        full = df["sequence_alignment_aa"].dropna().iloc[0]
+
+        for query, region in (
+            (cdr3, "cdr3"),
+            (cdr3[2:6].lower(), "cdr3"),
+            (cdr3[:2], "cdr3"),
+            (full[30:60], "full"),
+            (full[5:9], "full"),
+            ("QVQ", "full"),
+            ("WWWWWW", "full"),
+        ):
+            column = "cdr3_aa" if region == "cdr3" else "sequence_alignment_aa"
+            expected = df[df[column].notna()]
+            expected = expected[expected[column].str.contains(query.upper())]
+            expected = expected[
+                [
+                    "sequencing_run",
+                    "nanobody_autoname",
+                    "sequence_alignment_aa",
+                    "cdr3_aa",
+                ]
+            ]
+
+            assert search_airr_sequences(query, region) == expected.to_dict(
+                orient="records"
+            ), (query, region)
+
+    def test_search_does_not_store_missing_records(self):
+        cdr3 = SequencingRunResults.objects.get().read_airr()["cdr3_aa"].dropna()
+        assert search_airr_sequences(cdr3.iloc[0], "cdr3") == []
+        assert not AirrSequence.objects.exists()
+
+        # The jobs worker stores them when it starts
+        call_command("run_jobs", "--once")
+        assert search_airr_sequences(cdr3.iloc[0], "cdr3")
+
+    def test_search_endpoint_stores_missing_records(self):
+        cdr3 = SequencingRunResults.objects.get().read_airr()["cdr3_aa"].dropna()
+        client = APIClient()
+        client.force_authenticate(User.objects.first())
+
+        response = client.get(
+            f"/api/sequencingrun/searchseq/{cdr3.iloc[0]}/?searchRegion=cdr3"
+        )
+        assert response.json()["matches"]
+        assert AirrSequence.objects.exists()
+
+    def test_search_skips_queries_with_unindexed_kmers(self):
+        store_airr_sequences(SequencingRunResults.objects.get())
+        search_airr_sequences("QVQ", "full")
+
+        # Only the k-mer counts are needed, and they're cached
+        with self.assertNumQueries(1):
+            assert search_airr_sequences("QVQWWW", "full") == []
+
+    def test_nanobody_linked_by_sequence_hash(self):
+        srr = SequencingRunResults.objects.get()
+        aln = srr.read_airr()["sequence_alignment_aa"].dropna().iloc[0]
+        user = srr.added_by
+        call_command("backfill_airr_sequences")
+
+        # Linking is a fixed number of queries, however much data is stored
+        with self.assertNumQueries(8):
+            nanobody = Nanobody.objects.create(
+                name="nb1", sequence=aln.replace(".", ""), added_by=user
+            )
+        assert list(nanobody.seqruns.all()) == [srr]
+        assert AirrSequence.objects.filter(
+            sequence_hash=sequence_hash(nanobody.sequence)
+        ).exists()
+
+        nanobody.sequence = "QVQ"
+        nanobody.save()
+        assert not nanobody.seqruns.exists()
+
+    def test_results_linked_to_existing_nanobodies(self):
+        srr = SequencingRunResults.objects.get()
+        aln = srr.read_airr()["sequence_alignment_aa"].dropna().iloc[0]
+        srr.delete()
+        nanobody = Nanobody.objects.create(
+            name="nb1", sequence=aln.replace(".", ""), added_by=srr.added_by
+        )
+        assert not nanobody.seqruns.exists()
+
+        call_command("load_fixtures", "example-smcd1")
+        SequencingRunResults.objects.update(
+            airr_file="sequencingresults/SequencingResults_1_0_vquestairr.tsv"
+        )
+        srr = SequencingRunResults.objects.get()
+        store_airr_sequences(srr)
+        link_results_nanobodies(srr)
+
+        assert list(nanobody.seqruns.all()) == [srr]
+
+    def test_read_seqrun_results_many_matches_single_run_reads(self):
+        usecols = ("sequence_id", "cdr3_aa", "elisa_plate_id")
+        single = read_seqrun_results(1, usecols=usecols)
+        seqrun_frame_cache.clear()
+
+        with self.assertNumQueries(5):
+            many = read_seqrun_results_many([1, 2, 99], usecols=usecols)
+        pd.testing.assert_frame_equal(many, single)
+        # Cached until the records or their ELISA data change
+        with self.assertNumQueries(4):
+            read_seqrun_results_many([1, 2, 99], usecols=usecols)
+        DataGeneration.bump(DataGeneration.RECORDS)
+        with self.assertNumQueries(5):
+            read_seqrun_results_many([1, 2, 99], usecols=usecols)
+
+        assert [
+            (pk, df.equals(single)) for pk, df in iter_seqrun_results([99, 1], usecols)
+        ] == [(1, True)]
+        assert read_seqrun_results_many([99], usecols).empty
+
+
+def _nanobody(rng):
+    """A synthetic nanobody sequence, with random CDRs in a fixed framework."""
+
+    def cdr(length):
+        return "".join(rng.choices("ACDEFGHIKLMNPQRSTVWY", k=length))
+
+    cdr3 = cdr(rng.randint(10, 18))
+    return (
+        f"QVQLQESGGGLVQAGGSLRLSCAASG{cdr(8)}MGWFRQAPGKEREFVA{cdr(8)}"
+        f"YYADSVKGRFTISRDNAKNTVYLQMNSLKPEDTAVYYC{cdr3}WGQGTQVTVSS",
+        cdr3,
+    )
+
+
+@pytest.mark.benchmark
+@pytest.mark.django_db
+def test_benchmark_search_airr_sequences():
+    call_command("load_fixtures", "example-smcd1")
+    SequencingRunResults.objects.all().delete()
+    run = SequencingRun.objects.get(pk=1)
+    rng = random.Random(0)
+    n_runs = 200
+    sequences = []
+    for seq in range(n_runs):
+        srr = SequencingRunResults.objects.create(
+            sequencing_run=run, seq=seq, added_by=run.added_by
+        )
+        for row_num in range(96):
+            aln, cdr3 = _nanobody(rng)
+            sequences.append(
+                AirrSequence(
+                    results=srr,
+                    row_num=row_num,
+                    sequence_id=f"{seq}_{row_num}",
+                    sequence_alignment_aa=aln,
+                    cdr3_aa=cdr3,
+                )
+            )
+    AirrSequence.objects.bulk_create(sequences, batch_size=1000)
+    _index_airr_sequences(sequences)
+    DataGeneration.bump(DataGeneration.SEQUENCES)
+
+    queries = [
+        *((seq.sequence_alignment_aa, "full") for seq in sequences[::997]),
+        *((seq.cdr3_aa, "full") for seq in sequences[1::997]),
+        *((seq.cdr3_aa, "cdr3") for seq in sequences[2::997]),
+    ]
+    # The first search counts the k-mers
+    search_airr_sequences(*queries[0])
+    start = time.perf_counter()
+    for query, region in queries:
+        assert search_airr_sequences(query, region)
+    search_time = (time.perf_counter() - start) / len(queries)
+    print(
+        f"\nSearch {len(sequences)} records from {n_runs} runs: "
+        f"{search_time * 1000:.1f} ms per query"
+    )
+    assert search_time < 0.1
+
+
+def test_frame_cache_evicts_least_recently_used():
+    cache = FrameCache(maxsize=2)
+    for pk in (1, 2, 1, 3):
+        cache.get_or_read((pk, "file.tsv"), lambda: pd.DataFrame({"pk": [pk]}))
+
+    assert cache.info() == (1, 3, 2, 2)
+    cache.get_or_read((2, "file.tsv"), pd.DataFrame)
+    assert cache.info().misses == 4
+
+    cache.evict(3)
+    assert cache.info().currsize == 1
@@ -0,0 +1,71 @@
+import io
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from antigenapi.bioinformatics.imgt import (
+    AIRR_IMPORTANT_COLUMNS,
+    read_airr_file,
+    read_airr_sidecar,
+    write_airr_sidecar,
+)
+from antigenapi.models import SequencingRunResults
+
+_AIRR_TSV = (
+    "sequence_id\tproductive\tsequence_alignment_aa\tcdr3_aa\t\n"
+    "seq_A01\tT\tQVQL..\tCAR\t\n"
+    "seq_B01\tF\t\t\t\n"
+)
+
+
+def test_sidecar_roundtrip_matches_tsv():
+    airr_df = read_airr_file(io.BytesIO(_AIRR_TSV.encode()), usecols=None)
+    sidecar = io.BytesIO(write_airr_sidecar(airr_df))
+
+    usecols = ("cdr3_aa", "sequence_id")
+    pd.testing.assert_frame_equal(
+        read_airr_sidecar(sidecar, usecols=usecols),
+        read_airr_file(io.BytesIO(_AIRR_TSV.encode()), usecols=usecols),
+    )
+
+
+def test_sidecar_all_columns_when_usecols_none():
+    airr_df = read_airr_file(io.BytesIO(_AIRR_TSV.encode()), usecols=None)
+    sidecar = io.BytesIO(write_airr_sidecar(airr_df))
+
+    pd.testing.assert_frame_equal(read_airr_sidecar(sidecar, usecols=None), airr_df)
+
+
+def test_sidecar_missing_column_raises():
+    airr_df = read_airr_file(io.BytesIO(_AIRR_TSV.encode()), usecols=None)
+    sidecar = io.BytesIO(write_airr_sidecar(airr_df))
+
+    with pytest.raises(ValueError, match="Usecols do not match"):
+        read_airr_sidecar(sidecar, usecols=("sequence_id", "fwr1_aa"))
+
+
+@override_settings(MEDIA_ROOT=Path(tempfile.TemporaryDirectory().name))
+class TestAirrSidecarBackfill(TestCase):
+    def setUp(self):
+        call_command("load_fixtures", "example-smcd1")
+        # load_fixtures copies media to the root of MEDIA_ROOT, without "uploads/"
+        SequencingRunResults.objects.update(
+            airr_file="sequencingresults/SequencingResults_1_0_vquestairr.tsv"
+        )
+
+    def test_read_airr_backfills_sidecar(self):
+        srr = SequencingRunResults.objects.get()
+        assert not srr.airr_sidecar_file
+
+        airr_df = srr.read_airr()
+
+        srr.refresh_from_db()
+        assert srr.airr_sidecar_file.name.endswith("_vquestairr.parquet")
+        with srr.airr_file.open("rb") as f:
+            expected = read_airr_file(f)
+        pd.testing.assert_frame_equal(airr_df, expected)
+        assert set(airr_df.columns) == set(AIRR_IMPORTANT_COLUMNS)
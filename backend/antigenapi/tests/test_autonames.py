@@ -0,0 +1,123 @@
+import random
+import time
+
+import pandas as pd
+import pytest
+
+from antigenapi.models import PlateLocations
+from antigenapi.utils.helpers import (
+    INDEX_NOT_FOUND,
+    WELL_UNPARSEABLE,
+    extract_well,
+    resolve_nanobody_autonames,
+)
+
+
+def _resolve_loop(sequence_ids, seq, well_pos_offset, lookups):
+    """Reference (per-row) resolution, as used before vectorization."""
+    nanobody_autonames_lookup, elisa_well_lookup = lookups
+    autonames, elisa_well_ids = [], []
+    for sequence_id in sequence_ids:
+        try:
+            well_lookup = (
+                PlateLocations.labels.index(
+                    extract_well(sequence_id.rsplit("_", 1)[-1])
+                )
+                + 1
+                - well_pos_offset
+            )
+            autonames.append(nanobody_autonames_lookup[(seq, well_lookup)])
+        except ValueError:
+            autonames.append(WELL_UNPARSEABLE)
+            elisa_well_ids.append(None)
+        except KeyError:
+            autonames.append(INDEX_NOT_FOUND)
+            elisa_well_ids.append(None)
+        else:
+            elisa_well_ids.append(elisa_well_lookup[(seq, well_lookup)])
+    return autonames, elisa_well_ids
+
+
+def _lookups(seq_plates=(0, 1), locations=range(1, 97, 2)):
+    autonames = {
+        (plate, loc): f"AG_50{PlateLocations.labels[loc - 1]}.{plate}_C1"
+        for plate in seq_plates
+        for loc in locations
+    }
+    elisa_wells = {key: idx + 1 for idx, key in enumerate(autonames)}
+    return autonames, elisa_wells
+
+
+def _assert_matches_loop(sequence_ids, seq, well_pos_offset, lookups):
+    resolved = resolve_nanobody_autonames(
+        pd.Series(sequence_ids, dtype=object), seq, well_pos_offset, lookups
+    )
+    autonames, elisa_well_ids = _resolve_loop(
+        sequence_ids, seq, well_pos_offset, lookups
+    )
+    assert resolved["nanobody_autoname"].tolist() == autonames
+    assert resolved["elisa_well_id"].tolist() == elisa_well_ids
+
+
+def test_resolve_matches_loop_for_edge_cases():
+    sequence_ids = [
+        "606554801_SmCD1_10_C9_PHD_SEQ_FWD_C01",
+        "run_a1",
+        "run_h12",
+        "run_B011",
+        "run_X13",
+        "run_no_well",
+        "nounderscoreA3",
+        "run_A2",
+        "run_",
+        "run_G10",
+        "run_E07",
+    ]
+    lookups = _lookups()
+
+    for seq in (0, 1, 2):
+        for offset in (0, 1, 5):
+            _assert_matches_loop(sequence_ids, seq, offset, lookups)
+
+
+def test_resolve_with_empty_inputs():
+    _assert_matches_loop([], 0, 0, _lookups())
+    _assert_matches_loop(["run_A1", "run_Z"], 0, 0, ({}, {}))
+
+
+def _synthetic_sequence_ids(n):
+    rng = random.Random(0)
+    ids = []
+    for i in range(n):
+        label = rng.choice(PlateLocations.labels)
+        if rng.random() < 0.3:
+            label = label[0] + label[1:].zfill(2)
+        if rng.random() < 0.02:
+            label = "unknown"
+        ids.append(f"{i}_Antigen_{rng.randint(1, 99)}_PHD_SEQ_FWD_{label}")
+    return ids
+
+
+def test_resolve_matches_loop_for_synthetic_ids():
+    _assert_matches_loop(_synthetic_sequence_ids(2000), 1, 1, _lookups())
+
+
+@pytest.mark.benchmark
+def test_benchmark_resolve_10k_rows():
+    sequence_ids = _synthetic_sequence_ids(10_000)
+    series = pd.Series(sequence_ids, dtype=object)
+    lookups = _lookups()
+
+    start = time.perf_counter()
+    _resolve_loop(sequence_ids, 1, 0, lookups)
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    resolve_nanobody_autonames(series, 1, 0, lookups)
+    vectorized_time = time.perf_counter() - start
+
+    print(
+        f"\nResolve 10k rows: loop {loop_time * 1000:.1f} ms, "
+        f"vectorized {vectorized_time * 1000:.1f} ms"
+    )
+    assert vectorized_time < loop_time
@@ -1,4 +1,6 @@
 import json
+import os
+import time
 from types import SimpleNamespace
 
 import pandas as pd
@@ -270,32 +272,25 @@ def test_get_db_fasta_returns_empty_string_when_no_sequences(monkeypatch):
 
 
 def test_get_db_fasta_includes_all_runs_when_include_run_not_set(monkeypatch):
-    df1 = pd.DataFrame(
-        {
-            "sequence_id": ["x_A01"],
-            "sequence_alignment_aa": ["AAAA"],
-            "cdr3_aa": ["AAA"],
-            "nanobody_autoname": ["NB1"],
-            "sequencing_run": [1],
-        }
-    )
-    df2 = pd.DataFrame(
+    df = pd.DataFrame(
         {
-            "sequence_id": ["y_A01"],
-            "sequence_alignment_aa": ["MADE"],
-            "cdr3_aa": ["MKD"],
-            "nanobody_autoname": ["NB2"],
-            "sequencing_run": [2],
+            "sequence_id": ["x_A01", "y_A01"],
+            "sequence_alignment_aa": ["AAAA", "MADE"],
+            "cdr3_aa": ["AAA", "MKD"],
+            "nanobody_autoname": ["NB1", "NB2"],
+            "sequencing_run": [1, 2],
         }
     )
 
     calls = []
 
-    def _fake_read_seqrun_results(pk, usecols):
-        calls.append((pk, usecols))
-        return df1 if pk == 1 else df2
+    def _fake_read_seqrun_results_many(pks, usecols):
+        calls.append((list(pks), usecols))
+        return df
 
-    monkeypatch.setattr(blast, "read_seqrun_results", _fake_read_seqrun_results)
+    monkeypatch.setattr(
+        blast, "read_seqrun_results_many", _fake_read_seqrun_results_many
+    )
     monkeypatch.setattr(
         blast,
         "SequencingRun",
@@ -306,10 +301,7 @@ def test_get_db_fasta_includes_all_runs_when_include_run_not_set(monkeypatch):
     monkeypatch.setattr(blast, "as_fasta_files", lambda *args, **kwargs: ["combined"])
 
     assert blast.get_db_fasta(query_type="full") == "combined"
-    assert calls == [
-        (1, ("sequence_id", "sequence_alignment_aa")),
-        (2, ("sequence_id", "sequence_alignment_aa")),
-    ]
+    assert calls == [([1, 2], ("sequence_id", "sequence_alignment_aa"))]
 
 
 # ---------------------------------------------------------------------------
@@ -342,3 +334,73 @@ def test_get_db_fasta_returns_empty_string_when_run_has_no_cdr3_results(monkeypa
     result = blast.get_db_fasta(include_run=999, query_type="cdr3")
 
     assert result == ""
+
+
+# ---------------------------------------------------------------------------
+# Persistent BLAST database
+# ---------------------------------------------------------------------------
+
+
+def _fake_blast_db_env(monkeypatch, settings, tmp_path, generation):
+    settings.BLAST_DB_ROOT = str(tmp_path)
+    monkeypatch.setattr(
+        blast.DataGeneration, "current", classmethod(lambda cls, name: generation[0])
+    )
+    fasta_calls = []
+
+    def _fake_get_db_fasta(query_type):
+        fasta_calls.append(query_type)
+        return "> NB1\nACDE"
+
+    def _fake_run_blast_tool(args, cwd):
+        assert args[0] == "makeblastdb"
+        with open(f"{cwd}/{blast.BLAST_DB_NAME}.pin", "w") as f:
+            f.write("db")
+
+    monkeypatch.setattr(blast, "get_db_fasta", _fake_get_db_fasta)
+    monkeypatch.setattr(blast, "_run_blast_tool", _fake_run_blast_tool)
+    return fasta_calls
+
+
+def test_get_blast_db_reuses_database_for_same_generation(
+    monkeypatch, settings, tmp_path
+):
+    generation = [3]
+    fasta_calls = _fake_blast_db_env(monkeypatch, settings, tmp_path, generation)
+
+    first = blast.get_blast_db("full")
+    second = blast.get_blast_db("full")
+
+    assert first == second == str(tmp_path / "full" / "3" / blast.BLAST_DB_NAME)
+    assert fasta_calls == ["full"]
+    assert sorted(p.name for p in (tmp_path / "full").iterdir()) == ["3"]
+
+
+def test_get_blast_db_rebuilds_and_removes_old_generation(
+    monkeypatch, settings, tmp_path
+):
+    generation = [3]
+    fasta_calls = _fake_blast_db_env(monkeypatch, settings, tmp_path, generation)
+
+    blast.get_blast_db("cdr3")
+    generation[0] = 4
+    db_path = blast.get_blast_db("cdr3")
+
+    assert db_path == str(tmp_path / "cdr3" / "4" / blast.BLAST_DB_NAME)
+    assert fasta_calls == ["cdr3", "cdr3"]
+    # Searches may still be using the superseded database
+    assert sorted(p.name for p in (tmp_path / "cdr3").iterdir()) == ["3", "4"]
+
+    superseded = time.time() - blast.BLAST_DB_GRACE_PERIOD - 1
+    os.utime(tmp_path / "cdr3" / "4", (superseded, superseded))
+    blast.get_blast_db("cdr3")
+    assert sorted(p.name for p in (tmp_path / "cdr3").iterdir()) == ["4"]
+
+
+def test_get_blast_db_returns_none_for_empty_database(monkeypatch, settings, tmp_path):
+    _fake_blast_db_env(monkeypatch, settings, tmp_path, [1])
+    monkeypatch.setattr(blast, "get_db_fasta", lambda query_type: "")
+    monkeypatch.setattr(blast, "_db_residues", lambda query_type: 0)
+
+    assert blast.get_blast_db("full") is None
+    assert blast.run_blastp("> Q\nACDE", "full") is None
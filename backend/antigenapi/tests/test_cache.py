@@ -0,0 +1,63 @@
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from antigenapi.models import DataGeneration, Project, SequencingRunResults
+from antigenapi.utils.helpers import read_seqrun_results
+
+
+@override_settings(MEDIA_ROOT=Path(tempfile.TemporaryDirectory().name))
+class TestResultCache(TestCase):
+    def setUp(self):
+        call_command("load_fixtures", "example-smcd1")
+        # load_fixtures copies media to the root of MEDIA_ROOT, without "uploads/"
+        SequencingRunResults.objects.update(
+            airr_file="sequencingresults/SequencingResults_1_0_vquestairr.tsv"
+        )
+        self.client = APIClient()
+
+    def test_sequencing_run_results_are_cached_until_sequences_change(self):
+        with patch(
+            "antigenapi.views.sequencing.read_seqrun_results",
+            side_effect=read_seqrun_results,
+        ) as mock_read:
+            first = self.client.get("/api/sequencingrun/1/results/")
+            second = self.client.get("/api/sequencingrun/1/results/")
+            assert mock_read.call_count == 1
+            assert second.json() == first.json()
+            assert len(first.json()["records"]) > 0
+
+            DataGeneration.bump(DataGeneration.SEQUENCES)
+            self.client.get("/api/sequencingrun/1/results/")
+            assert mock_read.call_count == 2
+
+    def test_dashboard_stats_are_cached_until_records_change(self):
+        stats = self.client.get("/api/dashboard/stats").json()["stats"]
+        assert stats[0] == {"name": "Projects", "value": Project.objects.count()}
+
+        with self.assertNumQueries(1):
+            self.client.get("/api/dashboard/stats")
+
+        Project.objects.create(
+            title="Another project",
+            short_title="another",
+            added_by=User.objects.first(),
+        )
+        stats = self.client.get("/api/dashboard/stats").json()["stats"]
+        assert stats[0] == {"name": "Projects", "value": Project.objects.count()}
+
+    def test_project_report_is_cached_until_records_change(self):
+        report = self.client.get("/api/reports/projects").content
+
+        with self.assertNumQueries(3):
+            assert self.client.get("/api/reports/projects").content == report
+
+        project = Project.objects.get()
+        project.short_title = "renamed"
+        project.save()
+        assert b"renamed" in self.client.get("/api/reports/projects").content
@@ -0,0 +1,164 @@
+import tempfile
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db.models import Count
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from antigenapi.models import (
+    AirrSequence,
+    Antigen,
+    Clonotype,
+    ElisaWell,
+    Job,
+    SequencingRunResults,
+)
+from antigenapi.utils.helpers import (
+    cluster_clonotypes,
+    refresh_clonotypes,
+    store_airr_sequences,
+)
+
+
+@override_settings(MEDIA_ROOT=Path(tempfile.TemporaryDirectory().name))
+class TestClonotypes(TestCase):
+    def setUp(self):
+        call_command("load_fixtures", "example-smcd1")
+        # load_fixtures copies media to the root of MEDIA_ROOT, without "uploads/"
+        SequencingRunResults.objects.update(
+            airr_file="sequencingresults/SequencingResults_1_0_vquestairr.tsv"
+        )
+        call_command("backfill_airr_sequences")
+        self.client = APIClient()
+
+    def _expected_counts(self):
+        return dict(
+            AirrSequence.objects.exclude(cdr3_aa__isnull=True)
+            .exclude(cdr3_aa="")
+            .values("cdr3_aa")
+            .annotate(count=Count("pk"))
+            .values_list("cdr3_aa", "count")
+        )
+
+    def test_clonotypes_are_built_when_results_are_stored(self):
+        expected = self._expected_counts()
+        assert expected
+        assert dict(Clonotype.objects.values_list("cdr3_aa", "count")) == expected
+
+        clonotype = Clonotype.objects.order_by("-count").first()
+        assert clonotype.first_seen_run_id == 1
+        assert list(clonotype.runs.values_list("pk", flat=True)) == [1]
+        assert set(clonotype.antigens.all()) == set(
+            Antigen.objects.filter(
+                pk__in=ElisaWell.objects.filter(
+                    airrsequence__cdr3_aa=clonotype.cdr3_aa
+                ).values("antigen_id")
+            )
+        )
+
+    def test_clonotypes_follow_results_changes(self):
+        srr = SequencingRunResults.objects.get()
+        expected = self._expected_counts()
+
+        # Storing the same results again doesn't double count
+        store_airr_sequences(srr)
+        assert dict(Clonotype.objects.values_list("cdr3_aa", "count")) == expected
+
+        srr.delete()
+        assert not Clonotype.objects.exists()
+
+    def test_refresh_clonotypes_removes_unseen_cdr3s(self):
+        Clonotype.objects.create(cdr3_aa="NOTSTORED", count=3)
+        refresh_clonotypes(["NOTSTORED", None, ""])
+        assert not Clonotype.objects.filter(cdr3_aa="NOTSTORED").exists()
+
+    def test_clonotype_endpoint(self):
+        clonotype = Clonotype.objects.order_by("-count", "cdr3_aa").first()
+
+        response = self.client.get(f"/api/clonotype/{clonotype.cdr3_aa}/")
+        assert response.status_code == 200
+        assert response.json()["count"] == clonotype.count
+        assert response.json()["runs"] == [1]
+
+        records = self.client.get("/api/clonotype/?runs=1").json()
+        assert records[0]["cdr3_aa"] == clonotype.cdr3_aa
+        assert len(records) == Clonotype.objects.count()
+
+    def test_sequencing_run_results_include_total_cdr3_counts(self):
+        # Records without a CDR3 have no count
+        AirrSequence.objects.filter(
+            pk=AirrSequence.objects.order_by("pk").first().pk
+        ).update(cdr3_aa=None)
+
+        records = self.client.get("/api/sequencingrun/1/results/").json()["records"]
+        expected = dict(Clonotype.objects.values_list("cdr3_aa", "count"))
+        assert any(record["cdr3_aa"] is None for record in records)
+
+        for record in records:
+            assert record["cdr3_aa_total_count"] == expected.get(record["cdr3_aa"])
+            assert not isinstance(record["cdr3_aa_total_count"], float)
+
+    def test_search_cdr3_endpoint(self):
+        clonotype = Clonotype.objects.order_by("-count", "cdr3_aa").first()
+        # One substitution and one deletion away
+        query = "W" + clonotype.cdr3_aa[1:-1]
+
+        response = self.client.get(
+            f"/api/sequencingrun/searchcdr3/{query}/?maxDistance=2&metric=levenshtein"
+        )
+        assert response.status_code == 200
+        hits = response.json()["hits"]
+        assert {
+            "cdr3_aa": clonotype.cdr3_aa,
+            "distance": 2 if clonotype.cdr3_aa[0] != "W" else 1,
+            "count": clonotype.count,
+            "first_seen_run": 1,
+            "runs": [1],
+        } in hits
+        assert [hit["distance"] for hit in hits] == sorted(
+            hit["distance"] for hit in hits
+        )
+
+        hits = self.client.get(f"/api/sequencingrun/searchcdr3/{query}/").json()["hits"]
+        assert clonotype.cdr3_aa not in [hit["cdr3_aa"] for hit in hits]
+
+        # The index follows changes to the stored records
+        SequencingRunResults.objects.get().delete()
+        hits = self.client.get(
+            f"/api/sequencingrun/searchcdr3/{query}/?maxDistance=2&metric=levenshtein"
+        ).json()["hits"]
+        assert hits == []
+
+    def test_cluster_clonotypes_job(self):
+        assert not Clonotype.objects.exclude(cluster__isnull=True).exists()
+
+        self.client.force_authenticate(User.objects.first())
+        response = self.client.post("/api/clonotype/cluster/")
+        assert response.status_code == 202
+        call_command("run_jobs", "--once")
+        job = Job.objects.get(pk=response.json()["job"])
+        assert job.status == Job.Status.SUCCEEDED, job.error
+        assert job.result["changed"] == Clonotype.objects.count()
+        assert not Clonotype.objects.filter(cluster__isnull=True).exists()
+
+        # Nothing new to cluster
+        assert cluster_clonotypes() == 0
+        clusters = dict(Clonotype.objects.values_list("cdr3_aa", "cluster"))
+        records = self.client.get("/api/sequencingrun/1/results/").json()["records"]
+        for record in records:
+            assert record["cdr3_cluster"] == clusters.get(record["cdr3_aa"])
+
+        # Clusters losing a clonotype are reclustered
+        clonotype = Clonotype.objects.order_by("pk").first()
+        clonotype.cluster = 999
+        clonotype.save()
+        Clonotype.objects.create(cdr3_aa="NOTSTORED", count=1, cluster=999)
+        refresh_clonotypes(["NOTSTORED"])
+        assert Clonotype.objects.get(pk=clonotype.pk).cluster is None
+        assert cluster_clonotypes() == 1
+        assert (
+            Clonotype.objects.get(pk=clonotype.pk).cluster
+            == clusters[clonotype.cdr3_aa]
+        )
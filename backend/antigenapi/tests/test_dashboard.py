@@ -2,6 +2,7 @@ import json
 from datetime import UTC, datetime
 from types import SimpleNamespace
 
+import pytest
 from auditlog.models import LogEntry
 
 from antigenapi.models import ElisaPlate, SequencingRun, SequencingRunResults
@@ -71,6 +72,7 @@ def test_schemalink_returns_object_id_for_non_results():
     assert _schemalink(log_entry) == 55
 
 
+@pytest.mark.django_db
 def test_dashboard_stats_get_uses_model_counts(monkeypatch):
     monkeypatch.setattr(
         "antigenapi.views.dashboard.Project.objects",
@@ -0,0 +1,196 @@
+import io
+import json
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pytest
+from auditlog.models import LogEntry
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from antigenapi.models import DataGeneration, ElisaPlate, ElisaWell
+from antigenapi.parsers import parse_elisa_file, read_elisa_files, read_elisa_wells
+
+ELISA_DIR = (
+    Path(settings.BASE_DIR)
+    / "antigenapi"
+    / "fixtures"
+    / "example-smcd1-files"
+    / "elisaplates"
+)
+ELISA_FILES = sorted(ELISA_DIR.glob("*.xlsx"))
+
+
+def _upload(path, name=None):
+    upload = io.BytesIO(path.read_bytes())
+    upload.name = name or path.name
+    return upload
+
+
+def _details(name, **kwargs):
+    return {
+        "plate_file": name,
+        "library": 1,
+        "antigen": 1,
+        "antibody": "Anti M13",
+        "pan_round_concentration": 10,
+        **kwargs,
+    }
+
+
+@pytest.mark.parametrize("path", ELISA_FILES, ids=lambda path: path.name)
+def test_read_elisa_wells_matches_pandas(path):
+    assert np.array_equal(
+        read_elisa_wells(path), parse_elisa_file(path, engine="pandas"), equal_nan=True
+    )
+
+
+def test_read_elisa_files_reports_each_file():
+    contents = [ELISA_FILES[0].read_bytes(), b"not a spreadsheet"]
+
+    for max_workers in (1, 2):
+        good, bad = read_elisa_files(
+            contents, max_workers=max_workers, min_pool_files=1
+        )
+        assert good.error is None and len(good.vals) == 96
+        assert bad.vals is None and bad.error
+
+
+def test_read_elisa_files_parses_small_batches_in_process(monkeypatch):
+    def _no_pool(*args, **kwargs):
+        raise AssertionError("Worker processes started for a small batch")
+
+    monkeypatch.setattr("antigenapi.parsers.ProcessPoolExecutor", _no_pool)
+
+    results = read_elisa_files([path.read_bytes() for path in ELISA_FILES] * 2)
+    assert all(result.error is None for result in results)
+
+
+def test_read_elisa_files_does_not_fork_server(monkeypatch):
+    start_methods = []
+
+    def _pool(*args, mp_context, **kwargs):
+        start_methods.append(mp_context.get_start_method())
+        return ProcessPoolExecutor(*args, mp_context=mp_context, **kwargs)
+
+    monkeypatch.setattr("antigenapi.parsers.ProcessPoolExecutor", _pool)
+
+    results = read_elisa_files(
+        [path.read_bytes() for path in ELISA_FILES], min_pool_files=1
+    )
+    assert all(result.error is None for result in results)
+    # Forking a threaded server process can deadlock the workers
+    assert start_methods and "fork" not in start_methods
+
+
+@override_settings(MEDIA_ROOT=Path(tempfile.TemporaryDirectory().name))
+class TestBulkElisaUpload(TestCase):
+    def setUp(self):
+        call_command("load_fixtures", "example-smcd1")
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.first())
+
+    def _post(self, files, details):
+        return self.client.post(
+            "/api/elisa_plate/bulk/",
+            {"plate_file": files, "plates": json.dumps(details)},
+        )
+
+    def test_upload_files(self):
+        records = DataGeneration.current(DataGeneration.RECORDS)
+        response = self._post(
+            [_upload(path) for path in ELISA_FILES],
+            [_details(path.name, comments=path.stem) for path in ELISA_FILES],
+        )
+        assert response.status_code == status.HTTP_201_CREATED, response.json()
+
+        created = response.json()
+        assert [plate["comments"] for plate in created] == [
+            path.stem for path in ELISA_FILES
+        ]
+        for plate, path in zip(created, ELISA_FILES):
+            ods = list(
+                ElisaWell.objects.filter(plate_id=plate["id"])
+                .order_by("location")
+                .values_list("optical_density", flat=True)
+            )
+            assert np.array_equal(ods, parse_elisa_file(path), equal_nan=True)
+            stored = ElisaPlate.objects.get(pk=plate["id"])
+            with stored.plate_file.open("rb") as f:
+                assert f.read() == path.read_bytes()
+            assert LogEntry.objects.get_for_object(stored).exists()
+        assert DataGeneration.current(DataGeneration.RECORDS) > records
+
+    def test_upload_zip(self):
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w") as zf:
+            for path in ELISA_FILES:
+                zf.write(path, f"plates/{path.name}")
+            zf.writestr("__MACOSX/plates/._" + ELISA_FILES[0].name, b"")
+        buf.seek(0)
+        buf.name = "plates.zip"
+
+        response = self._post([buf], [_details(path.name) for path in ELISA_FILES])
+        assert response.status_code == status.HTTP_201_CREATED, response.json()
+        assert ElisaPlate.objects.count() == 2 + len(ELISA_FILES)
+
+    def test_upload_reports_every_file(self):
+        bad_file = io.BytesIO(b"not a spreadsheet")
+        bad_file.name = "bad.xlsx"
+        response = self._post(
+            [_upload(ELISA_FILES[0]), _upload(ELISA_FILES[1]), bad_file],
+            [
+                _details(ELISA_FILES[0].name),
+                _details(ELISA_FILES[1].name, library=999),
+                _details("bad.xlsx"),
+                _details("missing.xlsx"),
+            ],
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        errors = response.json()
+        assert set(errors) == {ELISA_FILES[1].name, "bad.xlsx", "missing.xlsx"}
+        assert list(errors[ELISA_FILES[1].name]) == ["library"]
+        assert errors["bad.xlsx"]["plate_file"]
+        assert errors["missing.xlsx"] == {"plate_file": ["File not found in upload"]}
+        # Nothing is stored unless every plate is
+        assert ElisaPlate.objects.count() == 2
+
+    def test_upload_needs_details(self):
+        response = self.client.post(
+            "/api/elisa_plate/bulk/",
+            {"plate_file": [_upload(ELISA_FILES[0])], "plates": "{}"},
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "plates" in response.json()
+
+
+@pytest.mark.benchmark
+def test_benchmark_read_elisa_files():
+    contents = [path.read_bytes() for path in ELISA_FILES] * 200
+
+    start = time.perf_counter()
+    for content in contents:
+        parse_elisa_file(io.BytesIO(content), engine="pandas")
+    pandas_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    read_elisa_files(contents, max_workers=1)
+    in_process_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = read_elisa_files(contents, max_workers=settings.ELISA_PARSE_MAX_WORKERS)
+    pool_time = time.perf_counter() - start
+    print(
+        f"\nParse {len(contents)} ELISA files: pandas {pandas_time * 1000:.0f} ms, "
+        f"in-process {in_process_time * 1000:.0f} ms, "
+        f"{settings.ELISA_PARSE_MAX_WORKERS} workers {pool_time * 1000:.0f} ms"
+    )
+    assert all(result.error is None for result in results)
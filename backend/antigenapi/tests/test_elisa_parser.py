@@ -1,9 +1,40 @@
+import io
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+from pathlib import Path
+
 import numpy as np
+import openpyxl
 import pandas as pd
 import pytest
+from django.conf import settings
 
 from antigenapi.parsers import parse_elisa_file
 
+ELISA_FILES = sorted(
+    (
+        Path(settings.BASE_DIR)
+        / "antigenapi"
+        / "fixtures"
+        / "example-smcd1-files"
+        / "elisaplates"
+    ).glob("*.xlsx")
+)
+
+
+def _workbook(source):
+    """An .xlsx file with a DataFrame's values, read by pandas as a header."""
+    wb = openpyxl.Workbook()
+    # pd.read_excel takes the first row as the header, so the frame starts below
+    wb.active.append([None] * source.shape[1])
+    for row in source.itertuples(index=False):
+        wb.active.append(list(row))
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    return buf
+
 
 def test_parse_elisa_file_returns_96_flattened_values(monkeypatch):
     """OD values are read from the expected cell range and returned flat."""
@@ -12,7 +43,7 @@ def test_parse_elisa_file_returns_96_flattened_values(monkeypatch):
 
     monkeypatch.setattr("antigenapi.parsers.pd.read_excel", lambda _: source)
 
-    values = parse_elisa_file("ignored.xlsx")
+    values = parse_elisa_file("ignored.xlsx", engine="pandas")
 
     assert len(values) == 96
     assert np.array_equal(values, expected)
@@ -24,7 +55,7 @@ def test_parse_elisa_file_raises_when_source_spreadsheet_has_too_few_rows(monkey
     monkeypatch.setattr("antigenapi.parsers.pd.read_excel", lambda _: source)
 
     with pytest.raises(AssertionError):
-        parse_elisa_file("ignored.xlsx")
+        parse_elisa_file("ignored.xlsx", engine="pandas")
 
 
 def test_parse_elisa_file_raises_when_well_values_are_not_numeric(monkeypatch):
@@ -33,4 +64,113 @@ def test_parse_elisa_file_raises_when_well_values_are_not_numeric(monkeypatch):
     monkeypatch.setattr("antigenapi.parsers.pd.read_excel", lambda _: source)
 
     with pytest.raises((ValueError, TypeError)):
-        parse_elisa_file("ignored.xlsx")
+        parse_elisa_file("ignored.xlsx", engine="pandas")
+
+
+def test_parse_elisa_file_reads_the_same_cells_as_pandas():
+    """The default engine reads the cell range of the pandas engine."""
+    source = pd.DataFrame(np.arange(22 * 13).reshape(22, 13))
+    expected = source.iloc[14:22, 1:13].astype(float).values.ravel()
+
+    values = parse_elisa_file(_workbook(source))
+
+    assert values.dtype == float
+    assert np.array_equal(values, expected)
+
+
+@pytest.mark.parametrize("engine", ["openpyxl", "pandas"])
+def test_engines_convert_cells_alike(engine):
+    """Empty and error cells are NaN, and numeric text is a number."""
+    source = pd.DataFrame(np.arange(22 * 13).reshape(22, 13)).astype(object)
+    source.iloc[14, 1] = None
+    source.iloc[14, 2] = "#N/A"
+    source.iloc[14, 3] = "1.5"
+    source.iloc[15, 1] = True
+
+    values = parse_elisa_file(_workbook(source), engine=engine)
+
+    assert np.isnan(values[:2]).all()
+    assert values[2] == 1.5
+    assert values[12] == 1.0
+    assert values[3] == source.iloc[14, 4]
+
+
+def test_parse_elisa_file_reads_other_cell_forms():
+    """Inline strings and cells without references, as other writers save."""
+    source = pd.DataFrame(np.arange(22 * 13).reshape(22, 13))
+    expected = source.iloc[14:22, 1:13].astype(float).values.ravel()
+    expected[0] = 0.5
+
+    main = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+    ET.register_namespace("", main[1:-1])
+    buf = io.BytesIO()
+    with (
+        zipfile.ZipFile(_workbook(source)) as original,
+        zipfile.ZipFile(buf, "w") as zf,
+    ):
+        for info in original.infolist():
+            data = original.read(info)
+            if info.filename == "xl/worksheets/sheet1.xml":
+                root = ET.fromstring(data)
+                b16 = next(c for c in root.iter(f"{main}c") if c.get("r") == "B16")
+                b16.clear()
+                b16.attrib.update({"r": "B16", "t": "inlineStr"})
+                ET.SubElement(ET.SubElement(b16, f"{main}is"), f"{main}t").text = "0.5"
+                row17 = next(r for r in root.iter(f"{main}row") if r.get("r") == "17")
+                for cell in row17:
+                    del cell.attrib["r"]
+                data = ET.tostring(root, xml_declaration=True, encoding="UTF-8")
+            zf.writestr(info, data)
+    buf.seek(0)
+
+    assert np.array_equal(parse_elisa_file(buf), expected)
+
+
+def test_parse_elisa_file_raises_when_spreadsheet_has_too_few_rows():
+    source = pd.DataFrame(np.arange(20 * 13).reshape(20, 13))
+
+    with pytest.raises(ValueError, match="Expected 96 wells"):
+        parse_elisa_file(_workbook(source))
+
+
+def test_parse_elisa_file_raises_when_values_are_not_numeric():
+    source = pd.DataFrame(np.full((22, 13), "x"))
+
+    with pytest.raises(ValueError):
+        parse_elisa_file(_workbook(source))
+
+
+def test_parse_elisa_file_raises_on_other_files():
+    with pytest.raises(ValueError, match="Not a valid .xlsx file"):
+        parse_elisa_file(io.BytesIO(b"not a spreadsheet"))
+
+
+@pytest.mark.parametrize("path", ELISA_FILES, ids=lambda path: path.name)
+def test_engines_agree_on_plate_reader_exports(path):
+    assert np.array_equal(
+        parse_elisa_file(path),
+        parse_elisa_file(path, engine="pandas"),
+        equal_nan=True,
+    )
+
+
+def test_parse_elisa_file_unknown_engine():
+    with pytest.raises(ValueError, match="Unknown ELISA parser engine"):
+        parse_elisa_file(ELISA_FILES[0], engine="xlrd")
+
+
+@pytest.mark.benchmark
+def test_benchmark_parse_elisa_file():
+    contents = ELISA_FILES[0].read_bytes()
+    repeats = 50
+    timings = {}
+    for engine in ("pandas", "openpyxl"):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            parse_elisa_file(io.BytesIO(contents), engine=engine)
+        timings[engine] = (time.perf_counter() - start) / repeats
+    print(
+        "\nParse one ELISA plate: "
+        + ", ".join(f"{engine} {t * 1000:.1f} ms" for engine, t in timings.items())
+    )
+    assert timings["openpyxl"] < timings["pandas"]
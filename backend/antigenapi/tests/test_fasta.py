@@ -0,0 +1,79 @@
+import gzip
+import tempfile
+from pathlib import Path
+
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework import status
+
+from antigenapi.bioinformatics.blast import (
+    FASTA_EXPORT_DIR,
+    _db_residues,
+    _parse_fasta,
+    get_db_fasta,
+    iter_db_fasta,
+)
+from antigenapi.models import DataGeneration, SequencingRunResults
+
+
+@override_settings(MEDIA_ROOT=Path(tempfile.TemporaryDirectory().name))
+class TestFastaExport(TestCase):
+    def setUp(self):
+        call_command("load_fixtures", "example-smcd1")
+        # load_fixtures copies media to the root of MEDIA_ROOT, without "uploads/"
+        SequencingRunResults.objects.update(
+            airr_file="sequencingresults/SequencingResults_1_0_vquestairr.tsv"
+        )
+
+    def test_iter_db_fasta_matches_get_db_fasta(self):
+        for query_type in ("full", "cdr3_unagg"):
+            assert "".join(iter_db_fasta(query_type)) == get_db_fasta(
+                query_type=query_type
+            )
+
+        # Aggregated CDR3s are in no particular order
+        assert sorted("".join(iter_db_fasta("cdr3")).split("\n")) == sorted(
+            get_db_fasta(query_type="cdr3").split("\n")
+        )
+
+    def test_db_residues_bounds_the_search_database(self):
+        for query_type in ("full", "cdr3"):
+            residues = sum(
+                len(seq) for _, seq in _parse_fasta(get_db_fasta(query_type=query_type))
+            )
+            assert residues <= _db_residues(query_type)
+
+        # Cached until the sequences change
+        with self.assertNumQueries(1):
+            _db_residues("full")
+
+    def test_fasta_download_is_cached_with_etag(self):
+        response = self.client.get("/api/fasta/")
+        assert response.status_code == status.HTTP_200_OK
+        assert b"".join(response.streaming_content).decode() == get_db_fasta()
+        etag = response["ETag"]
+        generation = DataGeneration.current(DataGeneration.SEQUENCES)
+        assert etag == f'"fasta-{generation}"'
+
+        response = self.client.get("/api/fasta/", headers={"If-None-Match": etag})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        DataGeneration.bump(DataGeneration.SEQUENCES)
+        response = self.client.get("/api/fasta/", headers={"If-None-Match": etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert response["ETag"] != etag
+        response.close()
+        _, filenames = default_storage.listdir(FASTA_EXPORT_DIR)
+        generation = DataGeneration.current(DataGeneration.SEQUENCES)
+        assert filenames == [f"antigenapp_database.{generation}.fasta"]
+
+    def test_fasta_download_gzip(self):
+        response = self.client.get("/api/fasta/?gzip=true")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response["Content-Type"] == "application/gzip"
+        assert response["ETag"].startswith('"fasta-')
+        assert response["ETag"].endswith('-gz"')
+        data = b"".join(response.streaming_content)
+        assert gzip.decompress(data).decode() == get_db_fasta()
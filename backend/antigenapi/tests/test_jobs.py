@@ -0,0 +1,240 @@
+import io
+import tempfile
+import zipfile
+from datetime import timedelta
+from pathlib import Path
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from antigenapi.models import AirrSequence, Clonotype, Job, SequencingRunResults
+from antigenapi.utils.jobs import (
+    JOB_HANDLERS,
+    JOB_MAX_ATTEMPTS,
+    enqueue_job,
+    run_next_job,
+)
+
+
+def _ok_handler(job):
+    return {"echo": job.params, "input": job.input_file.read().decode()}
+
+
+def _failing_handler(job):
+    raise ValidationError({"file": "Bad upload"})
+
+
+@override_settings(MEDIA_ROOT=Path(tempfile.TemporaryDirectory().name))
+class TestJobs(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="jobs")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @patch.dict(JOB_HANDLERS, {"blast": f"{__name__}._ok_handler"})
+    def test_run_next_job_stores_result_and_removes_input(self):
+        job = enqueue_job(
+            "blast",
+            self.user,
+            params={"pk": 1},
+            input_file=ContentFile(b"data", name="input.txt"),
+        )
+        input_name = job.input_file.name
+
+        assert run_next_job().pk == job.pk
+
+        job.refresh_from_db()
+        assert job.status == Job.Status.SUCCEEDED
+        assert job.result == {"echo": {"pk": 1}, "input": "data"}
+        assert job.started_date is not None and job.finished_date is not None
+        assert not job.input_file.storage.exists(input_name)
+        assert run_next_job() is None
+
+    @patch.dict(JOB_HANDLERS, {"blast": f"{__name__}._failing_handler"})
+    def test_failed_job_records_error(self):
+        job = enqueue_job("blast", self.user)
+        run_next_job()
+
+        job.refresh_from_db()
+        assert job.status == Job.Status.FAILED
+        assert "Bad upload" in job.error
+
+        response = self.client.get(f"/api/job/{job.pk}/result/")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "Bad upload" in response.json()["error"]
+
+    @patch.dict(JOB_HANDLERS, {"blast": f"{__name__}._failing_handler"})
+    @patch("antigenapi.utils.jobs.close_old_connections")
+    def test_worker_replaces_old_connections(self, mock_close_old_connections):
+        enqueue_job("blast", self.user)
+
+        run_next_job()
+        # Before claiming the job, and after running it
+        assert mock_close_old_connections.call_count == 2
+        run_next_job()
+        assert mock_close_old_connections.call_count == 3
+
+    def test_running_job_is_not_claimed_again(self):
+        job = enqueue_job("blast", self.user)
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.Status.RUNNING,
+            started_date=timezone.now(),
+            heartbeat_date=timezone.now(),
+            attempts=1,
+        )
+
+        assert run_next_job() is None
+
+    @patch.dict(JOB_HANDLERS, {"blast": f"{__name__}._ok_handler"})
+    def test_stale_running_job_is_claimed_again(self):
+        job = enqueue_job(
+            "blast", self.user, input_file=ContentFile(b"data", name="input.txt")
+        )
+        stale = timezone.now() - timedelta(seconds=settings.JOB_STALE_AFTER + 1)
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.Status.RUNNING,
+            started_date=stale,
+            heartbeat_date=stale,
+            attempts=1,
+        )
+
+        assert run_next_job().pk == job.pk
+
+        job.refresh_from_db()
+        assert job.status == Job.Status.SUCCEEDED
+        assert job.attempts == 2
+        assert job.result["input"] == "data"
+
+    def test_stale_job_is_failed_after_max_attempts(self):
+        job = enqueue_job(
+            "blast", self.user, input_file=ContentFile(b"data", name="input.txt")
+        )
+        input_name = job.input_file.name
+        stale = timezone.now() - timedelta(seconds=settings.JOB_STALE_AFTER + 1)
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.Status.RUNNING,
+            started_date=stale,
+            heartbeat_date=stale,
+            attempts=JOB_MAX_ATTEMPTS,
+        )
+
+        assert run_next_job() is None
+
+        job.refresh_from_db()
+        assert job.status == Job.Status.FAILED
+        assert "worker stopped" in job.error
+        assert not job.input_file
+        assert not job.input_file.storage.exists(input_name)
+
+    def test_jobs_are_scoped_to_their_user(self):
+        job = enqueue_job("blast", self.user)
+        other = User.objects.create(username="other")
+        self.client.force_authenticate(other)
+
+        assert self.client.get("/api/job/").json() == []
+        response = self.client.get(f"/api/job/{job.pk}/result/")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+        other.is_staff = True
+        other.save()
+        response = self.client.get(f"/api/job/{job.pk}/")
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_enqueue_rejects_unknown_kind(self):
+        with self.assertRaises(ValueError):
+            enqueue_job("unknown", self.user)
+
+    @patch("antigenapi.views.sequencing._blast_query")
+    def test_blastseq_async_returns_job(self, mock_blast_query):
+        mock_blast_query.return_value = [{"query": "QuerySequence"}]
+
+        response = self.client.get("/api/sequencingrun/blastseq/CARDY/?async=true")
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        job_id = response.json()["job"]
+        assert response["Location"].endswith(f"/api/job/{job_id}/")
+        mock_blast_query.assert_not_called()
+
+        response = self.client.get(f"/api/job/{job_id}/result/")
+        assert response.status_code == status.HTTP_202_ACCEPTED
+
+        call_command("run_jobs", "--once")
+
+        mock_blast_query.assert_called_once_with(query="CARDY", search_region="full")
+        response = self.client.get(f"/api/job/{job_id}/")
+        assert response.json()["status"] == Job.Status.SUCCEEDED
+        response = self.client.get(f"/api/job/{job_id}/result/")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == {"hits": [{"query": "QuerySequence"}]}
+
+    @patch("antigenapi.views.sequencing.run_vquest")
+    def test_resultsfile_async_upload(self, mock_run_vquest):
+        call_command("load_fixtures", "example-smcd1")
+        SequencingRunResults.objects.all().delete()
+        fixture_dir = (
+            Path(settings.BASE_DIR)
+            / "antigenapi"
+            / "fixtures"
+            / "example-smcd1-files"
+            / "sequencingresults"
+        )
+        mock_run_vquest.return_value = {
+            "Parameters.txt": "",
+            "vquest_airr.tsv": (
+                fixture_dir / "SequencingResults_1_0_vquestairr.tsv"
+            ).read_text(),
+        }
+
+        with open(fixture_dir / "sequencing-data.zip", "rb") as f:
+            response = self.client.put(
+                "/api/sequencingrun/1/resultsfile/0/?async=true", {"file": f}
+            )
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert not SequencingRunResults.objects.exists()
+
+        call_command("run_jobs", "--once")
+
+        job = Job.objects.get(pk=response.json()["job"])
+        assert job.status == Job.Status.SUCCEEDED, job.error
+        srr = SequencingRunResults.objects.get()
+        assert srr.seqres_file.name.endswith(".zip")
+        assert srr.added_by == self.user
+        assert AirrSequence.objects.filter(results=srr).count() == 8
+        assert job.result["sequencingrunresults_set"][0]["seq"] == 0
+        # The new clonotypes are clustered by a follow-up job
+        assert Job.objects.get(kind="clustercdr3").status == Job.Status.SUCCEEDED
+        assert Clonotype.objects.exists()
+        assert not Clonotype.objects.filter(cluster__isnull=True).exists()
+
+    def test_resultsfile_upload_checks_wells_before_reading_sequences(self):
+        call_command("load_fixtures", "example-smcd1")
+        SequencingRunResults.objects.all().delete()
+        fixture_zip = (
+            Path(settings.BASE_DIR)
+            / "antigenapi"
+            / "fixtures"
+            / "example-smcd1-files"
+            / "sequencingresults"
+            / "sequencing-data.zip"
+        )
+        upload = io.BytesIO(fixture_zip.read_bytes())
+        with zipfile.ZipFile(upload, "a") as zf:
+            zf.writestr("sequencing-data/extra_H12.seq", "ATGACGT")
+        upload.seek(0)
+        upload.name = "sequencing-data.zip"
+
+        with patch.object(zipfile.ZipFile, "open") as mock_open:
+            response = self.client.put(
+                "/api/sequencingrun/1/resultsfile/0/?async=true", {"file": upload}
+            )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "Upload contains data for 9 wells, expected 8" in str(response.json())
+        mock_open.assert_not_called()
+        assert not Job.objects.exists()
@@ -1,12 +1,24 @@
 import io
+import tracemalloc
 import unittest
+import unittest.mock
 import zipfile
+from pathlib import Path
+
+import pandas as pd
+import pytest
 
 from antigenapi.bioinformatics.imgt import (
+    AIRR_IMPORTANT_COLUMNS,
+    SequenceFileError,
+    _StrippedLinesReader,
     as_fasta_files,
+    as_fasta_records,
+    iter_zip_sequences,
     load_sequences,
     read_airr_file,
     trim_sequence,
+    zip_sequence_members,
 )
 from antigenapi.utils.helpers import extract_well
 
@@ -37,6 +49,39 @@ class TestSequenceParsers(unittest.TestCase):
         seqs = load_sequences(zip_file)
         self.assertEqual(seqs, expected_result)
 
+    def test_zip_sequence_members_reads_names_only(self):
+        zip_file = _create_zip(
+            {"run/asdfA01.seq": "atgacgt", "__MACOSX/B2.seq": "", "notes.txt": ""}
+        )
+        with unittest.mock.patch.object(zipfile.ZipFile, "open") as mock_open:
+            members = zip_sequence_members(zip_file)
+        mock_open.assert_not_called()
+        self.assertEqual(members, {"asdfA01": "run/asdfA01.seq"})
+
+    def test_iter_zip_sequences_keeps_zip_order(self):
+        seq_input_data = {f"x_{well}.seq": f"ATG{well[0]}" for well in ("A1", "C2")}
+        seq_input_data.update({f"y_{i}.seq": "ATGACGT" * i for i in range(50)})
+        zip_file = _create_zip(seq_input_data)
+
+        seqs = list(iter_zip_sequences(zip_file, max_workers=3))
+        self.assertEqual(
+            [name for name, _ in seqs],
+            [name.removesuffix(".seq") for name in seq_input_data],
+        )
+        self.assertEqual(seqs[0], ("x_A1", "A"))
+        self.assertEqual(seqs[-1], ("y_49", "ACGT" + "ATGACGT" * 48))
+
+    def test_iter_zip_sequences_raises_file_errors(self):
+        zip_file = _create_zip({"A1.seq": "ATGACGT", "B1.seq": "ATGXYZ"})
+        with self.assertRaisesRegex(SequenceFileError, "File B1.seq: Sequence"):
+            list(iter_zip_sequences(zip_file))
+
+    def test_as_fasta_records_skips_empty_sequences(self):
+        self.assertEqual(
+            list(as_fasta_records([("a", "ACGT"), ("b", ""), ("c", "GG")])),
+            ["> a\nACGT", "> c\nGG"],
+        )
+
     def test_trim_sequences(self):
         with self.assertRaises(ValueError):
             trim_sequence("X")
@@ -114,3 +159,59 @@ class TestReadAirrFile(unittest.TestCase):
         tsv = b"sequence_id\tproductive\r\nseq_A01\tT\r\n"
         result = read_airr_file(io.BytesIO(tsv), usecols=("sequence_id", "productive"))
         self.assertEqual(list(result["sequence_id"]), ["seq_A01"])
+
+    def test_read_airr_file_strips_trailing_tabs(self):
+        tsv = b"sequence_id\tproductive\t\nseq_A01\tT\t\nseq_B02\tF"
+        result = read_airr_file(io.BytesIO(tsv), usecols=None)
+        self.assertEqual(list(result.columns), ["sequence_id", "productive"])
+        self.assertEqual(list(result["productive"]), ["T", "F"])
+
+    def test_stripped_lines_reader_handles_lines_across_chunks(self):
+        tsv = b" sequence_id\tproductive\t\r\nseq_A01\tT\t\n\nseq_B02\tF\r\n"
+        for chunk_size in (1, 3, 7, len(tsv)):
+            reader = _StrippedLinesReader(io.BytesIO(tsv), chunk_size=chunk_size)
+            self.assertEqual(
+                reader.read(),
+                b"sequence_id\tproductive\nseq_A01\tT\n\nseq_B02\tF\n",
+            )
+
+
+def _read_airr_file_in_memory(airr_file, usecols):
+    # Previous implementation, which cleaned a decoded copy of the whole file
+    buffer = io.StringIO(
+        "\n".join(line.strip() for line in airr_file.read().decode("utf8").split("\n"))
+    )
+    return pd.read_csv(buffer, sep="\t", header=0, usecols=usecols)
+
+
+@pytest.mark.benchmark
+def test_benchmark_read_airr_file_memory():
+    fixture = (
+        Path(__file__).parent.parent
+        / "fixtures"
+        / "example-smcd1-files"
+        / "sequencingresults"
+        / "SequencingResults_1_0_vquestairr.tsv"
+    ).read_bytes()
+    header, _, body = fixture.partition(b"\n")
+    rows = body.rstrip(b"\n").replace(b"\n", b"\t\n") + b"\t\n"
+    airr_data = header + b"\n" + rows * (8_000_000 // len(rows))
+
+    frames, peaks = {}, {}
+    for name, reader in (
+        ("in memory", _read_airr_file_in_memory),
+        ("streaming", read_airr_file),
+    ):
+        airr_file = io.BytesIO(airr_data)
+        tracemalloc.start()
+        frames[name] = reader(airr_file, usecols=AIRR_IMPORTANT_COLUMNS)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(
+            f"\nRead {len(airr_data) / 1e6:.1f} MB AIRR file ({name}): "
+            f"peak {peak / 1e6:.1f} MB"
+        )
+        peaks[name] = peak
+
+    pd.testing.assert_frame_equal(frames["in memory"], frames["streaming"])
+    assert peaks["streaming"] < peaks["in memory"]
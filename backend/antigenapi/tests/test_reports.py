@@ -3,6 +3,7 @@ import io
 from types import SimpleNamespace
 
 import pandas as pd
+import pytest
 
 from antigenapi.views.reports import ProjectReport, _extract_well_or_none
 
@@ -15,6 +16,7 @@ def test_extract_well_or_none_returns_canonical_well():
     assert _extract_well_or_none("a01") == "A1"
 
 
+@pytest.mark.django_db
 def test_project_report_get_returns_header_when_no_projects(monkeypatch):
     seqrun_manager = SimpleNamespace(
         all=lambda: SimpleNamespace(prefetch_related=lambda *args: [])
@@ -48,6 +50,7 @@ def test_project_report_get_returns_header_when_no_projects(monkeypatch):
     assert len(rows) == 1
 
 
+@pytest.mark.django_db
 def test_project_report_get_computes_counts_for_project(monkeypatch):
     antigen = SimpleNamespace(short_name="Ag1")
     cohort = SimpleNamespace(
@@ -64,7 +67,14 @@ def test_project_report_get_computes_counts_for_project(monkeypatch):
         library_set=SimpleNamespace(all=lambda: [library], count=lambda: 1),
     )
 
-    seq_result = SimpleNamespace(seq=1, airr_file="unused")
+    airr_df = pd.DataFrame(
+        {
+            "sequence_id": ["seq_A01", "seq_B01", "seq_Z99"],
+            "productive": ["T", "F", "T"],
+            "sequence_alignment_aa": ["SEQ_A", "SEQ_B", "SEQ_C"],
+        }
+    )
+    seq_result = SimpleNamespace(seq=1)
 
     class _SeqRun:
         def __init__(self):
@@ -91,15 +101,9 @@ def test_project_report_get_computes_counts_for_project(monkeypatch):
         "antigenapi.views.reports.SequencingRun.objects", seqrun_manager
     )
     monkeypatch.setattr("antigenapi.views.reports.Project.objects", project_manager)
-
-    airr_df = pd.DataFrame(
-        {
-            "sequence_id": ["seq_A01", "seq_B01", "seq_Z99"],
-            "productive": ["T", "F", "T"],
-            "sequence_alignment_aa": ["SEQ_A", "SEQ_B", "SEQ_C"],
-        }
+    monkeypatch.setattr(
+        "antigenapi.views.reports.read_airr_sequences", lambda *_: airr_df
     )
-    monkeypatch.setattr("antigenapi.views.reports.read_airr_file", lambda *_: airr_df)
 
     response = ProjectReport().get(request=None)
     reader = csv.reader(io.StringIO(response.content.decode("utf-8")))
@@ -0,0 +1,168 @@
+import io
+import tempfile
+import zipfile
+from pathlib import Path
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from antigenapi.models import AirrSequence, Job, SequencingRun, SequencingRunResults
+
+FIXTURE_DIR = (
+    Path(settings.BASE_DIR)
+    / "antigenapi"
+    / "fixtures"
+    / "example-smcd1-files"
+    / "sequencingresults"
+)
+
+
+def _echo_vquest(records, **kwargs):
+    """Mock run_vquest: fixture AIRR rows for the submitted sequence IDs."""
+    header, *rows = (
+        (FIXTURE_DIR / "SequencingResults_1_0_vquestairr.tsv").read_text().splitlines()
+    )
+    rows_by_id = {row.split("\t")[0]: row for row in rows}
+    output = [header]
+    for record in records:
+        seq_id = record.partition("\n")[0].lstrip(">").strip()
+        original_id = seq_id.split("_", 1)[1]
+        output.append(seq_id + rows_by_id[original_id][len(original_id) :])
+    return {"Parameters.txt": "params", "vquest_airr.tsv": "\n".join(output) + "\n"}
+
+
+def _multi_plate_zip(plates):
+    """A .zip with the fixture sequences in a directory for each plate."""
+    buf = io.BytesIO()
+    with (
+        zipfile.ZipFile(FIXTURE_DIR / "sequencing-data.zip") as fixture,
+        zipfile.ZipFile(buf, "w") as zf,
+    ):
+        for submission_idx in plates:
+            for info in fixture.infolist():
+                if not info.is_dir() and not info.filename.startswith("__MACOSX"):
+                    zf.writestr(
+                        f"results/{submission_idx}/{info.filename}", fixture.read(info)
+                    )
+    buf.seek(0)
+    buf.name = "results.zip"
+    return buf
+
+
+@override_settings(MEDIA_ROOT=Path(tempfile.TemporaryDirectory().name))
+class TestBulkResultsUpload(TestCase):
+    def setUp(self):
+        call_command("load_fixtures", "example-smcd1")
+        SequencingRunResults.objects.all().delete()
+        # Sequence the same wells again as a second plate
+        sr = SequencingRun.objects.get(pk=1)
+        sr.wells = sr.wells + [{**well, "plate": 1} for well in sr.wells]
+        sr.save()
+        self.user = User.objects.first()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _check_results_stored(self):
+        results = SequencingRunResults.objects.filter(sequencing_run_id=1)
+        assert sorted(results.values_list("seq", flat=True)) == [0, 1]
+        for srr in results:
+            sequence_ids = set(
+                AirrSequence.objects.filter(results=srr).values_list(
+                    "sequence_id", flat=True
+                )
+            )
+            assert len(sequence_ids) == 8
+            assert all(seq_id.startswith("606554801_SmCD1") for seq_id in sequence_ids)
+            assert srr.read_airr()["sequence_id"].str.startswith("606554801").all()
+            # Each plate's results file only holds that plate's files
+            with (
+                srr.seqres_file.open("rb") as f,
+                zipfile.ZipFile(f) as zf,
+                zipfile.ZipFile(FIXTURE_DIR / "sequencing-data.zip") as fixture,
+            ):
+                assert sorted(zf.namelist()) == sorted(
+                    info.filename
+                    for info in fixture.infolist()
+                    if not info.is_dir() and not info.filename.startswith("__MACOSX")
+                )
+
+    @patch("antigenapi.views.sequencing.run_vquest", side_effect=_echo_vquest)
+    def test_upload_multi_plate_archive(self, mock_run_vquest):
+        response = self.client.put(
+            "/api/sequencingrun/1/resultsfiles/", {"file": _multi_plate_zip([0, 1])}
+        )
+        assert response.status_code == status.HTTP_200_OK, response.json()
+
+        # One V-QUEST pipeline, and one response, for both plates
+        mock_run_vquest.assert_called_once()
+        assert len(response.json()["sequencingrunresults_set"]) == 2
+        self._check_results_stored()
+
+    @patch("antigenapi.views.sequencing.run_vquest", side_effect=_echo_vquest)
+    def test_upload_file_per_plate_async(self, mock_run_vquest):
+        with (
+            open(FIXTURE_DIR / "sequencing-data.zip", "rb") as f0,
+            open(FIXTURE_DIR / "sequencing-data.zip", "rb") as f1,
+        ):
+            response = self.client.put(
+                "/api/sequencingrun/1/resultsfiles/?async=true",
+                {"file_0": f0, "file_1": f1},
+            )
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert not SequencingRunResults.objects.exists()
+
+        call_command("run_jobs", "--once")
+
+        job = Job.objects.get(pk=response.json()["job"])
+        assert job.status == Job.Status.SUCCEEDED, job.error
+        mock_run_vquest.assert_called_once()
+        self._check_results_stored()
+
+    @patch("antigenapi.views.sequencing.run_vquest")
+    def test_upload_reports_problems_with_every_plate(self, mock_run_vquest):
+        response = self.client.put(
+            "/api/sequencingrun/1/resultsfiles/",
+            {"file": _multi_plate_zip([0, 2, 3])},
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json()["file"] == [
+            "Plate 2: Plate index 2 not found in sequencing run 1",
+            "Plate 3: Plate index 3 not found in sequencing run 1",
+        ]
+        mock_run_vquest.assert_not_called()
+
+    @patch("antigenapi.views.sequencing.run_vquest")
+    def test_upload_rejects_unexpected_sequence_ids(self, mock_run_vquest):
+        def _renamed(records, **kwargs):
+            results = _echo_vquest(records, **kwargs)
+            results["vquest_airr.tsv"] = results["vquest_airr.tsv"].replace(
+                "\np1_", "\nrenamed_", 1
+            )
+            return results
+
+        mock_run_vquest.side_effect = _renamed
+        response = self.client.put(
+            "/api/sequencingrun/1/resultsfiles/", {"file": _multi_plate_zip([0, 1])}
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "Unexpected sequence ID" in response.json()["file"]
+        assert not SequencingRunResults.objects.exists()
+
+    @patch("antigenapi.views.sequencing.run_vquest", side_effect=_echo_vquest)
+    def test_failed_upload_stores_no_plates(self, mock_run_vquest):
+        with patch(
+            "antigenapi.views.sequencing.link_results_nanobodies",
+            side_effect=[None, RuntimeError("Storage failed")],
+        ):
+            with self.assertRaises(RuntimeError):
+                self.client.put(
+                    "/api/sequencingrun/1/resultsfiles/",
+                    {"file": _multi_plate_zip([0, 1])},
+                )
+        assert not SequencingRunResults.objects.exists()
+        assert not AirrSequence.objects.exists()
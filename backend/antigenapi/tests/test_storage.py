@@ -0,0 +1,126 @@
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, Storage
+
+from antigenapi.bioinformatics.imgt import read_airr_file
+from antigenapi.utils.storage import map_storage_reads
+
+AIRR_FIXTURE = (
+    Path(settings.BASE_DIR)
+    / "antigenapi"
+    / "fixtures"
+    / "example-smcd1-files"
+    / "sequencingresults"
+    / "SequencingResults_1_0_vquestairr.tsv"
+)
+
+
+class RemoteStorage(Storage):
+    """Stand-in for a storage backend that isn't on the local filesystem."""
+
+
+def test_map_storage_reads_is_concurrent_on_remote_storage():
+    barrier = threading.Barrier(2, timeout=5)
+
+    def _read(item):
+        # Both reads must be in flight at once to get past the barrier
+        barrier.wait()
+        return item * 2
+
+    assert list(map_storage_reads(_read, [1, 2], RemoteStorage(), max_workers=2)) == [
+        2,
+        4,
+    ]
+
+
+def test_map_storage_reads_keeps_order():
+    def _read(item):
+        time.sleep(0.01 * (5 - item))
+        return item
+
+    assert list(
+        map_storage_reads(_read, range(5), RemoteStorage(), max_workers=3)
+    ) == list(range(5))
+
+
+def test_map_storage_reads_is_serial_on_local_storage(tmp_path):
+    threads = []
+
+    def _read(item):
+        threads.append(threading.current_thread())
+        return item
+
+    assert list(
+        map_storage_reads(_read, [1, 2, 3], FileSystemStorage(tmp_path), max_workers=4)
+    ) == [1, 2, 3]
+    assert set(threads) == {threading.main_thread()}
+
+
+def test_map_storage_reads_raises_read_errors():
+    def _read(item):
+        if item == 2:
+            raise ValueError("Bad file")
+        return item
+
+    results = map_storage_reads(_read, [1, 2, 3], RemoteStorage(), max_workers=2)
+    assert next(results) == 1
+    with pytest.raises(ValueError, match="Bad file"):
+        next(results)
+
+
+@pytest.mark.benchmark
+def test_benchmark_s3_airr_reads():
+    moto = pytest.importorskip("moto")
+    from moto.core.botocore_stubber import BotocoreStubber
+    from storages.backends.s3 import S3Storage
+
+    n_files = 32
+    latency = 0.02
+    stub = BotocoreStubber.__call__
+
+    def _slow_stub(self, event_name, request, **kwargs):
+        # moto answers in-process; add a typical S3 round trip time
+        time.sleep(latency)
+        return stub(self, event_name, request, **kwargs)
+
+    with moto.mock_aws():
+        storage = S3Storage(
+            bucket_name="antigenapp-benchmark",
+            region_name="us-east-1",
+            access_key="testing",
+            secret_key="testing",
+        )
+        storage.connection.create_bucket(Bucket="antigenapp-benchmark")
+        airr_data = AIRR_FIXTURE.read_bytes()
+        names = [
+            storage.save(
+                f"sequencingresults/{i}_vquestairr.tsv", ContentFile(airr_data)
+            )
+            for i in range(n_files)
+        ]
+
+        def _read(name):
+            with storage.open(name, "rb") as f:
+                return read_airr_file(f)
+
+        with patch.object(BotocoreStubber, "__call__", _slow_stub):
+            start = time.perf_counter()
+            serial = list(map_storage_reads(_read, names, storage, max_workers=1))
+            serial_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            pooled = list(map_storage_reads(_read, names, storage, max_workers=8))
+            pooled_time = time.perf_counter() - start
+
+    print(
+        f"\nRead {n_files} AIRR files from S3 ({latency * 1000:.0f} ms latency): "
+        f"serial {serial_time * 1000:.0f} ms, pooled {pooled_time * 1000:.0f} ms"
+    )
+    assert all(a.equals(b) for a, b in zip(serial, pooled))
+    assert pooled_time < serial_time
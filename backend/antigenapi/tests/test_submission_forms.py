@@ -0,0 +1,215 @@
+import io
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+import openpyxl
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from antigenapi.models import ElisaWell, PlateLocations, SequencingRun
+from antigenapi.utils.submission_form import (
+    SUBMISSION_FORM_ROWS,
+    SUBMISSION_FORM_TEMPLATE,
+    SubmissionFormTemplate,
+    get_submission_form_template,
+)
+
+
+def _cell_values(content):
+    ws = openpyxl.load_workbook(io.BytesIO(content)).worksheets[0]
+    return [
+        [cell.value for cell in row]
+        for row in ws.iter_rows(min_row=1, max_row=SUBMISSION_FORM_ROWS.stop)
+    ]
+
+
+def _fill_with_openpyxl(samples):
+    """Fill in the template by loading and saving the workbook."""
+    wb = openpyxl.load_workbook(SUBMISSION_FORM_TEMPLATE)
+    ws = wb.worksheets[0]
+    for row in SUBMISSION_FORM_ROWS:
+        for col, text in samples.get(ws[f"A{row}"].value, {}).items():
+            ws[f"{col}{row}"] = text
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+_SAMPLES = {
+    "A1": {"B": "SmCD1_50A1", "D": "PHD_SEQ_FWD", "F": "Yes"},
+    "H12": {"B": '<Special & "chars">', "D": "PHD_SEQ_FWD", "F": "Yes"},
+    # Not on the form
+    "Z99": {"B": "Ignored"},
+}
+
+
+def test_render_matches_openpyxl():
+    template = SubmissionFormTemplate()
+    assert len(template.rows) == 96
+    assert template.rows["A1"] == 3 and template.rows["B1"] == 4
+
+    rendered = template.render(_SAMPLES)
+
+    assert _cell_values(rendered) == _cell_values(_fill_with_openpyxl(_SAMPLES))
+    wb = openpyxl.load_workbook(io.BytesIO(rendered))
+    # Drop downs and the hidden sheet they list are kept
+    assert len(wb.worksheets[0].data_validations.dataValidation) == 3
+    assert wb["Hidden"].sheet_state == "hidden"
+
+
+def test_render_replaces_template_cells():
+    samples = {
+        # J6 holds the form's instructions
+        "D1": {"B": "SmCD1_50D1", "J": "Replaced", "Q": "After the last cell"},
+        "A1": {"A": "Renamed"},
+    }
+    rendered = SubmissionFormTemplate().render(samples)
+
+    assert _cell_values(rendered) == _cell_values(_fill_with_openpyxl(samples))
+    ws = openpyxl.load_workbook(io.BytesIO(rendered)).worksheets[0]
+    assert ws["J6"].value == "Replaced"
+    # The instructions' wrapped text style is kept
+    assert ws["J6"].alignment.wrap_text
+
+
+def test_render_full_plate():
+    samples = {
+        position: {"B": f"SmCD1_50{position}", "D": "PHD_SEQ_FWD", "F": "Yes"}
+        for position in PlateLocations.labels
+    }
+    template = get_submission_form_template()
+    assert set(template.rows) == set(samples)
+
+    rendered = template.render(samples)
+
+    assert _cell_values(rendered) == _cell_values(_fill_with_openpyxl(samples))
+    ws = openpyxl.load_workbook(io.BytesIO(rendered)).worksheets[0]
+    assert ws["B98"].value == "SmCD1_50H12"
+    assert (
+        ws["J6"].value
+        == openpyxl.load_workbook(SUBMISSION_FORM_TEMPLATE).worksheets[0]["J6"].value
+    )
+
+
+def test_compile_reads_other_sheet_forms(tmp_path):
+    """Other namespace prefixes, and cells without references."""
+    path = tmp_path / "template.xlsx"
+    with (
+        zipfile.ZipFile(SUBMISSION_FORM_TEMPLATE) as original,
+        zipfile.ZipFile(path, "w") as zf,
+    ):
+        for info in original.infolist():
+            data = original.read(info)
+            if info.filename == "xl/worksheets/sheet1.xml":
+                data = (
+                    data.decode()
+                    .replace("x:", "main:")
+                    .replace(":x=", ":main=")
+                    .replace(
+                        '<main:c r="A4" s="0" t="s"><main:v>9</main:v></main:c>',
+                        '<main:c s="0" t="s"><main:v>9</main:v></main:c>'
+                        "<main:c><main:v>1</main:v></main:c>",
+                    )
+                    .encode()
+                )
+            zf.writestr(info, data)
+
+    template = SubmissionFormTemplate(str(path))
+    assert template.rows["B1"] == 4
+    rendered = template.render({"B1": {"D": "PHD_SEQ_FWD"}, "C1": {"B": "New"}})
+
+    ws = openpyxl.load_workbook(io.BytesIO(rendered)).worksheets[0]
+    assert [cell.value for cell in ws[4][:4]] == ["B1", 1, None, "PHD_SEQ_FWD"]
+    assert ws["B5"].value == "New"
+
+
+def test_template_is_compiled_once():
+    assert get_submission_form_template() is get_submission_form_template()
+
+
+@override_settings(MEDIA_ROOT=Path(tempfile.TemporaryDirectory().name))
+class TestSubmissionFormDownloads(TestCase):
+    def setUp(self):
+        call_command("load_fixtures", "example-smcd1")
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.first())
+
+    def _expected_samples(self, sr, submission_idx):
+        samples = {}
+        for well in sr.wells:
+            if well["plate"] != submission_idx:
+                continue
+            elisa_well = ElisaWell.objects.get(
+                plate_id=well["elisa_well"]["plate"],
+                location=well["elisa_well"]["location"],
+            )
+            samples[PlateLocations.labels[well["location"] - 1]] = {
+                "B": f"{elisa_well.antigen.short_name}_"
+                f"{elisa_well.plate.pan_round_concentration:g}"
+                f"{PlateLocations.labels[elisa_well.location - 1]}",
+                "D": "PHD_SEQ_FWD",
+                "F": "Yes",
+            }
+        return samples
+
+    def test_download_submission_file(self):
+        response = self.client.get("/api/sequencingrun/1/submissionfile/0/")
+        assert response.status_code == status.HTTP_200_OK
+        assert response["Content-Disposition"] == (
+            'attachment; filename="sequencing-submission-form-sr1_0.xlsx"'
+        )
+
+        expected = self._expected_samples(SequencingRun.objects.get(pk=1), 0)
+        assert len(expected) == 8
+        assert _cell_values(response.content) == _cell_values(
+            _fill_with_openpyxl(expected)
+        )
+
+    def test_download_submission_file_unknown_plate(self):
+        response = self.client.get("/api/sequencingrun/1/submissionfile/5/")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_download_all_submission_files(self):
+        sr = SequencingRun.objects.get(pk=1)
+        sr.wells = sr.wells + [{**well, "plate": 1} for well in sr.wells[:3]]
+        sr.save()
+
+        response = self.client.get("/api/sequencingrun/1/submissionfiles/")
+        assert response.status_code == status.HTTP_200_OK
+        assert response["Content-Type"] == "application/zip"
+
+        with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
+            assert zf.namelist() == [
+                "sequencing-submission-form-sr1_0.xlsx",
+                "sequencing-submission-form-sr1_1.xlsx",
+            ]
+            for submission_idx, name in enumerate(zf.namelist()):
+                assert _cell_values(zf.read(name)) == _cell_values(
+                    _fill_with_openpyxl(self._expected_samples(sr, submission_idx))
+                )
+
+
+@pytest.mark.benchmark
+def test_benchmark_submission_form():
+    repeats = 20
+    start = time.perf_counter()
+    for _ in range(repeats):
+        _fill_with_openpyxl(_SAMPLES)
+    openpyxl_time = (time.perf_counter() - start) / repeats
+
+    template = get_submission_form_template()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        template.render(_SAMPLES)
+    render_time = (time.perf_counter() - start) / repeats
+    print(
+        f"\nFill in a submission form: openpyxl {openpyxl_time * 1000:.1f} ms, "
+        f"compiled template {render_time * 1000:.1f} ms"
+    )
+    assert render_time < openpyxl_time
@@ -0,0 +1,55 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from antigenapi.bioinformatics.imgt import VquestCacheEntry, run_vquest
+from antigenapi.bioinformatics.test_imgt import _echo_post, _fasta_seqs
+from antigenapi.models import VquestResult
+
+
+class TestVquestResultCache(TestCase):
+    def test_get_many_skips_missing_keys(self):
+        entry = VquestCacheEntry("sequence_id\tproductive", "a\tT", "params")
+        VquestResult.set_many({"k1": entry})
+        # Existing keys are left alone
+        VquestResult.set_many({"k1": entry._replace(parameters="other")})
+
+        assert VquestResult.get_many(["k1", "k2"]) == {"k1": entry}
+
+    @patch("antigenapi.bioinformatics.imgt.requests.post", side_effect=_echo_post)
+    def test_repeat_upload_uses_cache(self, mock_post):
+        fasta = _fasta_seqs({"a_A1": "AAAA", "b_A2": "CCCC"})
+        first = run_vquest(fasta, cache=VquestResult)
+        second = run_vquest(fasta, cache=VquestResult)
+
+        assert mock_post.call_count == 1
+        assert VquestResult.objects.count() == 2
+        assert first == second
+
+    def _age(self, key, days):
+        VquestResult.objects.filter(key=key).update(
+            added_date=timezone.now() - timedelta(days=days)
+        )
+
+    def test_expired_results_are_replaced(self):
+        entry = VquestCacheEntry("sequence_id\tproductive", "a\tT", "params")
+        VquestResult.set_many({"k1": entry, "k2": entry})
+        self._age("k1", settings.VQUEST_CACHE_MAX_AGE + 1)
+
+        assert VquestResult.get_many(["k1", "k2"]) == {"k2": entry}
+        VquestResult.set_many({"k1": entry._replace(parameters="new release")})
+        assert VquestResult.get_many(["k1"])["k1"].parameters == "new release"
+
+    def test_purge_vquest_cache(self):
+        entry = VquestCacheEntry("sequence_id\tproductive", "a\tT", "params")
+        VquestResult.set_many({"k1": entry, "k2": entry})
+        self._age("k1", settings.VQUEST_CACHE_MAX_AGE + 1)
+
+        call_command("purge_vquest_cache", "--expired")
+        assert list(VquestResult.objects.values_list("key", flat=True)) == ["k2"]
+        call_command("purge_vquest_cache")
+        assert not VquestResult.objects.exists()
@@ -2,10 +2,12 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from antigenapi.views.antigens import AntigenViewSet
+from antigenapi.views.clonotypes import ClonotypeViewSet
 from antigenapi.views.cohorts import CohortViewSet
 from antigenapi.views.dashboard import AuditLogLatestEvents, DashboardStats
 from antigenapi.views.elisa import ElisaPlateViewSet
 from antigenapi.views.fasta import GlobalFastaView
+from antigenapi.views.jobs import JobViewSet
 from antigenapi.views.libraries import LibraryViewSet
 from antigenapi.views.llamas import LlamaViewSet
 from antigenapi.views.nanobodies import NanobodyViewSet
@@ -22,6 +24,8 @@ router.register("antigen", AntigenViewSet)
 router.register("elisa_plate", ElisaPlateViewSet)
 router.register("sequencingrun", SequencingRunViewSet)
 router.register("nanobody", NanobodyViewSet)
+router.register("job", JobViewSet)
+router.register("clonotype", ClonotypeViewSet)
 
 urlpatterns = [
     path("", include(router.urls)),
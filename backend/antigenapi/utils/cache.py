@@ -0,0 +1,43 @@
+import zlib
+from collections.abc import Callable
+
+from django.core.cache import cache
+
+from antigenapi.models import DataGeneration
+
+
+def generation_cache_key(name: str, *parts, generations: tuple[str, ...]) -> str:
+    """Build a cache key which changes whenever some data generations are bumped.
+
+    Args:
+        name (str): Name of the cached result
+        *parts: Further key parts, e.g. a primary key
+        generations (tuple[str]): DataGeneration names the result is built from
+
+    Returns:
+        str: Cache key
+    """
+    versions = (f"{g}{DataGeneration.current(g)}" for g in generations)
+    return ":".join([name, *map(str, parts), *versions])
+
+
+def get_or_build(key: str, build: Callable[[], bytes]) -> bytes:
+    """Get serialized content from the shared cache, or build and cache it.
+
+    Content is stored zlib-compressed, so large results are cheap to keep in
+    (and move in and out of) the cache backend.
+
+    Args:
+        key (str): Cache key, normally from generation_cache_key
+        build (Callable): Function to build the content on a cache miss
+
+    Returns:
+        bytes: The content
+    """
+    compressed = cache.get(key)
+    if compressed is not None:
+        return zlib.decompress(compressed)
+
+    content = build()
+    cache.set(key, zlib.compress(content))
+    return content
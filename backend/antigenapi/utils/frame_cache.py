@@ -0,0 +1,97 @@
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import NamedTuple
+
+import pandas as pd
+from django.conf import settings
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class FrameCache:
+    """Process-local, size-bounded LRU cache of dataframes.
+
+    Keys are tuples whose first element is the primary key of the object the
+    frame was read from, so all of an object's frames can be evicted at once.
+    Frames are returned as shallow copies; with pandas copy-on-write, callers
+    can modify them without affecting the cached frame.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._frames: OrderedDict[tuple, pd.DataFrame] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_read(
+        self, key: tuple[Hashable, ...], read: Callable[[], pd.DataFrame]
+    ) -> pd.DataFrame:
+        """Get a cached frame, or read and cache it.
+
+        Args:
+            key (tuple): Cache key; the first element is the object's pk
+            read (Callable): Function to read the frame on a cache miss
+
+        Returns:
+            pd.DataFrame: Copy of the cached frame
+        """
+        with self._lock:
+            df = self._frames.get(key)
+            if df is not None:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                return df.copy(deep=False)
+            self.misses += 1
+
+        df = read()
+        if self.maxsize > 0:
+            with self._lock:
+                self._frames[key] = df
+                self._frames.move_to_end(key)
+                while len(self._frames) > self.maxsize:
+                    self._frames.popitem(last=False)
+        return df.copy(deep=False)
+
+    def evict(self, pk):
+        """Remove all cached frames for an object.
+
+        Args:
+            pk: Primary key of the object
+        """
+        with self._lock:
+            for key in [k for k in self._frames if k[0] == pk]:
+                del self._frames[key]
+
+    def clear(self):
+        """Remove all cached frames and reset the hit/miss counters."""
+        with self._lock:
+            self._frames.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> CacheInfo:
+        """Get the cache statistics.
+
+        Returns:
+            CacheInfo: Hits, misses, maximum size and current size
+        """
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._frames))
+
+
+# Parsed AIRR records of SequencingRunResults, keyed by (pk, AIRR file name,
+# columns, SEQUENCES generation). The generation is shared by all processes,
+# so it keeps them from serving stale frames; antigenapi.signals also evicts
+# a process's own frames as soon as the results change.
+airr_frame_cache = FrameCache(settings.AIRR_FRAME_CACHE_SIZE)
+
+# Sequencing run results frames, with stored autonames and ELISA data, keyed
+# by (sequencing run pk, columns, SEQUENCES and RECORDS generations)
+seqrun_frame_cache = FrameCache(settings.AIRR_FRAME_CACHE_SIZE)
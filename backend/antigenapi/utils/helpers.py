@@ -1,10 +1,35 @@
+import functools
+import hashlib
+import json
 import re
 from collections.abc import Iterable
 
+import numpy as np
 import pandas as pd
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
 
-from antigenapi.bioinformatics.imgt import read_airr_file
-from antigenapi.models import ElisaWell, PlateLocations, SequencingRunResults
+from antigenapi.bioinformatics.cdr3 import cluster_cdr3s
+from antigenapi.bioinformatics.imgt import (
+    AIRR_IMPORTANT_COLUMNS,
+    read_airr_file,
+    read_airr_sidecar,
+)
+from antigenapi.models import (
+    AirrSequence,
+    AirrSequenceKmer,
+    Clonotype,
+    DataGeneration,
+    ElisaWell,
+    Nanobody,
+    PlateLocations,
+    SequencingRun,
+    SequencingRunResults,
+)
+from antigenapi.utils.cache import generation_cache_key, get_or_build
+from antigenapi.utils.frame_cache import airr_frame_cache, seqrun_frame_cache
+from antigenapi.utils.storage import map_storage_reads
 
 
 def extract_well(well: str):
@@ -35,26 +60,21 @@ def extract_well(well: str):
     return well_match_grp
 
 
-def read_seqrun_results(pk: int, usecols: Iterable[str]):
-    """Read sequencing run results and add nb autonames.
+# Placeholders used in place of autonames/ELISA data for unmatched records
+WELL_UNPARSEABLE = "n/a (well unparseable)"
+INDEX_NOT_FOUND = "n/a (index not found)"
+
+
+def _nanobody_autoname_lookups(sequencing_run: SequencingRun):
+    """Build nanobody autoname and ELISA well lookups for a sequencing run.
 
     Args:
-        pk (int): Sequencing run PK
-        usecols (Iterable[str]): List of columns to read from AIRR files
+        sequencing_run (SequencingRun): Sequencing run
 
     Returns:
-        pd.DataFrame: Contents of AIRR files (IMGT)
+        tuple[dict, dict]: Nanobody autonames and ELISA well IDs, both keyed
+          by (sequencing plate, location)
     """
-    results = (
-        SequencingRunResults.objects.filter(sequencing_run_id=int(pk))
-        .order_by("seq")
-        .select_related("sequencing_run")
-        .prefetch_related("nanobodies")
-    )
-
-    if not results:
-        return pd.DataFrame()
-
     # Nanobody autoname format is:
     # <short antigen name>_<pan conc><ELISA well_no>
     # [.<ELISA plate number (index) if >1 plate]_C<cohort><sublibrary>
@@ -65,8 +85,7 @@ def read_seqrun_results(pk: int, usecols: Iterable[str]):
             w["plate"],
             w["location"],
         )
-        for r in results
-        for w in r.sequencing_run.wells
+        for w in sequencing_run.wells
     }
     # Get the ELISA plate IDs seen across this resultset -
     # put in dict for an ordered set
@@ -104,74 +123,670 @@ def read_seqrun_results(pk: int, usecols: Iterable[str]):
         if (ew.plate_id, ew.location) in elisa_wells_to_seq.keys()
     }
 
-    if "elisa_plate_id" in usecols or "elisa_optical_density" in usecols:
-        elisa_lookup = {
-            elisa_wells_to_seq[(ew.plate_id, ew.location)]: (
-                ew.plate_id,
-                ew.optical_density,
+    elisa_well_lookup = {
+        elisa_wells_to_seq[(ew.plate_id, ew.location)]: ew.pk
+        for ew in elisa_well_query
+        if (ew.plate_id, ew.location) in elisa_wells_to_seq.keys()
+    }
+
+    return nanobody_autonames_lookup, elisa_well_lookup
+
+
+# PlateLocations.labels index of each well, by row (A-H) and column (1-12)
+_WELL_LABEL_INDEX = np.array(
+    [
+        [PlateLocations.labels.index(f"{row}{col}") for col in range(1, 13)]
+        for row in "ABCDEFGH"
+    ]
+)
+
+
+def resolve_nanobody_autonames(
+    sequence_ids: pd.Series, seq: int, well_pos_offset: int, lookups
+) -> pd.DataFrame:
+    """Resolve nanobody autonames and ELISA wells for AIRR sequence IDs.
+
+    Args:
+        sequence_ids (pd.Series): AIRR sequence IDs, ending with a well name
+          after the last underscore (e.g. ..._A01)
+        seq (int): Sequencing plate (submission index) of the results
+        well_pos_offset (int): Well position offset of the results
+        lookups (tuple[dict, dict]): Output of _nanobody_autoname_lookups
+
+    Returns:
+        pd.DataFrame: nanobody_autoname and elisa_well_id columns, aligned
+          with sequence_ids. Unmatched records get a placeholder autoname
+          and a null ELISA well.
+    """
+    nanobody_autonames_lookup, elisa_well_lookup = lookups
+
+    # Same well name pattern as extract_well. Wells can't contain "_", so
+    # matching the whole ID is the same as matching after the last "_".
+    wells = (
+        sequence_ids.astype(object).str.upper().str.extract(r"([A-H])(1[0-2]|0?[1-9])$")
+    )
+    parsed = wells[0].notna().to_numpy()
+    well_lookup = np.zeros(len(wells), dtype=int)
+    if parsed.any():
+        rows = wells.loc[parsed, 0].map(ord).to_numpy() - ord("A")
+        cols = wells.loc[parsed, 1].astype(int).to_numpy() - 1
+        well_lookup[parsed] = _WELL_LABEL_INDEX[rows, cols] + 1 - well_pos_offset
+
+    lookup_df = pd.DataFrame(
+        [
+            (location, autoname, elisa_well_lookup[(plate, location)])
+            for (plate, location), autoname in nanobody_autonames_lookup.items()
+            if plate == seq
+        ],
+        columns=["well_lookup", "nanobody_autoname", "elisa_well_id"],
+    )
+    resolved = pd.DataFrame({"well_lookup": well_lookup}).merge(
+        lookup_df, on="well_lookup", how="left"
+    )
+
+    matched = parsed & resolved["nanobody_autoname"].notna().to_numpy()
+    resolved["nanobody_autoname"] = np.where(
+        matched,
+        resolved["nanobody_autoname"].astype(object),
+        np.where(parsed, INDEX_NOT_FOUND, WELL_UNPARSEABLE),
+    )
+    resolved["elisa_well_id"] = (
+        resolved["elisa_well_id"].astype(object).where(matched, None)
+    )
+    resolved.index = sequence_ids.index
+    return resolved[["nanobody_autoname", "elisa_well_id"]]
+
+
+def _resolve_nanobody_autonames(srr: SequencingRunResults, sequences, lookups):
+    """Set nanobody_autoname and elisa_well on AirrSequence objects (in memory).
+
+    Args:
+        srr (SequencingRunResults): Sequencing run results the sequences are from
+        sequences (Sequence[AirrSequence]): AIRR records to update
+        lookups (tuple[dict, dict]): Output of _nanobody_autoname_lookups
+    """
+    resolved = resolve_nanobody_autonames(
+        pd.Series([seq.sequence_id for seq in sequences], dtype=object),
+        srr.seq,
+        srr.well_pos_offset,
+        lookups,
+    )
+    for seq, nanobody_autoname, elisa_well_id in zip(
+        sequences,
+        resolved["nanobody_autoname"].tolist(),
+        resolved["elisa_well_id"].tolist(),
+    ):
+        seq.nanobody_autoname = nanobody_autoname
+        seq.elisa_well_id = elisa_well_id
+
+
+# AIRR column indexed for each k-mer index region
+KMER_REGION_COLUMNS = {
+    AirrSequenceKmer.Region.FULL: "sequence_alignment_aa",
+    AirrSequenceKmer.Region.CDR3: "cdr3_aa",
+}
+
+
+def _kmers(text: str) -> set[str]:
+    """Get the distinct k-mers of a string, for the AirrSequenceKmer index."""
+    k = AirrSequenceKmer.K
+    return {text[i : i + k] for i in range(len(text) - k + 1)}
+
+
+def _index_airr_sequences(sequences: Iterable[AirrSequence]):
+    """Add saved AirrSequence objects to the k-mer index."""
+    AirrSequenceKmer.objects.bulk_create(
+        [
+            AirrSequenceKmer(sequence=seq, region=region, kmer=kmer)
+            for seq in sequences
+            for region, column in KMER_REGION_COLUMNS.items()
+            for kmer in _kmers(getattr(seq, column) or "")
+        ],
+        batch_size=5000,
+    )
+
+
+def sequence_hash(sequence: str) -> str:
+    """Hash an amino acid sequence, for the AirrSequence.sequence_hash index.
+
+    Args:
+        sequence (str): Amino acid sequence, as stored on a Nanobody
+
+    Returns:
+        str: SHA-256 hex digest
+    """
+    return hashlib.sha256(sequence.encode()).hexdigest()
+
+
+def _alignment_sequence(sequence_alignment_aa: str) -> str:
+    """Get the amino acid sequence of an alignment, without gaps."""
+    return sequence_alignment_aa.replace(".", "")
+
+
+def refresh_clonotypes(cdr3s: Iterable[str | None]):
+    """Recompute the clonotypes for some CDR3s from the stored AIRR records.
+
+    Called whenever records with those CDR3s are stored, deleted or change
+    ELISA well. Clonotypes with no records left are deleted.
+
+    Args:
+        cdr3s (Iterable[str]): CDR3 amino acid sequences; blanks are ignored
+    """
+    cdr3s = {cdr3 for cdr3 in cdr3s if cdr3}
+    if not cdr3s:
+        return
+    sequences = AirrSequence.objects.filter(cdr3_aa__in=cdr3s).order_by()
+
+    with transaction.atomic():
+        stats = {
+            row["cdr3_aa"]: row
+            for row in sequences.values("cdr3_aa").annotate(
+                count=Count("pk"), first_seen_run=Min("results__sequencing_run_id")
             )
-            for ew in elisa_well_query
-            if (ew.plate_id, ew.location) in elisa_wells_to_seq.keys()
         }
+        removed = Clonotype.objects.filter(cdr3_aa__in=cdr3s - stats.keys())
+        # A single-linkage cluster can split when a member goes, so whatever is
+        # left of it is clustered again
+        removed_clusters = set(removed.values_list("cluster", flat=True)) - {None}
+        if removed_clusters:
+            Clonotype.objects.filter(cluster__in=removed_clusters).update(cluster=None)
+        removed.delete()
+        Clonotype.objects.bulk_create(
+            [
+                Clonotype(
+                    cdr3_aa=cdr3,
+                    count=row["count"],
+                    first_seen_run_id=row["first_seen_run"],
+                )
+                for cdr3, row in stats.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["cdr3_aa"],
+            update_fields=["count", "first_seen_run"],
+        )
+        clonotype_ids = dict(
+            Clonotype.objects.filter(cdr3_aa__in=stats).values_list("cdr3_aa", "pk")
+        )
 
-    csvs = []
-    for r in results:
-        airr_file = read_airr_file(
-            r.airr_file,
-            usecols=set(usecols) - set(["elisa_plate_id", "elisa_optical_density"]),
+        Runs = Clonotype.runs.through
+        Runs.objects.filter(clonotype_id__in=clonotype_ids.values()).delete()
+        Runs.objects.bulk_create(
+            [
+                Runs(clonotype_id=clonotype_ids[cdr3], sequencingrun_id=run_id)
+                for cdr3, run_id in sequences.values_list(
+                    "cdr3_aa", "results__sequencing_run_id"
+                ).distinct()
+            ],
+            ignore_conflicts=True,
         )
-        csvs.append(airr_file)
-
-        seq_plate_well_names = [
-            wn[1] for wn in airr_file["sequence_id"].str.rsplit("_", n=1).to_list()
-        ]
-        nanobody_autonames = []
-        if "elisa_plate_id" in usecols:
-            elisa_plate_ids = []
-        if "elisa_optical_density" in usecols:
-            elisa_optical_density = []
-        for wn in seq_plate_well_names:
-            try:
-                well_lookup = (
-                    PlateLocations.labels.index(extract_well(wn))
-                    + 1
-                    - r.well_pos_offset
-                )
-                nanobody_autonames.append(
-                    nanobody_autonames_lookup[(r.seq, well_lookup)]
-                )
-            except ValueError:
-                nanobody_autonames.append("n/a (well unparseable)")
-                if "elisa_plate_id" in usecols:
-                    elisa_plate_ids.append("n/a (well unparseable)")
-                if "elisa_optical_density" in usecols:
-                    elisa_optical_density.append("n/a (well unparseable)")
-            except KeyError:
-                nanobody_autonames.append("n/a (index not found)")
-                if "elisa_plate_id" in usecols:
-                    elisa_plate_ids.append("n/a (index not found)")
-                if "elisa_optical_density" in usecols:
-                    elisa_optical_density.append("n/a (well unparseable)")
-            else:
-                if "elisa_plate_id" in usecols:
-                    try:
-                        elisa_plate_ids.append(elisa_lookup[r.seq, well_lookup][0])
-                    except KeyError:
-                        elisa_plate_ids.append("n/a (index not found)")
-                if "elisa_optical_density" in usecols:
-                    try:
-                        elisa_optical_density.append(
-                            elisa_lookup[r.seq, well_lookup][1]
-                        )
-                    except KeyError:
-                        elisa_optical_density.append("n/a (index not found)")
-
-        airr_file["nanobody_autoname"] = nanobody_autonames
-        airr_file["sequencing_run"] = pk
-
-        if "elisa_plate_id" in usecols:
-            airr_file["elisa_plate_id"] = elisa_plate_ids
-        if "elisa_optical_density" in usecols:
-            airr_file["elisa_optical_density"] = elisa_optical_density
-
-    return pd.concat(csvs)
+        Antigens = Clonotype.antigens.through
+        Antigens.objects.filter(clonotype_id__in=clonotype_ids.values()).delete()
+        Antigens.objects.bulk_create(
+            [
+                Antigens(clonotype_id=clonotype_ids[cdr3], antigen_id=antigen_id)
+                for cdr3, antigen_id in sequences.exclude(elisa_well__isnull=True)
+                .values_list("cdr3_aa", "elisa_well__antigen_id")
+                .distinct()
+            ],
+            ignore_conflicts=True,
+        )
+
+
+def cluster_clonotypes(full: bool = False) -> int:
+    """Assign clonotypes to clonal families by CDR3 similarity.
+
+    Uses single-linkage clustering at settings.CDR3_CLUSTER_IDENTITY (see
+    cluster_cdr3s). By default only unclustered clonotypes (new ones, and
+    what's left of clusters which lost a clonotype) are compared with the
+    rest; run in full after changing the identity.
+
+    Args:
+        full (bool): Recluster all clonotypes, rather than only unclustered ones
+
+    Returns:
+        int: Number of clonotypes whose cluster changed
+    """
+    with transaction.atomic():
+        clonotypes = list(
+            Clonotype.objects.select_for_update().only("pk", "cdr3_aa", "cluster")
+        )
+        if not full and all(c.cluster is not None for c in clonotypes):
+            return 0
+
+        clusters = cluster_cdr3s(
+            [c.cdr3_aa for c in clonotypes],
+            settings.CDR3_CLUSTER_IDENTITY,
+            keys=[c.pk for c in clonotypes],
+            clusters=None if full else [c.cluster for c in clonotypes],
+        )
+        changed = []
+        for clonotype, cluster in zip(clonotypes, clusters):
+            if clonotype.cluster != cluster:
+                clonotype.cluster = cluster
+                changed.append(clonotype)
+        Clonotype.objects.bulk_update(changed, ["cluster"], batch_size=1000)
+        if changed:
+            DataGeneration.bump(DataGeneration.CLUSTERS)
+    return len(changed)
+
+
+def store_airr_sequences(srr: SequencingRunResults, airr_df=None):
+    """Store the records of a results AIRR file as AirrSequence rows.
+
+    Any existing rows for the results file are replaced. Each record is
+    stored with its nanobody autoname and the ELISA well it was picked from.
+
+    Args:
+        srr (SequencingRunResults): Sequencing run results
+        airr_df (pd.DataFrame, optional): Contents of AIRR file (IMGT), if
+          already parsed. Read from the results file if not supplied.
+    """
+    if airr_df is None:
+        airr_df = srr.read_airr()
+    airr_df = airr_df.loc[:, list(AIRR_IMPORTANT_COLUMNS)]
+    airr_df = airr_df.astype(object).where(airr_df.notna(), None)
+
+    sequences = [
+        AirrSequence(results=srr, row_num=row_num, **row._asdict())
+        for row_num, row in enumerate(airr_df.itertuples(index=False))
+    ]
+    _resolve_nanobody_autonames(
+        srr, sequences, _nanobody_autoname_lookups(srr.sequencing_run)
+    )
+    for seq in sequences:
+        if seq.sequence_alignment_aa is not None:
+            seq.sequence_hash = sequence_hash(
+                _alignment_sequence(seq.sequence_alignment_aa)
+            )
+
+    with transaction.atomic():
+        previous_cdr3s = set(
+            AirrSequence.objects.filter(results=srr).values_list("cdr3_aa", flat=True)
+        )
+        AirrSequence.objects.filter(results=srr).delete()
+        AirrSequence.objects.bulk_create(sequences, batch_size=1000)
+        _index_airr_sequences(sequences)
+        refresh_clonotypes(previous_cdr3s | {seq.cdr3_aa for seq in sequences})
+        DataGeneration.bump(DataGeneration.SEQUENCES)
+
+
+def _fetch_airr(srr: SequencingRunResults) -> pd.DataFrame:
+    """Read all columns of a results AIRR file, without using the database.
+
+    Reads the columnar sidecar where there is one, otherwise the AIRR file.
+    """
+    if srr.airr_sidecar_file:
+        with srr.airr_sidecar_file.open("rb") as f:
+            return read_airr_sidecar(f, usecols=None)
+    with srr.airr_file.open("rb") as f:
+        return read_airr_file(f, usecols=None)
+
+
+def read_airr_many(results: Iterable[SequencingRunResults]):
+    """Read many results AIRR files, concurrently on remote storage.
+
+    Files are fetched on a thread pool (see map_storage_reads); any missing
+    sidecars are written as results are consumed.
+
+    Args:
+        results (Iterable[SequencingRunResults]): Sequencing run results
+
+    Yields:
+        tuple[SequencingRunResults, pd.DataFrame]: Each sequencing run results
+          with all columns of its AIRR file, in the order given
+    """
+    results = list(results)
+    if not results:
+        return
+    storage = results[0].airr_file.storage
+    for srr, airr_df in zip(results, map_storage_reads(_fetch_airr, results, storage)):
+        if not srr.airr_sidecar_file:
+            srr.save_airr_sidecar(airr_df)
+        yield srr, airr_df
+
+
+def store_missing_airr_sequences(results):
+    """Store records for results uploaded before they were kept in the database.
+
+    Args:
+        results (QuerySet[SequencingRunResults]): Sequencing run results to check
+    """
+    for srr, airr_df in read_airr_many(
+        results.exclude(
+            pk__in=AirrSequence.objects.values("results_id")
+        ).select_related("sequencing_run")
+    ):
+        store_airr_sequences(srr, airr_df)
+
+
+def link_nanobody(nanobody: Nanobody):
+    """Link a nanobody to the sequencing run results containing its sequence.
+
+    Args:
+        nanobody (Nanobody): Nanobody
+    """
+    store_missing_airr_sequences(SequencingRunResults.objects.all())
+    nanobody.seqruns.set(
+        SequencingRunResults.objects.filter(
+            airrsequence__sequence_hash=sequence_hash(nanobody.sequence)
+        ).distinct()
+    )
+
+
+def link_results_nanobodies(srr: SequencingRunResults):
+    """Link stored sequencing run results to the nanobodies they contain.
+
+    Args:
+        srr (SequencingRunResults): Sequencing run results, with records stored
+    """
+    sequences = {
+        _alignment_sequence(aln)
+        for aln in AirrSequence.objects.filter(
+            results=srr, sequence_alignment_aa__isnull=False
+        ).values_list("sequence_alignment_aa", flat=True)
+    }
+    srr.nanobodies.set(Nanobody.objects.filter(sequence__in=sequences))
+
+
+def refresh_nanobody_autonames(sequencing_run: SequencingRun):
+    """Recompute the stored nanobody autonames for a sequencing run.
+
+    Args:
+        sequencing_run (SequencingRun): Sequencing run
+    """
+    lookups = _nanobody_autoname_lookups(sequencing_run)
+    for srr in SequencingRunResults.objects.filter(sequencing_run=sequencing_run):
+        sequences = list(
+            AirrSequence.objects.filter(results=srr).only(
+                "pk", "sequence_id", "cdr3_aa"
+            )
+        )
+        _resolve_nanobody_autonames(srr, sequences, lookups)
+        AirrSequence.objects.bulk_update(
+            sequences, ["nanobody_autoname", "elisa_well"], batch_size=1000
+        )
+        # ELISA wells, and so antigens, may have changed
+        refresh_clonotypes(seq.cdr3_aa for seq in sequences)
+    DataGeneration.bump(DataGeneration.SEQUENCES)
+
+
+def refresh_nanobody_autonames_for_plates(elisa_plate_ids: Iterable[int]):
+    """Recompute the stored nanobody autonames for runs using some ELISA plates.
+
+    Args:
+        elisa_plate_ids (Iterable[int]): ELISA plate IDs
+    """
+    elisa_plate_ids = set(elisa_plate_ids)
+    for sr in SequencingRun.objects.filter(
+        sequencingrunresults__isnull=False
+    ).distinct():
+        if any(w["elisa_well"]["plate"] in elisa_plate_ids for w in sr.wells):
+            refresh_nanobody_autonames(sr)
+
+
+def _read_airr_sequences(srr: SequencingRunResults, usecols: Iterable[str]):
+    if not set(usecols).issubset(AIRR_IMPORTANT_COLUMNS):
+        # Only the important columns are stored in the database
+        return srr.read_airr(usecols=usecols)
+
+    if not AirrSequence.objects.filter(results=srr).exists():
+        store_airr_sequences(srr)
+
+    columns = [c for c in AIRR_IMPORTANT_COLUMNS if c in usecols]
+    return pd.DataFrame.from_records(
+        AirrSequence.objects.filter(results=srr)
+        .order_by("row_num")
+        .values_list(*columns),
+        columns=columns,
+    )
+
+
+def read_airr_sequences(srr: SequencingRunResults, usecols=AIRR_IMPORTANT_COLUMNS):
+    """Read the stored AIRR records for a results file into a dataframe.
+
+    Results uploaded before AirrSequence rows existed are stored on first read.
+    Frames are cached in-process (see airr_frame_cache) until the stored
+    records change.
+
+    Args:
+        srr (SequencingRunResults): Sequencing run results
+        usecols (Iterable[str]): List of AIRR columns to read
+
+    Returns:
+        pd.DataFrame: AIRR records, in file order
+    """
+    usecols = tuple(usecols)
+    return airr_frame_cache.get_or_read(
+        (
+            srr.pk,
+            srr.airr_file.name,
+            usecols,
+            DataGeneration.current(DataGeneration.SEQUENCES),
+        ),
+        lambda: _read_airr_sequences(srr, usecols),
+    )
+
+
+def _seqrun_results_frame(sequences, usecols: Iterable[str]) -> pd.DataFrame:
+    """Read stored AIRR records into a sequencing run results dataframe.
+
+    Args:
+        sequences (QuerySet[AirrSequence]): Ordered AIRR records
+        usecols (Iterable[str]): Columns to read, as for read_seqrun_results
+
+    Returns:
+        pd.DataFrame: AIRR records (IMGT)
+    """
+    airr_columns = [c for c in AIRR_IMPORTANT_COLUMNS if c in usecols]
+    columns = airr_columns + [
+        "nanobody_autoname",
+        "results__sequencing_run_id",
+        "elisa_well__plate_id",
+        "elisa_well__optical_density",
+    ]
+    df = pd.DataFrame.from_records(
+        sequences.values_list(*columns), columns=columns
+    ).rename(columns={"results__sequencing_run_id": "sequencing_run"})
+
+    # Unmatched records get the same placeholder as their autoname for the
+    # plate ID, and always WELL_UNPARSEABLE for the optical density
+    matched = df["elisa_well__plate_id"].notna()
+    if "elisa_plate_id" in usecols:
+        df["elisa_plate_id"] = (
+            df["elisa_well__plate_id"]
+            .astype("Int64")
+            .astype(object)
+            .where(matched, df["nanobody_autoname"])
+        )
+    if "elisa_optical_density" in usecols:
+        df["elisa_optical_density"] = (
+            df["elisa_well__optical_density"]
+            .astype(object)
+            .where(matched, WELL_UNPARSEABLE)
+        )
+
+    return df.drop(columns=["elisa_well__plate_id", "elisa_well__optical_density"])
+
+
+def _read_seqrun_frames(pks: Iterable[int], usecols: Iterable[str]):
+    """Read the stored records of sequencing runs, one frame per run.
+
+    Frames are cached in-process (see seqrun_frame_cache) until the stored
+    records, or the records their autonames and ELISA data come from, change.
+
+    Args:
+        pks (Iterable[int]): Sequencing run PKs, in the order to read them
+        usecols (Iterable[str]): Columns to read, as for read_seqrun_results
+
+    Yields:
+        tuple[int, pd.DataFrame]: Sequencing run PK and its AIRR records
+    """
+    usecols = tuple(usecols)
+    generations = (
+        DataGeneration.current(DataGeneration.SEQUENCES),
+        DataGeneration.current(DataGeneration.RECORDS),
+    )
+    for pk in pks:
+        sequences = AirrSequence.objects.filter(results__sequencing_run_id=pk).order_by(
+            "results__seq", "row_num"
+        )
+        yield (
+            pk,
+            seqrun_frame_cache.get_or_read(
+                (pk, usecols, *generations),
+                functools.partial(_seqrun_results_frame, sequences, usecols),
+            ),
+        )
+
+
+def read_seqrun_results_many(pks: Iterable[int], usecols: Iterable[str]):
+    """Read the results of several sequencing runs with their stored nb autonames.
+
+    Args:
+        pks (Iterable[int]): Sequencing run PKs
+        usecols (Iterable[str]): List of columns to read. AIRR columns must be
+          from AIRR_IMPORTANT_COLUMNS. Include "elisa_plate_id" and/or
+          "elisa_optical_density" to add ELISA data.
+
+    Returns:
+        pd.DataFrame: AIRR records (IMGT) of all the runs, in sequencing run
+          ID order, or an empty dataframe if none of them have results
+    """
+    pks = [int(pk) for pk in pks]
+    results = SequencingRunResults.objects.filter(sequencing_run_id__in=pks)
+
+    if not results:
+        return pd.DataFrame()
+
+    store_missing_airr_sequences(results)
+
+    run_pks = sorted({srr.sequencing_run_id for srr in results})
+    return pd.concat(
+        [df for _, df in _read_seqrun_frames(run_pks, usecols)], ignore_index=True
+    )
+
+
+def iter_seqrun_results(pks: Iterable[int], usecols: Iterable[str]):
+    """Read the results of several sequencing runs, one run at a time.
+
+    Like read_seqrun_results_many, but only one run's records are in memory
+    at once.
+
+    Args:
+        pks (Iterable[int]): Sequencing run PKs
+        usecols (Iterable[str]): List of columns to read, as for
+          read_seqrun_results_many
+
+    Yields:
+        tuple[int, pd.DataFrame]: Sequencing run PK and its AIRR records, in
+          sequencing run ID order, skipping runs with no results
+    """
+    results = SequencingRunResults.objects.filter(
+        sequencing_run_id__in=[int(pk) for pk in pks]
+    )
+    store_missing_airr_sequences(results)
+
+    yield from _read_seqrun_frames(
+        results.order_by("sequencing_run_id")
+        .values_list("sequencing_run_id", flat=True)
+        .distinct(),
+        usecols,
+    )
+
+
+def read_seqrun_results(pk: int, usecols: Iterable[str]):
+    """Read sequencing run results with their stored nb autonames.
+
+    Args:
+        pk (int): Sequencing run PK
+        usecols (Iterable[str]): List of columns to read. AIRR columns must be
+          from AIRR_IMPORTANT_COLUMNS. Include "elisa_plate_id" and/or
+          "elisa_optical_density" to add ELISA data.
+
+    Returns:
+        pd.DataFrame: AIRR records (IMGT)
+    """
+    return read_seqrun_results_many([pk], usecols)
+
+
+def _kmer_counts(region: str) -> dict[str, int]:
+    """Count the stored records indexed under each k-mer of a region.
+
+    Counts are kept in the shared cache until the stored records change.
+    """
+    content = get_or_build(
+        generation_cache_key(
+            "kmer-counts", region, generations=(DataGeneration.SEQUENCES,)
+        ),
+        lambda: json.dumps(
+            dict(
+                AirrSequenceKmer.objects.filter(region=region)
+                .values("kmer")
+                .annotate(n=Count("pk"))
+                .values_list("kmer", "n")
+            )
+        ).encode(),
+    )
+    return json.loads(content)
+
+
+def search_airr_sequences(query: str, region: str = "full") -> list[dict]:
+    """Find stored AIRR records containing an amino acid substring.
+
+    Candidates are narrowed down using the query's rarest k-mers in the
+    index, then checked for the exact substring. Only stored records are
+    searched, so store any missing ones first (see
+    store_missing_airr_sequences).
+
+    Args:
+        query (str): Amino acid substring (case insensitive)
+        region (str): "cdr3" to search CDR3s, otherwise full sequences
+
+    Returns:
+        list[dict]: Matching records, with sequencing_run, nanobody_autoname,
+          sequence_alignment_aa and cdr3_aa, in sequencing run and file order
+    """
+    kmer_region = AirrSequenceKmer.Region("cdr3" if region == "cdr3" else "full")
+    column = KMER_REGION_COLUMNS[kmer_region]
+    query = query.upper()
+
+    candidates = AirrSequence.objects.filter(**{f"{column}__isnull": False})
+    query_kmers = _kmers(query)
+    if query_kmers:
+        # Every k-mer of a match must be indexed for it. Framework k-mers are
+        # in almost every record, so the eight rarest narrow candidates down.
+        counts = _kmer_counts(kmer_region)
+        rarest = sorted(query_kmers, key=lambda kmer: (counts.get(kmer, 0), kmer))[:8]
+        if not counts.get(rarest[0]):
+            return []
+        candidates = candidates.filter(
+            pk__in=AirrSequenceKmer.objects.filter(region=kmer_region, kmer__in=rarest)
+            .values("sequence_id")
+            .annotate(n=Count("pk"))
+            .filter(n=len(rarest))
+            .values("sequence_id")
+        )
+    else:
+        # Too short to use the index
+        candidates = candidates.filter(**{f"{column}__contains": query})
+
+    matches = []
+    for sequencing_run, nanobody_autoname, sequence, cdr3 in candidates.order_by(
+        "results__sequencing_run_id", "results__seq", "row_num"
+    ).values_list(
+        "results__sequencing_run_id",
+        "nanobody_autoname",
+        "sequence_alignment_aa",
+        "cdr3_aa",
+    ):
+        # Check for the exact substring
+        if query in (cdr3 if column == "cdr3_aa" else sequence):
+            matches.append(
+                {
+                    "sequencing_run": sequencing_run,
+                    "nanobody_autoname": nanobody_autoname,
+                    "sequence_alignment_aa": sequence,
+                    "cdr3_aa": cdr3,
+                }
+            )
+    return matches
@@ -0,0 +1,163 @@
+import contextlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import APIException
+
+from antigenapi.models import Job
+
+logger = logging.getLogger(__name__)
+
+# Job kind -> dotted path of its handler. A handler takes the Job, and returns
+# a JSON-serializable result or raises an exception to fail the job.
+JOB_HANDLERS = {
+    "blast": "antigenapi.views.sequencing.blast_sequencing_run_job",
+    "blastseq": "antigenapi.views.sequencing.blast_query_job",
+    "clustercdr3": "antigenapi.views.clonotypes.cluster_clonotypes_job",
+    "resultsfile": "antigenapi.views.sequencing.sequencing_run_results_job",
+    "resultsfiles": "antigenapi.views.sequencing.sequencing_run_bulk_results_job",
+}
+
+# Times a job is started before it's failed, if its worker keeps dying
+JOB_MAX_ATTEMPTS = 3
+
+
+def enqueue_job(kind: str, added_by, params: Optional[dict] = None, input_file=None):
+    """Queue a job for the run_jobs worker.
+
+    Args:
+        kind (str): Job kind, a key of JOB_HANDLERS
+        added_by (User): User submitting the job
+        params (dict, optional): JSON-serializable parameters for the handler
+        input_file (File, optional): Uploaded file for the handler
+
+    Returns:
+        Job: The queued job
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    job = Job(kind=kind, params=params or {}, added_by=added_by)
+    if input_file is not None:
+        job.input_file = input_file
+    job.save()
+    return job
+
+
+def _stale(now: datetime) -> Q:
+    """Running jobs whose worker hasn't sent a heartbeat in JOB_STALE_AFTER."""
+    cutoff = now - timedelta(seconds=settings.JOB_STALE_AFTER)
+    return Q(status=Job.Status.RUNNING) & (
+        Q(heartbeat_date__lt=cutoff)
+        | Q(heartbeat_date__isnull=True, started_date__lt=cutoff)
+    )
+
+
+def _fail_abandoned_jobs(now: datetime):
+    """Fail stale jobs which have already been started JOB_MAX_ATTEMPTS times."""
+    abandoned = Job.objects.filter(_stale(now), attempts__gte=JOB_MAX_ATTEMPTS)
+    for job in abandoned:
+        failed = Job.objects.filter(_stale(now), pk=job.pk).update(
+            status=Job.Status.FAILED,
+            error="The job's worker stopped while running it",
+            finished_date=now,
+        )
+        if failed and job.input_file:
+            job.input_file.delete(save=False)
+            Job.objects.filter(pk=job.pk).update(input_file="")
+
+
+def _claim_next_job() -> Optional[Job]:
+    """Mark the oldest pending or stale job as running, and return it.
+
+    The status change is a conditional update, so concurrent workers
+    never claim the same job. Jobs left running by a worker which died are
+    claimed again once their heartbeat is JOB_STALE_AFTER seconds old.
+    """
+    now = timezone.now()
+    _fail_abandoned_jobs(now)
+    claimable = Q(status=Job.Status.PENDING) | _stale(now)
+    candidates = Job.objects.filter(claimable).order_by("added_date")
+    for pk in candidates.values_list("pk", flat=True)[:10]:
+        claimed = Job.objects.filter(claimable, pk=pk).update(
+            status=Job.Status.RUNNING,
+            started_date=now,
+            heartbeat_date=now,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+@contextlib.contextmanager
+def _heartbeat(job: Job):
+    """Update a running job's heartbeat every JOB_HEARTBEAT_INTERVAL seconds."""
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(settings.JOB_HEARTBEAT_INTERVAL):
+                Job.objects.filter(pk=job.pk, status=Job.Status.RUNNING).update(
+                    heartbeat_date=timezone.now()
+                )
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f"heartbeat-{job.pk}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_job(job: Job):
+    """Run a claimed job, storing its result or error.
+
+    Args:
+        job (Job): A job with status RUNNING
+    """
+    try:
+        handler = import_string(JOB_HANDLERS[job.kind])
+        with _heartbeat(job):
+            job.result = handler(job)
+        job.status = Job.Status.SUCCEEDED
+    except Exception as e:
+        logger.exception(f"{job} failed")
+        job.error = str(e.detail) if isinstance(e, APIException) else str(e)
+        job.status = Job.Status.FAILED
+    finally:
+        job.finished_date = timezone.now()
+        if job.input_file:
+            # Handlers copy anything they need to keep
+            job.input_file.delete(save=False)
+        job.save()
+
+
+def run_next_job() -> Optional[Job]:
+    """Claim and run the oldest pending (or stale) job.
+
+    Connections the database has dropped, or which are too old, are replaced
+    before claiming a job and after running one, as for a web request, so a
+    long-running worker outlives database restarts.
+
+    Returns:
+        Optional[Job]: The job that was run, or None if the queue was empty
+    """
+    close_old_connections()
+    job = _claim_next_job()
+    if job is not None:
+        try:
+            run_job(job)
+        finally:
+            close_old_connections()
+    return job
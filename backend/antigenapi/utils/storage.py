@@ -0,0 +1,76 @@
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from typing import TypeVar
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, Storage
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def is_local_storage(storage: Storage) -> bool:
+    """Whether files in a storage are read from the local filesystem.
+
+    Args:
+        storage (Storage): Django storage backend
+
+    Returns:
+        bool: True for FileSystemStorage (and subclasses)
+    """
+    return isinstance(storage, FileSystemStorage)
+
+
+def map_storage_reads(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    storage: Storage,
+    max_workers: int | None = None,
+) -> Iterator[R]:
+    """Apply a file-reading function to many items, concurrently on remote storage.
+
+    Reads from remote storage (e.g. S3) are dominated by request latency, so
+    they are run on a bounded thread pool. The pool's threads are reused for
+    the whole batch, and django-storages keeps one connection per thread, so
+    connections are reused too. Local filesystem reads are made serially.
+
+    func is called from worker threads, so it should only read files and must
+    not use the database.
+
+    Args:
+        func (Callable): Function that reads the files for one item
+        items (Iterable): Items to read, e.g. model instances
+        storage (Storage): Storage backend the files are read from
+        max_workers (int, optional): Maximum concurrent reads. Defaults to
+          settings.STORAGE_READ_MAX_WORKERS.
+
+    Yields:
+        Results of func, in the same order as items
+    """
+    items = list(items)
+    if max_workers is None:
+        max_workers = settings.STORAGE_READ_MAX_WORKERS
+    max_workers = min(max_workers, len(items))
+
+    if max_workers <= 1 or is_local_storage(storage):
+        yield from map(func, items)
+        return
+
+    # Keep a bounded number of reads ahead of the consumer, so results that
+    # haven't been consumed yet don't pile up in memory
+    pending: deque[Future[R]] = deque()
+    remaining = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            for item in islice(remaining, 2 * max_workers):
+                pending.append(executor.submit(func, item))
+            while pending:
+                result = pending.popleft().result()
+                for item in islice(remaining, 1):
+                    pending.append(executor.submit(func, item))
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
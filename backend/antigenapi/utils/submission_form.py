@@ -0,0 +1,245 @@
+import functools
+import io
+import os
+import posixpath
+import xml.etree.ElementTree as ET
+import zipfile
+from collections.abc import Mapping
+from xml.parsers import expat
+from xml.sax.saxutils import escape
+
+import openpyxl
+from openpyxl.utils.cell import column_index_from_string, coordinate_from_string
+
+SUBMISSION_FORM_TEMPLATE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+    "files",
+    "sequencing-submission-form-v2.xlsx",
+)
+# Rows of the form's sample table, with the well position in column A
+SUBMISSION_FORM_ROWS = range(3, 100)
+
+_XLSX_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_XLSX_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_XLSX_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+
+def _xlsx_part(zf: zipfile.ZipFile, source: str, rel_type: str, rel_id=None):
+    """Find the path of a part related to another part of an .xlsx package."""
+    base, name = posixpath.split(source)
+    rels = ET.fromstring(zf.read(posixpath.join(base, "_rels", name + ".rels")))
+    for rel in rels.iter(f"{_XLSX_PKG_REL}Relationship"):
+        if rel.get("Type", "").endswith(rel_type) and rel_id in (None, rel.get("Id")):
+            target = rel.get("Target", "")
+            if target.startswith("/"):
+                return target[1:]
+            return posixpath.normpath(posixpath.join(base, target))
+    return None
+
+
+def _first_sheet(zf: zipfile.ZipFile) -> str:
+    """Find the path of the first sheet in an .xlsx file."""
+    workbook = _xlsx_part(zf, "", "/officeDocument")
+    if workbook is None:
+        raise KeyError("No workbook")
+    sheet = ET.fromstring(zf.read(workbook)).find(
+        f"{_XLSX_MAIN}sheets/{_XLSX_MAIN}sheet"
+    )
+    path = None
+    if sheet is not None:
+        path = _xlsx_part(zf, workbook, "/worksheet", sheet.get(f"{_XLSX_REL}id"))
+    if path is None:
+        raise KeyError("No worksheet")
+    return path
+
+
+def _tag_end(xml: bytes, start: int) -> int:
+    """Find the end of the tag starting at an offset of some XML."""
+    quote = None
+    for pos in range(start, len(xml)):
+        char = xml[pos : pos + 1]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in (b'"', b"'"):
+            quote = char
+        elif char == b">":
+            return pos + 1
+    raise ValueError(f"Unterminated tag at offset {start}")
+
+
+class SubmissionFormTemplate:
+    """The sequencing submission form, compiled for filling in quickly.
+
+    The sheet's XML is parsed once, and split around the cells of each sample
+    row, so a form is filled in by joining the pieces with the row's cells and
+    the new ones, and zipped with the rest of the template's files. No
+    workbook is loaded or saved per form.
+    """
+
+    def __init__(self, path: str = SUBMISSION_FORM_TEMPLATE):
+        """Load and compile a submission form template.
+
+        Args:
+            path (str): Path of the .xlsx template
+        """
+        with open(path, "rb") as f:
+            content = f.read()
+        with zipfile.ZipFile(io.BytesIO(content)) as zf:
+            self._members = [(info, zf.read(info)) for info in zf.infolist()]
+            self._sheet = _first_sheet(zf)
+
+        workbook = openpyxl.load_workbook(io.BytesIO(content), read_only=True)
+        try:
+            positions = workbook.worksheets[0].iter_rows(
+                min_row=SUBMISSION_FORM_ROWS.start,
+                max_row=SUBMISSION_FORM_ROWS.stop - 1,
+                max_col=1,
+                values_only=True,
+            )
+            #: Sample table row of each well position, e.g. {"A1": 3, ...}
+            self.rows: dict[str, int] = {
+                position: row
+                for row, (position,) in enumerate(
+                    positions, start=SUBMISSION_FORM_ROWS.start
+                )
+                if position
+            }
+        finally:
+            workbook.close()
+
+        sheet_xml = next(
+            data for info, data in self._members if info.filename == self._sheet
+        )
+        self._pieces, self._cells, self._prefix = self._compile(
+            sheet_xml, set(self.rows.values())
+        )
+        # The cells of rows with nothing filled in, ready to join
+        self._cells_xml = {
+            row: b"".join(xml for _, (xml, _) in sorted(cells.items()))
+            for row, cells in self._cells.items()
+        }
+
+    @staticmethod
+    def _compile(sheet_xml: bytes, rows: set[int]):
+        # Split the sheet around the cells of each sample row, keeping each
+        # cell's XML and style by column, so cells can be added or replaced
+        pieces: list[bytes] = []
+        cells: dict[int, dict[int, tuple[bytes, str | None]]] = {}
+        prefix = ""
+        parser = expat.ParserCreate()
+        # Local name, start offset and whether self-closing of open elements
+        stack: list[tuple[str, int, bool]] = []
+        state = {"start": 0, "row": 0, "col": 0}
+        row_cells: dict[int, tuple[bytes, str | None]] | None = None
+        cell: tuple[int, str | None] = (0, None)
+        close_row = b""
+
+        def start_element(name, attrs):
+            nonlocal prefix, row_cells, cell, close_row
+            tag_prefix, _, local = name.rpartition(":")
+            idx = parser.CurrentByteIndex
+            tag_end = _tag_end(sheet_xml, idx)
+            empty = sheet_xml[tag_end - 2 : tag_end] == b"/>"
+            parent = stack[-1][0] if stack else None
+            stack.append((local, idx, empty))
+            if local == "row" and parent == "sheetData":
+                state["row"] = int(attrs.get("r", state["row"] + 1))
+                state["col"] = 0
+                if state["row"] not in rows:
+                    return
+                prefix = f"{tag_prefix}:" if tag_prefix else ""
+                open_tag = sheet_xml[idx:tag_end]
+                if empty:
+                    open_tag = open_tag[:-2].rstrip() + b">"
+                pieces.append(close_row + sheet_xml[state["start"] : idx] + open_tag)
+                close_row = b""
+                state["start"] = tag_end
+                row_cells = cells[state["row"]] = {}
+            elif local == "c" and parent == "row" and row_cells is not None:
+                if "r" in attrs:
+                    col = coordinate_from_string(attrs["r"])[0]
+                    state["col"] = column_index_from_string(col)
+                else:
+                    state["col"] += 1
+                cell = (state["col"], attrs.get("s"))
+
+        def end_element(name):
+            nonlocal row_cells, close_row
+            local, start, empty = stack.pop()
+            idx = parser.CurrentByteIndex
+            # Self-closing elements end where the next markup starts
+            end = idx if empty else _tag_end(sheet_xml, idx)
+            if row_cells is None:
+                return
+            if local == "c" and stack[-1][0] == "row":
+                col, style = cell
+                row_cells[col] = (sheet_xml[start:end], style)
+            elif local == "row":
+                # The closing tag of a self-closing row is added back
+                state["start"] = end if empty else idx
+                if empty:
+                    close_row = f"</{name}>".encode()
+                row_cells = None
+
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+        parser.Parse(sheet_xml, True)
+        pieces.append(close_row + sheet_xml[state["start"] :])
+        return pieces, cells, prefix
+
+    def _cell(self, ref: str, text: str, style: str | None) -> bytes:
+        p = self._prefix
+        s = "" if style is None else f' s="{style}"'
+        return (
+            f'<{p}c r="{ref}"{s} t="inlineStr"><{p}is>'
+            f'<{p}t xml:space="preserve">{escape(text)}</{p}t></{p}is></{p}c>'
+        ).encode()
+
+    def render(self, samples: Mapping[str, Mapping[str, str]]) -> bytes:
+        """Fill in a submission form.
+
+        Args:
+            samples (Mapping[str, Mapping[str, str]]): Text of the cells to fill
+              in for each well position, by column letter, e.g.
+              {"A1": {"B": "SmCD1_50A1"}}. Positions not on the form are
+              ignored, and a template cell in the way is replaced, keeping
+              its style.
+
+        Returns:
+            bytes: The .xlsx file
+        """
+        by_row = {
+            self.rows[position]: cells
+            for position, cells in samples.items()
+            if position in self.rows
+        }
+        parts = [self._pieces[0]]
+        for row, piece in zip(self._cells, self._pieces[1:]):
+            new_cells = by_row.get(row)
+            if not new_cells:
+                parts.append(self._cells_xml[row])
+            else:
+                cells = {col: xml for col, (xml, _) in self._cells[row].items()}
+                for col, text in new_cells.items():
+                    col_num = column_index_from_string(col)
+                    _, style = self._cells[row].get(col_num, (b"", None))
+                    cells[col_num] = self._cell(f"{col}{row}", text, style)
+                parts.extend(cells[col_num] for col_num in sorted(cells))
+            parts.append(piece)
+        sheet_xml = b"".join(parts)
+
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w") as zf:
+            for info, data in self._members:
+                # A new ZipInfo, as writing one updates it
+                member = zipfile.ZipInfo(info.filename, info.date_time)
+                member.compress_type = info.compress_type
+                zf.writestr(member, sheet_xml if info.filename == self._sheet else data)
+        return buf.getvalue()
+
+
+@functools.cache
+def get_submission_form_template() -> SubmissionFormTemplate:
+    """Get the sequencing submission form template, compiled once per process."""
+    return SubmissionFormTemplate()
@@ -0,0 +1,75 @@
+from rest_framework.decorators import action
+from rest_framework.serializers import ModelSerializer
+from rest_framework.viewsets import ReadOnlyModelViewSet
+
+from antigenapi.models import Clonotype, Job
+from antigenapi.utils.helpers import cluster_clonotypes
+from antigenapi.utils.jobs import enqueue_job
+from antigenapi.views.jobs import job_accepted_response
+
+
+def cluster_clonotypes_job(job: Job):
+    """Job handler to cluster clonotypes."""
+    changed = cluster_clonotypes(full=job.params.get("full", False))
+    return {
+        "changed": changed,
+        "clusters": Clonotype.objects.exclude(cluster__isnull=True)
+        .values("cluster")
+        .distinct()
+        .count(),
+    }
+
+
+def schedule_clonotype_clustering(user):
+    """Queue incremental clonotype clustering, unless it's already queued.
+
+    Args:
+        user (User): User to queue the job as
+    """
+    if not Job.objects.filter(
+        kind="clustercdr3", status=Job.Status.PENDING, params__full=False
+    ).exists():
+        enqueue_job("clustercdr3", user, params={"full": False})
+
+
+class ClonotypeSerializer(ModelSerializer):
+    """A serializer for clonotypes."""
+
+    class Meta:  # noqa: D106
+        model = Clonotype
+        fields = (
+            "id",
+            "cdr3_aa",
+            "count",
+            "first_seen_run",
+            "runs",
+            "antigens",
+            "cluster",
+        )
+
+
+class ClonotypeViewSet(ReadOnlyModelViewSet):
+    """A view set for clonotypes, looked up by CDR3 amino acid sequence."""
+
+    queryset = Clonotype.objects.all().prefetch_related("runs", "antigens")
+    serializer_class = ClonotypeSerializer
+    lookup_field = "cdr3_aa"
+    filterset_fields = ("runs", "antigens", "cluster")
+
+    def get_queryset(self):  # noqa: D102
+        return super().get_queryset().order_by("-count", "cdr3_aa")
+
+    @action(
+        detail=False,
+        methods=["POST"],
+        name="Cluster clonotypes.",
+        url_path="cluster",
+    )
+    def cluster(self, request):
+        """Queue a job to cluster clonotypes by CDR3 similarity.
+
+        Set full=true to recluster all clonotypes, rather than only new ones.
+        """
+        full = request.query_params.get("full", "").lower() in ("1", "true")
+        job = enqueue_job("clustercdr3", request.user, params={"full": full})
+        return job_accepted_response(request, job)
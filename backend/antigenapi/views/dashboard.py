@@ -1,9 +1,12 @@
+import json
+
 from auditlog.models import LogEntry
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from rest_framework.views import APIView
 
 from antigenapi.models import (
     Antigen,
+    DataGeneration,
     ElisaPlate,
     Llama,
     Nanobody,
@@ -11,21 +14,31 @@ from antigenapi.models import (
     SequencingRun,
     SequencingRunResults,
 )
+from antigenapi.utils.cache import generation_cache_key, get_or_build
 from antigenapi.utils.dates import time_ago
 
 
+def _dashboard_stats_json() -> bytes:
+    stats = [
+        {"name": "Projects", "value": Project.objects.count()},
+        {"name": "Antigens", "value": Antigen.objects.count()},
+        {"name": "Llamas", "value": Llama.objects.count()},
+        {"name": "Sequencing Runs", "value": SequencingRun.objects.count()},
+        {"name": "Named Nanobodies", "value": Nanobody.objects.count()},
+    ]
+    return json.dumps({"stats": stats}).encode()
+
+
 class DashboardStats(APIView):
     def get(self, request, format=None):
         """Get database stats for dashboard."""
-        stats = [
-            {"name": "Projects", "value": Project.objects.count()},
-            {"name": "Antigens", "value": Antigen.objects.count()},
-            {"name": "Llamas", "value": Llama.objects.count()},
-            {"name": "Sequencing Runs", "value": SequencingRun.objects.count()},
-            {"name": "Named Nanobodies", "value": Nanobody.objects.count()},
-        ]
-
-        return JsonResponse({"stats": stats})
+        content = get_or_build(
+            generation_cache_key(
+                "dashboard-stats", generations=(DataGeneration.RECORDS,)
+            ),
+            _dashboard_stats_json,
+        )
+        return HttpResponse(content, content_type="application/json")
 
 
 def _schema(content_type):
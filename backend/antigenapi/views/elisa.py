@@ -1,8 +1,17 @@
+import json
 import math
+import posixpath
+import zipfile
+from itertools import chain
 
+from auditlog.receivers import log_create
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.db import transaction
 from django.http import HttpResponse
+from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.response import Response
 from rest_framework.serializers import (
     BooleanField,
     CharField,
@@ -15,8 +24,15 @@ from rest_framework.serializers import (
 )
 from rest_framework.viewsets import ModelViewSet
 
-from antigenapi.models import Antigen, ElisaPlate, ElisaWell, PlateLocations
-from antigenapi.parsers import parse_elisa_file
+from antigenapi.models import (
+    Antigen,
+    DataGeneration,
+    ElisaPlate,
+    ElisaWell,
+    PlateLocations,
+)
+from antigenapi.parsers import parse_elisa_file, read_elisa_files
+from antigenapi.signals import schedule_autoname_refresh
 from antigenapi.views.mixins import AuditLogMixin, DeleteProtectionMixin
 
 
@@ -37,6 +53,78 @@ def _wells_to_tsv(wells):
     return output
 
 
+def _plate_wells(plate, antigen, well_set):
+    return (
+        ElisaWell(plate=plate, optical_density=od, location=loc, antigen=antigen)
+        for (od, loc) in zip(well_set, PlateLocations)
+    )
+
+
+def _bulk_plate_files(uploads):
+    """Read the .xlsx files of a bulk ELISA upload, expanding any .zip files.
+
+    Args:
+        uploads (list[UploadedFile]): Uploaded .xlsx and .zip files
+
+    Returns:
+        tuple[dict[str, bytes], dict[str, dict]]: File contents by file name,
+          and errors by file name
+    """
+    contents: dict[str, bytes] = {}
+    errors: dict[str, dict] = {}
+
+    def _add(name, content):
+        if name in contents:
+            errors[name] = {"plate_file": ["Duplicate file name in upload"]}
+        contents[name] = content
+
+    for upload in uploads:
+        if not upload.name.lower().endswith(".zip"):
+            _add(upload.name, upload.read())
+            continue
+        try:
+            with zipfile.ZipFile(upload) as zf:
+                for info in zf.infolist():
+                    name = posixpath.basename(info.filename)
+                    if (
+                        info.is_dir()
+                        or "__MACOSX" in info.filename.split("/")
+                        or name.startswith((".", "~$"))
+                        or not name.lower().endswith(".xlsx")
+                    ):
+                        continue
+                    _add(name, zf.read(info))
+        except zipfile.BadZipFile as e:
+            errors[upload.name] = {"plate_file": [str(e)]}
+    return contents, errors
+
+
+def _bulk_plate_details(plates):
+    """Parse the per-plate details of a bulk ELISA upload, by file name."""
+    try:
+        details = json.loads(plates)
+    except (TypeError, json.JSONDecodeError):
+        details = None
+    if not isinstance(details, list) or not all(
+        isinstance(plate, dict) and isinstance(plate.get("plate_file"), str)
+        for plate in details
+    ):
+        raise ValidationError(
+            {
+                "plates": "Plate details should be a JSON list of objects, each "
+                "with the name of its plate_file"
+            }
+        )
+    by_file = {}
+    for plate in details:
+        if plate["plate_file"] in by_file:
+            raise ValidationError(
+                {"plates": f"Duplicate details for {plate['plate_file']}"}
+            )
+        by_file[plate["plate_file"]] = plate
+    return by_file
+
+
 class NestedElisaWellSerializer(ModelSerializer):
     """A serializer for elisa wells."""
 
@@ -108,10 +196,7 @@ class ElisaPlateSerializer(ElisaPlateWithoutWellsSerializer):
 
     @staticmethod
     def _create_wells(plate, antigen, well_set):
-        ElisaWell.objects.bulk_create(
-            ElisaWell(plate=plate, optical_density=od, location=loc, antigen=antigen)
-            for (od, loc) in zip(well_set, PlateLocations)
-        )
+        ElisaWell.objects.bulk_create(_plate_wells(plate, antigen, well_set))
 
     @transaction.atomic
     def create(self, validated_data):
@@ -146,6 +231,8 @@ class ElisaPlateSerializer(ElisaPlateWithoutWellsSerializer):
             self._create_wells(plate, antigen, well_set)
         else:
             ElisaWell.objects.filter(plate=plate).update(antigen=antigen)
+        # Wells are bulk updated, so no signals - refresh stored autonames here
+        schedule_autoname_refresh({plate.pk})
         return instance
 
 
@@ -166,6 +253,79 @@ class ElisaPlateViewSet(AuditLogMixin, DeleteProtectionMixin, ModelViewSet):
     def perform_create(self, serializer):  # noqa: D102
         serializer.save(added_by=self.request.user)
 
+    @action(
+        detail=False,
+        methods=["POST"],
+        name="Upload many ELISA plates.",
+        url_path="bulk",
+    )
+    def bulk_create_elisa_plates(self, request):
+        """Create many ELISA plates at once.
+
+        Takes .xlsx files (or .zip files of them) in "plate_file", and a JSON
+        list of plate details in "plates", each naming its file in
+        "plate_file". Files are parsed in parallel, and all plates are created
+        in one transaction, or none with the errors for each file.
+        """
+        contents, errors = _bulk_plate_files(request.FILES.getlist("plate_file"))
+        if not contents and not errors:
+            raise ValidationError({"plate_file": "No ELISA files uploaded"})
+        details = _bulk_plate_details(request.data.get("plates"))
+
+        for name in details.keys() - contents.keys() - errors.keys():
+            errors[name] = {"plate_file": ["File not found in upload"]}
+        serializers = {}
+        for name, content in contents.items():
+            if name not in details:
+                errors.setdefault(name, {"plates": ["No plate details given"]})
+                continue
+            serializer = ElisaPlateWithoutWellsSerializer(
+                data={
+                    **details[name],
+                    "plate_file": SimpleUploadedFile(name, content),
+                }
+            )
+            if not serializer.is_valid():
+                errors.setdefault(name, {}).update(serializer.errors)
+            serializers[name] = serializer
+
+        parsed = read_elisa_files(
+            list(contents.values()), max_workers=settings.ELISA_PARSE_MAX_WORKERS
+        )
+        well_sets = {}
+        for name, result in zip(contents, parsed):
+            if result.error is not None:
+                errors.setdefault(name, {}).setdefault("plate_file", []).append(
+                    result.error
+                )
+            well_sets[name] = result.vals
+        if errors:
+            raise ValidationError(errors)
+
+        with transaction.atomic():
+            antigens = {}
+            plates = []
+            for name, serializer in serializers.items():
+                data = dict(serializer.validated_data)
+                antigens[name] = data.pop("antigen")
+                plates.append(ElisaPlate(added_by=request.user, **data))
+            plates = ElisaPlate.objects.bulk_create(plates)
+            ElisaWell.objects.bulk_create(
+                chain.from_iterable(
+                    _plate_wells(plate, antigens[name], well_sets[name])
+                    for name, plate in zip(serializers, plates)
+                )
+            )
+            # Plates are bulk created, so no signals - audit log them here
+            for plate in plates:
+                log_create(ElisaPlate, plate, created=True)
+            DataGeneration.bump(DataGeneration.RECORDS)
+
+        return Response(
+            ElisaPlateWithoutWellsSerializer(plates, many=True).data,
+            status=status.HTTP_201_CREATED,
+        )
+
     @action(
         detail=True,
         methods=["GET"],
@@ -1,24 +1,49 @@
 import datetime
 
-from django.http import FileResponse
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.cache import quote_etag
+from django.utils.http import parse_etags
 from rest_framework.views import APIView
 
-from antigenapi.bioinformatics.blast import get_db_fasta
+from antigenapi.bioinformatics.blast import get_db_fasta_file
+from antigenapi.models import DataGeneration, SequencingRunResults
+from antigenapi.utils.helpers import store_missing_airr_sequences
 
 
 class GlobalFastaView(APIView):
     def get(self, request, format=None):
-        """Download entire database as .fasta file."""
-        fasta_data = get_db_fasta()
+        """Download entire database as .fasta file (or .fasta.gz, with ?gzip=true).
+
+        The file is built once per sequences generation and kept in storage,
+        which also makes the generation a strong ETag, named so it doesn't
+        match tags of other resources with the same counter.
+        """
+        compress = request.query_params.get("gzip", "").lower() in ("1", "true")
+        # Storing any missing records bumps the generation, so do that first
+        store_missing_airr_sequences(SequencingRunResults.objects.all())
+        generation = DataGeneration.current(DataGeneration.SEQUENCES)
+        etag = quote_etag(f"fasta-{generation}{'-gz' if compress else ''}")
+
+        if_none_match = request.headers.get("If-None-Match", "")
+        if if_none_match == "*" or etag in parse_etags(if_none_match):
+            response = HttpResponseNotModified()
+            response["ETag"] = etag
+            return response
+
+        fasta_file = default_storage.open(get_db_fasta_file(compress=compress), "rb")
 
         fasta_filename = (
             f"antigenapp_database_{datetime.datetime.now().isoformat()}.fasta"
         )
+        if compress:
+            fasta_filename += ".gz"
         response = FileResponse(
-            fasta_data,
+            fasta_file,
             as_attachment=True,
-            content_type="text/x-fasta",
+            content_type="application/gzip" if compress else "text/x-fasta",
             filename=fasta_filename,
         )
         response["Content-Disposition"] = f'attachment; filename="{fasta_filename}"'
+        response["ETag"] = etag
         return response
@@ -0,0 +1,81 @@
+from django.http import JsonResponse
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.request import Request
+from rest_framework.serializers import ModelSerializer, StringRelatedField
+from rest_framework.viewsets import ReadOnlyModelViewSet
+
+from antigenapi.models import Job
+
+
+def async_requested(request: Request) -> bool:
+    """Check whether the client asked for a job rather than an inline response.
+
+    Args:
+        request (Request): The request, with query parameter async=true for a job
+    """
+    return request.query_params.get("async", "").lower() in ("1", "true")
+
+
+def job_accepted_response(request: Request, job: Job) -> JsonResponse:
+    """Respond 202 Accepted, pointing the client at a queued job.
+
+    Args:
+        request (Request): The request which queued the job
+        job (Job): The queued job
+    """
+    response = JsonResponse(
+        {"job": job.pk, "status": job.status}, status=status.HTTP_202_ACCEPTED
+    )
+    response["Location"] = request.build_absolute_uri(
+        reverse("job-detail", args=[job.pk])
+    )
+    return response
+
+
+class JobSerializer(ModelSerializer):
+    """A serializer for background jobs."""
+
+    added_by = StringRelatedField()
+
+    class Meta:  # noqa: D106
+        model = Job
+        exclude = ("params", "input_file", "result")
+
+
+class JobViewSet(ReadOnlyModelViewSet):
+    """A view set for polling background jobs.
+
+    Users see their own jobs, and staff see everyone's.
+    """
+
+    queryset = Job.objects.all().select_related("added_by").order_by("-added_date")
+    serializer_class = JobSerializer
+
+    def get_queryset(self):
+        """Restrict jobs to those added by the user, unless they are staff."""
+        queryset = super().get_queryset()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(added_by=self.request.user)
+        return queryset
+
+    @action(
+        detail=True,
+        methods=["GET"],
+        name="Get job result.",
+        url_path="result",
+    )
+    def get_job_result(self, request, pk):
+        """Get the result of a job, once it has finished."""
+        job = self.get_object()
+
+        if job.status == Job.Status.SUCCEEDED:
+            return JsonResponse(job.result, safe=False)
+        if job.status == Job.Status.FAILED:
+            return JsonResponse(
+                {"error": job.error}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return JsonResponse(
+            {"job": job.pk, "status": job.status}, status=status.HTTP_202_ACCEPTED
+        )
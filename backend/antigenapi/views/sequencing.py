@@ -1,13 +1,17 @@
 import collections.abc
 import io
+import json
 import os
-from tempfile import NamedTemporaryFile
-from wsgiref.util import FileWrapper
+import re
+import zipfile
 
 import numpy as np
-import openpyxl
-import pandas as pd
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
 from django.db.models import Prefetch
 from django.http import FileResponse, Http404, HttpResponse, JsonResponse
 from django.shortcuts import redirect
@@ -25,23 +29,46 @@ from antigenapi.bioinformatics.blast import (
     run_blastp,
     run_blastp_seq_run,
 )
+from antigenapi.bioinformatics.cdr3 import (
+    MAX_CDR3_DISTANCE,
+    METRICS,
+    get_cdr3_index,
+)
 from antigenapi.bioinformatics.imgt import (
     AIRR_IMPORTANT_COLUMNS,
-    as_fasta_files,
-    load_sequences,
+    SequenceFileError,
+    as_fasta_records,
+    iter_zip_sequences,
     read_airr_file,
     run_vquest,
+    sequence_members,
+    zip_sequence_members,
 )
 from antigenapi.models import (
+    Clonotype,
+    DataGeneration,
     ElisaPlate,
     ElisaWell,
-    Nanobody,
+    Job,
     PlateLocations,
     SequencingRun,
     SequencingRunResults,
+    VquestResult,
+)
+from antigenapi.utils.cache import generation_cache_key, get_or_build
+from antigenapi.utils.helpers import (
+    extract_well,
+    link_results_nanobodies,
+    read_seqrun_results,
+    search_airr_sequences,
+    store_airr_sequences,
+    store_missing_airr_sequences,
 )
-from antigenapi.utils.helpers import extract_well, read_seqrun_results
+from antigenapi.utils.jobs import enqueue_job
+from antigenapi.utils.submission_form import get_submission_form_template
+from antigenapi.views.clonotypes import schedule_clonotype_clustering
 from antigenapi.views.elisa import _wells_to_tsv
+from antigenapi.views.jobs import async_requested, job_accepted_response
 from antigenapi.views.mixins import AuditLogMixin, DeleteProtectionMixin
 
 
@@ -232,6 +259,675 @@ class SequencingRunShortSerializer(SequencingRunSerializer):
         read_only_fields = ["added_by", "added_date"]
 
 
+def _validate_results_upload(sr: SequencingRun, submission_idx, results_file):
+    """Check a sequencing results .zip against its sequencing run submission.
+
+    Only the .zip's directory is read, so mismatched uploads fail before any
+    sequence file is decompressed; sequences are checked as they're read by
+    _store_results_upload.
+
+    Args:
+        sr (SequencingRun): Sequencing run the results are for
+        submission_idx (int): Submission (plate) index within the sequencing run
+        results_file (File): The uploaded .zip file
+
+    Raises:
+        ValidationError: If the upload doesn't match the submission
+
+    Returns:
+        tuple[dict, int]: .zip member names by sequence name, and the well
+          position offset
+    """
+    try:
+        members = zip_sequence_members(_results_file_handle(results_file))
+    except zipfile.BadZipFile as e:
+        raise ValidationError({"file": str(e)})
+    return members, _check_submission_wells(sr, submission_idx, members)
+
+
+def _check_submission_wells(sr: SequencingRun, submission_idx, members):
+    """Check the wells of uploaded sequence files against a submission.
+
+    Args:
+        sr (SequencingRun): Sequencing run the results are for
+        submission_idx (int): Submission (plate) index within the sequencing run
+        members (dict): .zip member names by sequence name
+
+    Raises:
+        ValidationError: If the wells don't match the submission
+
+    Returns:
+        int: The well position offset
+    """
+    pk = sr.pk
+
+    # Store well positions
+    wells_expected_list = [
+        PlateLocations.labels[w["location"] - 1]
+        for w in sr.wells
+        if w["plate"] == int(submission_idx)
+    ]
+    if not wells_expected_list:
+        raise ValidationError(
+            f"Plate index {submission_idx} not found in sequencing run {pk}"
+        )
+
+    if len(members) != len(wells_expected_list):
+        raise ValidationError(
+            {
+                "file": f"Upload contains data for {len(members)} "
+                f"wells, expected {len(wells_expected_list)}"
+            }
+        )
+    # Validate wells expected vs wells supplied
+    try:
+        wells_supplied_list = [extract_well(w) for w in members.keys()]
+    except IndexError:
+        raise ValidationError(
+            {
+                "file": "Unable to parse well names. "
+                "Ensure all .seq filenames end with a well."
+            }
+        )
+
+    # Check for duplicates in the supplied well names, and error if so
+    wells_supplied = set(wells_supplied_list)
+    if len(wells_supplied_list) != len(wells_supplied):
+        seen_twice = [
+            w for w, n in collections.Counter(wells_supplied_list).items() if n > 1
+        ]
+
+        raise ValidationError(
+            {"file": f"Duplicate wells found in supplied list: {seen_twice}"}
+        )
+
+    # Check for duplicates in the expected well names, and error if so
+    wells_expected = set(wells_expected_list)
+    if len(wells_expected_list) != len(wells_expected):
+        raise ValueError(
+            f"Duplicate wells found in expected list for seq run {pk} "
+            f"idx {submission_idx}"
+        )
+
+    # Apply an offset in case the wells are shifted
+    offset = 0
+
+    wells_supplied_int = [PlateLocations.labels.index(w) for w in wells_supplied]
+    wells_expected_int = [PlateLocations.labels.index(w) for w in wells_expected]
+    if min(wells_supplied_int) > min(wells_expected_int):
+        offset = min(wells_supplied_int) - min(wells_expected_int)
+        wells_expected = set(
+            [PlateLocations.labels[w + offset] for w in wells_expected_int]
+        )
+
+    if wells_expected - wells_supplied:
+        raise ValidationError(
+            {
+                "file": f"Expected well(s) {wells_expected - wells_supplied} "
+                f"were not found in upload (h.offset: {offset})"
+            }
+        )
+    if wells_supplied - wells_expected:
+        raise ValidationError(
+            {
+                "file": f"Unexpected well(s) {wells_supplied - wells_expected} "
+                f"were found in upload (h.offset: {offset})"
+            }
+        )
+
+    return offset
+
+
+def _results_file_handle(results_file):
+    """Get a path or file object to read an uploaded .zip with."""
+    try:
+        return results_file.temporary_file_path()
+    except AttributeError:
+        return results_file.file
+
+
+def _run_vquest_upload(sequences):
+    """Run V-QUEST on uploaded sequences, as they are read.
+
+    Args:
+        sequences (Iterable[tuple[str, str]]): Trimmed sequences and their names
+
+    Raises:
+        ValidationError: If a sequence file is invalid, or V-QUEST fails
+
+    Returns:
+        dict[str, str]: V-QUEST Parameters.txt and vquest_airr.tsv contents
+    """
+    try:
+        # run_vquest batches to 50 sequences per request
+        return run_vquest(
+            as_fasta_records(sequences),
+            max_workers=settings.VQUEST_MAX_WORKERS,
+            requests_per_second=settings.VQUEST_REQUESTS_PER_SECOND,
+            cache=VquestResult,
+        )
+    except SequenceFileError as e:
+        raise ValidationError({"file": str(e)})
+    except ValueError as e:
+        raise ValidationError({"file": f"IMGT/V-QUEST error: {e}"})
+
+
+def _save_results(
+    sr: SequencingRun, submission_idx, offset, results_file, user, vquest_results
+):
+    """Store V-QUEST results as a submission's sequencing results.
+
+    Args:
+        sr (SequencingRun): Sequencing run the results are for
+        submission_idx (int): Submission (plate) index within the sequencing run
+        offset (int): Well position offset
+        results_file (File): The uploaded .zip file
+        user (User): User uploading the results
+        vquest_results (dict[str, str]): V-QUEST output for the submission
+
+    Returns:
+        SequencingRunResults: The stored results
+    """
+    parameters_file_data = vquest_results["Parameters.txt"]
+    vquest_airr_data = vquest_results["vquest_airr.tsv"]
+
+    base_filename = f"SequencingResults_{sr.pk}_{submission_idx}"
+
+    # Parse all columns once, for the columnar sidecar and stored records
+    airr_df = read_airr_file(io.BytesIO(vquest_airr_data.encode()), usecols=None)
+
+    # Create SequencingRunResults object
+    srr, _ = SequencingRunResults.objects.update_or_create(
+        sequencing_run=sr,
+        seq=submission_idx,
+        defaults={
+            "added_by": user,
+            "seqres_file": results_file,
+            "well_pos_offset": offset,
+        },
+    )
+
+    srr.airr_file.save(f"{base_filename}_vquestairr.tsv", io.StringIO(vquest_airr_data))
+    srr.parameters_file.save(
+        f"{base_filename}_vquestparams.txt", io.StringIO(parameters_file_data)
+    )
+    srr.save_airr_sidecar(airr_df)
+    store_airr_sequences(srr, airr_df)
+    link_results_nanobodies(srr)
+
+    return srr
+
+
+def _store_results_upload(
+    sr: SequencingRun, submission_idx, members, offset, results_file, user
+):
+    """Run V-QUEST on validated sequences, and store the sequencing results.
+
+    Sequence files are read and trimmed as V-QUEST batches are filled, so the
+    first batches are submitted while the rest of the .zip is read.
+
+    Args:
+        sr (SequencingRun): Sequencing run the results are for
+        submission_idx (int): Submission (plate) index within the sequencing run
+        members (dict): .zip member names by sequence name
+        offset (int): Well position offset
+        results_file (File): The uploaded .zip file
+        user (User): User uploading the results
+
+    Raises:
+        ValidationError: If a sequence file is invalid, or V-QUEST fails
+
+    Returns:
+        SequencingRunResults: The stored results
+    """
+    vquest_results = _run_vquest_upload(
+        iter_zip_sequences(_results_file_handle(results_file), members)
+    )
+    srr = _save_results(sr, submission_idx, offset, results_file, user, vquest_results)
+    schedule_clonotype_clustering(user)
+
+    return srr
+
+
+def sequencing_run_results_job(job: Job):
+    """Job handler to store an uploaded sequencing results .zip."""
+    sr = SequencingRun.objects.get(pk=job.params["pk"])
+    with job.input_file.open("rb") as f:
+        _store_results_upload(
+            sr,
+            job.params["submission_idx"],
+            dict(job.params["members"]),
+            job.params["offset"],
+            File(f, name=os.path.basename(job.input_file.name)),
+            job.added_by,
+        )
+    return SequencingRunSerializer(SequencingRun.objects.get(pk=sr.pk)).data
+
+
+def _combine_plate_uploads(plate_files):
+    """Combine one .zip per submission into a single multi-plate .zip.
+
+    Args:
+        plate_files (dict[int, File]): Uploaded .zip files by submission index
+
+    Raises:
+        ValidationError: If an upload isn't a .zip file
+
+    Returns:
+        ContentFile: .zip with each submission's files in a directory named
+          by its submission index
+    """
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as combined:
+        for submission_idx, plate_file in sorted(plate_files.items()):
+            try:
+                with zipfile.ZipFile(_results_file_handle(plate_file)) as zf:
+                    for info in zf.infolist():
+                        if info.is_dir() or info.filename.startswith("__MACOSX"):
+                            continue
+                        combined.writestr(
+                            f"{submission_idx}/{info.filename}", zf.read(info)
+                        )
+            except zipfile.BadZipFile as e:
+                raise ValidationError({f"file_{submission_idx}": str(e)})
+    return ContentFile(buf.getvalue(), name="sequencing-results.zip")
+
+
+def _plate_path(filename):
+    """Find the plate of a multi-plate .zip member from its directory.
+
+    Args:
+        filename (str): .zip member name, e.g. results/1/seq_A1.seq
+
+    Returns:
+        Optional[tuple[int, str]]: Submission index, and the name within its
+          directory, e.g. (1, "seq_A1.seq"), or None if not in a plate's
+          directory
+    """
+    parts = filename.split("/")
+    for i, part in enumerate(parts[:-1]):
+        if part.isdigit():
+            return int(part), "/".join(parts[i + 1 :])
+    return None
+
+
+def _validate_bulk_results_upload(sr: SequencingRun, results_file):
+    """Check a multi-plate sequencing results .zip against its sequencing run.
+
+    Each submission's sequence files must be in a directory named by its
+    submission index, e.g. 0/ or results/1/ (the outermost such directory
+    counts). Like _validate_results_upload, only the .zip's directory is read.
+
+    Args:
+        sr (SequencingRun): Sequencing run the results are for
+        results_file (File): The uploaded .zip file
+
+    Raises:
+        ValidationError: If the upload doesn't match the submissions, with
+          the problems with every submission
+
+    Returns:
+        dict[int, tuple[dict, int]]: .zip member names by sequence name, and
+          the well position offset, by submission index
+    """
+    try:
+        with zipfile.ZipFile(_results_file_handle(results_file)) as zf:
+            filenames = zf.namelist()
+    except zipfile.BadZipFile as e:
+        raise ValidationError({"file": str(e)})
+
+    plate_filenames: dict[int, list[str]] = {}
+    unplaced = []
+    for fn in filenames:
+        plate_path = _plate_path(fn)
+        if plate_path is None:
+            unplaced.append(fn)
+        else:
+            plate_filenames.setdefault(plate_path[0], []).append(fn)
+    if sequence_members(unplaced):
+        raise ValidationError(
+            {
+                "file": "Sequence files must be in a directory named by their "
+                "submission index, e.g. 0/"
+            }
+        )
+
+    plates = {}
+    errors: list[str] = []
+    for submission_idx, fns in sorted(plate_filenames.items()):
+        # Well names repeat between plates, so map each plate's separately
+        members = sequence_members(fns)
+        if not members:
+            continue
+        try:
+            offset = _check_submission_wells(sr, submission_idx, members)
+        except ValidationError as e:
+            detail = e.detail["file"] if isinstance(e.detail, dict) else e.detail
+            if isinstance(detail, str):
+                detail = [detail]
+            errors.extend(f"Plate {submission_idx}: {message}" for message in detail)
+            continue
+        plates[submission_idx] = (members, offset)
+    if errors:
+        raise ValidationError({"file": errors})
+    if not plates:
+        raise ValidationError({"file": "Upload contains no sequence files"})
+
+    return plates
+
+
+def _plate_sequence_id(submission_idx, name):
+    """Name a sequence uniquely across the plates of a multi-plate upload."""
+    return f"p{submission_idx}_{name}"
+
+
+_PLATE_SEQUENCE_ID_RE = re.compile(r"p(?P<plate>[0-9]+)_(?P<name>.+)", re.S)
+
+
+def _plate_results_files(results_file, submission_idxs):
+    """Split a multi-plate .zip into one .zip per plate.
+
+    Args:
+        results_file (File): The uploaded multi-plate .zip file
+        submission_idxs (Iterable[int]): Submission indexes of the plates
+
+    Returns:
+        dict[int, ContentFile]: .zip for each plate, holding the files in its
+          directory, by submission index
+    """
+    stem = os.path.splitext(os.path.basename(results_file.name))[0]
+    bufs = {idx: io.BytesIO() for idx in submission_idxs}
+    with zipfile.ZipFile(_results_file_handle(results_file)) as zf:
+        plate_zips = {
+            idx: zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED)
+            for idx, buf in bufs.items()
+        }
+        try:
+            for info in zf.infolist():
+                plate_path = _plate_path(info.filename)
+                if info.is_dir() or plate_path is None:
+                    continue
+                submission_idx, name = plate_path
+                if submission_idx in plate_zips:
+                    plate_zips[submission_idx].writestr(name, zf.read(info))
+        finally:
+            for plate_zip in plate_zips.values():
+                plate_zip.close()
+    return {
+        idx: ContentFile(buf.getvalue(), name=f"{stem}_{idx}.zip")
+        for idx, buf in bufs.items()
+    }
+
+
+def _split_vquest_results(vquest_results, submission_idxs):
+    """Split V-QUEST results for a multi-plate upload by plate.
+
+    Args:
+        vquest_results (dict[str, str]): V-QUEST output, with sequence IDs
+          from _plate_sequence_id
+        submission_idxs (Iterable[int]): Submission indexes of the plates
+
+    Raises:
+        ValueError: If a sequence ID isn't from one of the plates
+
+    Returns:
+        dict[int, dict[str, str]]: V-QUEST output for each plate, with the
+          original sequence IDs
+    """
+    header, *rows = vquest_results["vquest_airr.tsv"].splitlines()
+    id_col = header.split("\t").index("sequence_id")
+    plate_rows: dict[int, list[str]] = {idx: [] for idx in submission_idxs}
+    for row in rows:
+        fields = row.split("\t")
+        match = _PLATE_SEQUENCE_ID_RE.fullmatch(fields[id_col])
+        if match is None or int(match["plate"]) not in plate_rows:
+            raise ValueError(f"Unexpected sequence ID in results: {fields[id_col]}")
+        fields[id_col] = match["name"]
+        plate_rows[int(match["plate"])].append("\t".join(fields))
+    return {
+        submission_idx: {
+            "Parameters.txt": vquest_results["Parameters.txt"],
+            "vquest_airr.tsv": "\n".join([header] + lines) + "\n",
+        }
+        for submission_idx, lines in plate_rows.items()
+    }
+
+
+def _store_bulk_results_upload(sr: SequencingRun, plates, results_file, user):
+    """Run V-QUEST on validated sequences for many plates, and store the results.
+
+    All plates' sequences go through one V-QUEST pipeline, and all their
+    results are stored in one transaction. Each plate's results file is a
+    .zip of the files in its directory.
+
+    Args:
+        sr (SequencingRun): Sequencing run the results are for
+        plates (dict[int, tuple[dict, int]]): .zip member names by sequence
+          name, and the well position offset, by submission index
+        results_file (File): The uploaded .zip file
+        user (User): User uploading the results
+
+    Raises:
+        ValidationError: If a sequence file is invalid, or V-QUEST fails
+
+    Returns:
+        list[SequencingRunResults]: The stored results
+    """
+    zip_file = _results_file_handle(results_file)
+
+    def _sequences():
+        for submission_idx, (members, _) in plates.items():
+            for name, seq in iter_zip_sequences(zip_file, members):
+                yield _plate_sequence_id(submission_idx, name), seq
+
+    try:
+        plate_results = _split_vquest_results(_run_vquest_upload(_sequences()), plates)
+    except ValueError as e:
+        raise ValidationError({"file": f"IMGT/V-QUEST error: {e}"})
+    # Each plate keeps only its own files, as if uploaded separately
+    plate_files = _plate_results_files(results_file, plates)
+    with transaction.atomic():
+        results = [
+            _save_results(
+                sr,
+                submission_idx,
+                offset,
+                plate_files[submission_idx],
+                user,
+                plate_results[submission_idx],
+            )
+            for submission_idx, (_, offset) in plates.items()
+        ]
+    schedule_clonotype_clustering(user)
+
+    return results
+
+
+def sequencing_run_bulk_results_job(job: Job):
+    """Job handler to store an uploaded multi-plate sequencing results .zip."""
+    sr = SequencingRun.objects.get(pk=job.params["pk"])
+    plates = {
+        submission_idx: (dict(members), offset)
+        for submission_idx, members, offset in job.params["plates"]
+    }
+    with job.input_file.open("rb") as f:
+        _store_bulk_results_upload(
+            sr,
+            plates,
+            File(f, name=os.path.basename(job.input_file.name)),
+            job.added_by,
+        )
+    return SequencingRunSerializer(SequencingRun.objects.get(pk=sr.pk)).data
+
+
+def _blast_sequencing_run(pk, query_type):
+    """BLAST a sequencing run's results vs the database.
+
+    Returns:
+        Optional[list]: BLAST hits, or None if BLAST had no output
+    """
+    blast_str = run_blastp_seq_run(pk, query_type=query_type)
+    if not blast_str:
+        return None
+
+    # Read query AIRR files for CDRs
+    airr_df = read_seqrun_results(pk, usecols=("sequence_id", "cdr3_aa"))
+    airr_df = airr_df.set_index("nanobody_autoname")
+
+    return parse_blast_results(blast_str, query_type, airr_df)
+
+
+def blast_sequencing_run_job(job: Job):
+    """Job handler to BLAST a sequencing run's results vs the database."""
+    return {"hits": _blast_sequencing_run(**job.params) or []}
+
+
+def _blast_query(query, search_region):
+    """BLAST a query sequence vs the database.
+
+    Returns:
+        Optional[list]: BLAST hits, or None if BLAST had no output
+    """
+    query_str = f"> QuerySequence\n{query}\n"
+    blast_str = run_blastp(
+        query_str,
+        query_type="cdr3_unagg" if search_region == "cdr3" else search_region,
+    )
+
+    if not blast_str:
+        return None
+
+    return parse_blast_results(
+        blast_str,
+        search_region,
+        e_value_threshold=np.inf,
+        align_perc_theshold=0,
+    )
+
+
+def blast_query_job(job: Job):
+    """Job handler to BLAST a query sequence vs the database."""
+    return {"hits": _blast_query(**job.params) or []}
+
+
+def _sequencing_run_results_json(pk) -> bytes:
+    """Build the sequencing results table for a run, serialized as JSON."""
+    df = read_seqrun_results(pk, usecols=AIRR_IMPORTANT_COLUMNS)
+
+    if df.empty:
+        return json.dumps({"records": []}).encode()
+
+    # Get number of matches per CDR3 sequence
+    cdr3_counts = df["cdr3_aa"].value_counts()
+    cdr3_counts.name = "cdr3_aa_count"
+    df = df.merge(cdr3_counts, on="cdr3_aa", how="left")
+
+    # Sort as required - Productive, number of CDR3 matches,
+    # then CDR3 itself, then sequence ID
+    df = df.sort_values(
+        by=["productive", "cdr3_aa_count", "cdr3_aa", "sequence_id"],
+        ascending=[False, False, True, True],
+    )
+
+    # Ensure we have the right columns in the right order
+    df = df.loc[:, list(AIRR_IMPORTANT_COLUMNS) + ["nanobody_autoname"]]
+
+    # Number of records with each CDR3, and its clonal family, across the
+    # whole database
+    clonotypes = Clonotype.objects.filter(
+        cdr3_aa__in=df["cdr3_aa"].dropna().unique()
+    ).values_list("cdr3_aa", "count", "cluster")
+    total_counts = {cdr3: count for cdr3, count, _ in clonotypes}
+    clusters = {cdr3: cluster for cdr3, _, cluster in clonotypes}
+    for column, values in (
+        ("cdr3_aa_total_count", total_counts),
+        ("cdr3_cluster", clusters),
+    ):
+        df[column] = df["cdr3_aa"].map(values).astype("Int64").astype(object)
+
+    # Indicator to show when cdr3 has changed from previous row
+    df["new_cdr3"] = df["cdr3_aa"].shift(1).ne(df["cdr3_aa"])
+
+    # Replace T/F with Y/N in productive and stop_codon columns
+    for column in ("productive", "stop_codon"):
+        df[column] = df[column].str.replace("F", "N").replace("T", "Y")
+
+    sequences = (
+        df["sequence_alignment_aa"].str.replace(".", "").replace("*", "X").tolist()
+    )
+    df["sequence"] = sequences
+    df = df.drop("sequence_alignment_aa", axis=1)
+
+    # Replace NaN with None (null in JSON) - must be done AFTER all column
+    # processing, as str operations on None/NaN values re-introduce NaN
+    df = df.replace({np.nan: None})
+
+    return json.dumps(
+        {"records": df.to_dict(orient="records")}, cls=DjangoJSONEncoder
+    ).encode()
+
+
+_XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def _submission_form_filename(sr: SequencingRun, submission_idx: int) -> str:
+    return f"sequencing-submission-form-sr{sr.pk}_{submission_idx}.xlsx"
+
+
+def _submission_forms(
+    sr: SequencingRun, submission_idxs: collections.abc.Set[int]
+) -> dict[int, bytes]:
+    """Fill in the sequencing submission forms (.xlsx) for some plates of a run.
+
+    Args:
+        sr (SequencingRun): The sequencing run
+        submission_idxs (Set[int]): Submission indexes of the plates
+
+    Returns:
+        dict[int, bytes]: .xlsx file by submission index, for those plates
+          with wells
+    """
+    plate_wells: dict[int, dict[str, dict]] = {}
+    for well in sr.wells:
+        if well["plate"] in submission_idxs:
+            plate_wells.setdefault(well["plate"], {})[
+                PlateLocations.labels[well["location"] - 1]
+            ] = well["elisa_well"]
+    if not plate_wells:
+        return {}
+
+    elisa_wells = {
+        (ew.plate_id, ew.location): ew
+        for ew in ElisaWell.objects.filter(
+            plate__pk__in={
+                elisa_well["plate"]
+                for wells in plate_wells.values()
+                for elisa_well in wells.values()
+            }
+        )
+        .select_related("plate")
+        .select_related("antigen")
+    }
+
+    template = get_submission_form_template()
+    forms = {}
+    for submission_idx, wells in plate_wells.items():
+        samples = {}
+        for position, well in wells.items():
+            elisa_well = elisa_wells[(well["plate"], well["location"])]
+            samples[position] = {
+                # Sample name
+                "B": f"{elisa_well.antigen.short_name}_"
+                f"{elisa_well.plate.pan_round_concentration:g}"
+                f"{PlateLocations.labels[elisa_well.location - 1]}",
+                # Own primer name
+                "D": "PHD_SEQ_FWD",
+                "F": "Yes",
+            }
+        forms[submission_idx] = template.render(samples)
+    return forms
+
+
 class SequencingRunViewSet(AuditLogMixin, DeleteProtectionMixin, ModelViewSet):
     """A view set for sequencing runs."""
 
@@ -259,68 +955,40 @@ class SequencingRunViewSet(AuditLogMixin, DeleteProtectionMixin, ModelViewSet):
     )
     def download_submission_xlsx(self, request, pk, submission_idx):
         """Download sequencing run submission file (xlsx)."""
-        # Load the Excel template — one directory up from this file (views/)
-        fn = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
-            "files",
-            "sequencing-submission-form-v2.xlsx",
-        )
-        oxl = openpyxl.load_workbook(fn)
-
-        # Get first worksheet
-        ws = oxl.worksheets[0]
-
-        # Get sequencing run object
         sr = self.get_object()
-        well_dict = {}
-        elisa_plates_to_load = set()
         submission_idx = int(submission_idx)
-        for well in sr.wells:
-            if well["plate"] != submission_idx:
-                continue
-            well_dict[PlateLocations.labels[well["location"] - 1]] = well["elisa_well"]
-            elisa_plates_to_load.add(well["elisa_well"]["plate"])
-
-        if not well_dict:
+        forms = _submission_forms(sr, {submission_idx})
+        if not forms:
             raise Http404
 
-        elisa_wells = {
-            (ew.plate_id, ew.location): ew
-            for ew in ElisaWell.objects.filter(plate__pk__in=elisa_plates_to_load)
-            .select_related("plate")
-            .select_related("antigen")
-        }
+        response = HttpResponse(forms[submission_idx], content_type=_XLSX_CONTENT_TYPE)
+        response["Content-Disposition"] = (
+            f'attachment; filename="{_submission_form_filename(sr, submission_idx)}"'
+        )
+        return response
 
-        # Make modifications
-        for row in range(3, 100):  # 96 wells
-            try:
-                # Sample name
-                well = well_dict[ws[f"A{row}"].value]
-            except KeyError:
-                continue
+    @action(
+        detail=True,
+        methods=["GET"],
+        name="Download all sequencing run submission files (zip).",
+        url_path="submissionfiles",
+    )
+    def download_submission_xlsx_zip(self, request, pk):
+        """Download the submission files (xlsx) of every plate as a .zip."""
+        sr = self.get_object()
+        forms = _submission_forms(sr, {well["plate"] for well in sr.wells})
+        if not forms:
+            raise Http404
 
-            elisa_well = elisa_wells[(well["plate"], well["location"])]
-            ws[f"B{row}"] = (
-                f"{elisa_well.antigen.short_name}_"
-                f"{elisa_well.plate.pan_round_concentration:g}"
-                f"{PlateLocations.labels[elisa_well.location - 1]}"
-            )
-            # Own primer name
-            ws[f"D{row}"] = "PHD_SEQ_FWD"
-            ws[f"F{row}"] = "Yes"
-
-        # Save to temp file
-        with NamedTemporaryFile() as tmp:
-            oxl.save(tmp.name)
-            response = HttpResponse(
-                FileWrapper(tmp),
-                content_type="application/vnd.openxmlformats-officedocument"
-                ".spreadsheetml.sheet",
-            )
+        buf = io.BytesIO()
+        # .xlsx files are already compressed
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:
+            for submission_idx, form in sorted(forms.items()):
+                zf.writestr(_submission_form_filename(sr, submission_idx), form)
 
+        response = HttpResponse(buf.getvalue(), content_type="application/zip")
         response["Content-Disposition"] = (
-            f'attachment; filename="sequencing-submission-form-'
-            f'sr{pk}_{submission_idx}.xlsx"'
+            f'attachment; filename="sequencing-submission-forms-sr{sr.pk}.zip"'
         )
         return response
 
@@ -398,134 +1066,85 @@ class SequencingRunViewSet(AuditLogMixin, DeleteProtectionMixin, ModelViewSet):
                 f"Sequencing run {pk} does not exist to attach results"
             )
 
-        # Store well positions
-        wells_expected_list = [
-            PlateLocations.labels[w["location"] - 1]
-            for w in sr.wells
-            if w["plate"] == int(submission_idx)
-        ]
-        if not wells_expected_list:
-            raise ValidationError(
-                f"Plate index {submission_idx} not found in sequencing run {pk}"
+        members, offset = _validate_results_upload(sr, submission_idx, results_file)
+
+        if async_requested(request):
+            job = enqueue_job(
+                "resultsfile",
+                request.user,
+                params={
+                    "pk": sr.pk,
+                    "submission_idx": int(submission_idx),
+                    # A list of pairs, as JSON objects don't keep key order
+                    "members": list(members.items()),
+                    "offset": offset,
+                },
+                input_file=results_file,
             )
+            return job_accepted_response(request, job)
 
-        # Run bioinformatics using .zip file
-        try:
-            seq_data_fh = results_file.temporary_file_path()
-        except AttributeError:
-            seq_data_fh = results_file.file
-        try:
-            seq_data = load_sequences(seq_data_fh)
-        except ValueError as e:
-            raise ValidationError({"file": str(e)})
-        if len(seq_data) != len(wells_expected_list):
-            raise ValidationError(
-                {
-                    "file": f"Upload contains data for {len(seq_data)} "
-                    f"wells, expected {len(wells_expected_list)}"
-                }
-            )
-        # Validate wells expected vs wells supplied
-        try:
-            wells_supplied_list = [extract_well(w) for w in seq_data.keys()]
-        except IndexError:
-            raise ValidationError(
-                {
-                    "file": "Unable to parse well names. "
-                    "Ensure all .seq filenames end with a well."
-                }
-            )
-
-        # Check for duplicates in the supplied well names, and error if so
-        wells_supplied = set(wells_supplied_list)
-        if len(wells_supplied_list) != len(wells_supplied):
-            seen = set()
-            seen_twice = list(
-                set(w for w in wells_supplied_list if w in seen or seen.add(w))
-            )
-
-            raise ValidationError(
-                {"file": f"Duplicate wells found in supplied list: {seen_twice}"}
-            )
+        _store_results_upload(
+            sr, submission_idx, members, offset, results_file, request.user
+        )
 
-        # Check for duplicates in the expected well names, and error if so
-        wells_expected = set(wells_expected_list)
-        if len(wells_expected_list) != len(wells_expected):
-            raise ValueError(
-                f"Duplicate wells found in expected list for seq run {pk} "
-                f"idx {submission_idx}"
-            )
+        return JsonResponse(
+            SequencingRunSerializer(SequencingRun.objects.get(pk=int(pk))).data
+        )
 
-        # Apply an offset in case the wells are shifted
-        offset = 0
+    @action(
+        detail=True,
+        methods=["PUT"],
+        name="Upload sequencing run results files for many plates.",
+        url_path="resultsfiles",
+    )
+    def bulk_sequencing_run_results(self, request, pk):
+        """Upload sequencing run results for several submissions (plates) at once.
+
+        Takes one .zip in "file", with each submission's sequence files in a
+        directory named by its submission index, or one .zip per submission in
+        "file_<submission index>" fields.
+        """
+        plate_files = {
+            int(key.removeprefix("file_")): request.data[key]
+            for key in request.data
+            if re.fullmatch(r"file_[0-9]+", key)
+        }
+        if plate_files:
+            results_file = _combine_plate_uploads(plate_files)
+        elif "file" in request.data:
+            results_file = request.data["file"]
+        else:
+            raise ValidationError({"file": "No results files uploaded"})
 
-        wells_supplied_int = [PlateLocations.labels.index(w) for w in wells_supplied]
-        wells_expected_int = [PlateLocations.labels.index(w) for w in wells_expected]
-        if min(wells_supplied_int) > min(wells_expected_int):
-            offset = min(wells_supplied_int) - min(wells_expected_int)
-            wells_expected = set(
-                [PlateLocations.labels[w + offset] for w in wells_expected_int]
-            )
+        if not results_file.name.endswith(".zip"):
+            raise ValidationError("file", "Results file should be a .zip file")
 
-        if wells_expected - wells_supplied:
-            raise ValidationError(
-                {
-                    "file": f"Expected well(s) {wells_expected - wells_supplied} "
-                    f"were not found in upload (h.offset: {offset})"
-                }
-            )
-        if wells_supplied - wells_expected:
+        try:
+            sr = SequencingRun.objects.get(pk=int(pk))
+        except SequencingRun.DoesNotExist:
             raise ValidationError(
-                {
-                    "file": f"Unexpected well(s) {wells_supplied - wells_expected} "
-                    f"were found in upload (h.offset: {offset})"
-                }
+                f"Sequencing run {pk} does not exist to attach results"
             )
 
-        # Convert to FASTA in-memory; run_vquest batches to 50 sequences per request
-        fasta_file = as_fasta_files(seq_data, max_file_size=None)[0]
-
-        try:
-            vquest_results = run_vquest(fasta_file)
-        except ValueError as e:
-            raise ValidationError({"file": f"IMGT/V-QUEST error: {e}"})
-
-        parameters_file_data = vquest_results["Parameters.txt"]
-        vquest_airr_data = vquest_results["vquest_airr.tsv"]
-
-        base_filename = f"SequencingResults_{pk}_{submission_idx}"
-
-        # Link to nanobodies table
-        sequences = read_airr_file(
-            io.BytesIO(vquest_airr_data.encode()), usecols=("sequence_alignment_aa",)
-        )
-        sequences = (
-            sequences["sequence_alignment_aa"]
-            .dropna()
-            .str.replace(".", "")
-            .replace("*", "X")
-            .unique()
-        )
-        nanobodies = Nanobody.objects.filter(sequence__in=sequences)
-
-        # Create SequencingRunResults object
-        srr, _ = SequencingRunResults.objects.update_or_create(
-            sequencing_run=SequencingRun.objects.get(pk=int(pk)),
-            seq=submission_idx,
-            defaults={
-                "added_by": request.user,
-                "seqres_file": results_file,
-                "well_pos_offset": offset,
-            },
-        )
-        srr.nanobodies.set(nanobodies)
+        plates = _validate_bulk_results_upload(sr, results_file)
+
+        if async_requested(request):
+            job = enqueue_job(
+                "resultsfiles",
+                request.user,
+                params={
+                    "pk": sr.pk,
+                    # Lists of pairs, as JSON objects don't keep key order
+                    "plates": [
+                        [submission_idx, list(members.items()), offset]
+                        for submission_idx, (members, offset) in plates.items()
+                    ],
+                },
+                input_file=results_file,
+            )
+            return job_accepted_response(request, job)
 
-        srr.airr_file.save(
-            f"{base_filename}_vquestairr.tsv", io.StringIO(vquest_airr_data)
-        )
-        srr.parameters_file.save(
-            f"{base_filename}_vquestparams.txt", io.StringIO(parameters_file_data)
-        )
+        _store_bulk_results_upload(sr, plates, results_file, request.user)
 
         return JsonResponse(
             SequencingRunSerializer(SequencingRun.objects.get(pk=int(pk))).data
@@ -576,45 +1195,24 @@ class SequencingRunViewSet(AuditLogMixin, DeleteProtectionMixin, ModelViewSet):
         url_path="results",
     )
     def get_sequencing_run_results(self, request, pk):
-        """Get sequencing results."""
-        df = read_seqrun_results(pk, usecols=AIRR_IMPORTANT_COLUMNS)
-
-        if df.empty:
-            return JsonResponse({"records": []})
-
-        # Get number of matches per CDR3 sequence
-        cdr3_counts = df["cdr3_aa"].value_counts()
-        cdr3_counts.name = "cdr3_aa_count"
-        df = df.merge(cdr3_counts, on="cdr3_aa", how="left")
-
-        # Sort as required - Productive, number of CDR3 matches,
-        # then CDR3 itself, then sequence ID
-        df = df.sort_values(
-            by=["productive", "cdr3_aa_count", "cdr3_aa", "sequence_id"],
-            ascending=[False, False, True, True],
+        """Get sequencing results.
+
+        The serialized table is kept in the shared cache until the stored AIRR
+        records change, so repeat requests don't rebuild it.
+        """
+        # Storing any missing records bumps the generation, so do that first
+        store_missing_airr_sequences(
+            SequencingRunResults.objects.filter(sequencing_run_id=pk)
         )
-
-        # Ensure we have the right columns in the right order
-        df = df.loc[:, list(AIRR_IMPORTANT_COLUMNS) + ["nanobody_autoname"]]
-
-        # Indicator to show when cdr3 has changed from previous row
-        df["new_cdr3"] = df["cdr3_aa"].shift(1).ne(df["cdr3_aa"])
-
-        # Replace T/F with Y/N in productive and stop_codon columns
-        for column in ("productive", "stop_codon"):
-            df[column] = df[column].str.replace("F", "N").replace("T", "Y")
-
-        sequences = (
-            df["sequence_alignment_aa"].str.replace(".", "").replace("*", "X").tolist()
+        content = get_or_build(
+            generation_cache_key(
+                "seqrun-results",
+                int(pk),
+                generations=(DataGeneration.SEQUENCES, DataGeneration.CLUSTERS),
+            ),
+            lambda: _sequencing_run_results_json(pk),
         )
-        df["sequence"] = sequences
-        df = df.drop("sequence_alignment_aa", axis=1)
-
-        # Replace NaN with None (null in JSON) - must be done AFTER all column
-        # processing, as str operations on None/NaN values re-introduce NaN
-        df = df.replace({np.nan: None})
-
-        return JsonResponse({"records": df.to_dict(orient="records")})
+        return HttpResponse(content, content_type="application/json")
 
     @action(
         detail=False,
@@ -626,32 +1224,49 @@ class SequencingRunViewSet(AuditLogMixin, DeleteProtectionMixin, ModelViewSet):
         """Get sequencing run results by sequence search."""
         search_region = self.request.query_params.get("searchRegion", "full")
 
-        df = pd.concat(
-            [
-                read_seqrun_results(
-                    seqrun, usecols=("sequence_id", "sequence_alignment_aa", "cdr3_aa")
-                )
-                for seqrun in SequencingRun.objects.values_list("pk", flat=True)
-            ]
-        )
-
-        if df.empty:
-            return JsonResponse({"matches": []})
+        store_missing_airr_sequences(SequencingRunResults.objects.all())
+        return JsonResponse({"matches": search_airr_sequences(query, search_region)})
 
-        query = query.upper()
-
-        if search_region == "cdr3":
-            df = df[df.cdr3_aa.notna()]
-            df = df[df["cdr3_aa"].str.contains(query)]
-        else:
-            df = df[df.sequence_alignment_aa.notna()]
-            df = df[df["sequence_alignment_aa"].str.contains(query)]
-
-        df = df[
-            ["sequencing_run", "nanobody_autoname", "sequence_alignment_aa", "cdr3_aa"]
-        ]
+    @action(
+        detail=False,
+        methods=["GET"],
+        name="Search CDR3s by distance.",
+        url_path="searchcdr3/(?P<query>[A-Za-z]+)",
+    )
+    def search_cdr3(self, request, query):
+        """Find clonotypes with a CDR3 within a distance of a query CDR3."""
+        metric = self.request.query_params.get("metric", "hamming")
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        max_distance = int(self.request.query_params.get("maxDistance", 1))
+        if not 0 <= max_distance <= MAX_CDR3_DISTANCE:
+            raise ValueError(f"maxDistance must be between 0 and {MAX_CDR3_DISTANCE}")
+
+        store_missing_airr_sequences(SequencingRunResults.objects.all())
+        hits = get_cdr3_index().search(query, max_distance, metric)
+        clonotypes = {
+            clonotype.cdr3_aa: clonotype
+            for clonotype in Clonotype.objects.filter(
+                cdr3_aa__in=[hit.cdr3_aa for hit in hits]
+            ).prefetch_related("runs")
+        }
 
-        return JsonResponse({"matches": df.to_dict(orient="records")})
+        results = []
+        for hit in hits:
+            clonotype = clonotypes.get(hit.cdr3_aa)
+            if clonotype is None:
+                # Removed since the index was built
+                continue
+            results.append(
+                {
+                    "cdr3_aa": hit.cdr3_aa,
+                    "distance": hit.distance,
+                    "count": clonotype.count,
+                    "first_seen_run": clonotype.first_seen_run_id,
+                    "runs": [run.pk for run in clonotype.runs.all()],
+                }
+            )
+        return JsonResponse({"hits": results})
 
     @action(
         detail=False,
@@ -668,25 +1283,19 @@ class SequencingRunViewSet(AuditLogMixin, DeleteProtectionMixin, ModelViewSet):
         if len(query) > 1024:
             raise ValueError("Query string exceeds maximum length of 1024")
 
-        query_str = f"> QuerySequence\n{query}\n"
-        blast_str = run_blastp(
-            query_str,
-            query_type="cdr3_unagg" if search_region == "cdr3" else search_region,
-        )
+        if async_requested(request):
+            job = enqueue_job(
+                "blastseq",
+                request.user,
+                params={"query": query, "search_region": search_region},
+            )
+            return job_accepted_response(request, job)
 
-        if not blast_str:
+        hits = _blast_query(query, search_region)
+        if hits is None:
             return JsonResponse({"hits": []}, status=status.HTTP_404_NOT_FOUND)
 
-        return JsonResponse(
-            {
-                "hits": parse_blast_results(
-                    blast_str,
-                    search_region,
-                    e_value_threshold=np.inf,
-                    align_perc_theshold=0,
-                )
-            }
-        )
+        return JsonResponse({"hits": hits})
 
     @action(
         detail=True,
@@ -699,14 +1308,17 @@ class SequencingRunViewSet(AuditLogMixin, DeleteProtectionMixin, ModelViewSet):
         query_type = self.request.query_params.get("queryType", "full")
         if query_type not in ("full", "cdr3"):
             raise ValueError(f"Unknown queryType: {query_type}")
-        blast_str = run_blastp_seq_run(pk, query_type=query_type)
-        if not blast_str:
-            return JsonResponse({"hits": []}, status=status.HTTP_404_NOT_FOUND)
 
-        # Read query AIRR files for CDRs
-        airr_df = read_seqrun_results(pk, usecols=("sequence_id", "cdr3_aa"))
-        airr_df = airr_df.set_index("nanobody_autoname")
+        if async_requested(request):
+            job = enqueue_job(
+                "blast",
+                request.user,
+                params={"pk": int(pk), "query_type": query_type},
+            )
+            return job_accepted_response(request, job)
 
-        return JsonResponse(
-            {"hits": parse_blast_results(blast_str, query_type, airr_df)}
-        )
+        hits = _blast_sequencing_run(pk, query_type)
+        if hits is None:
+            return JsonResponse({"hits": []}, status=status.HTTP_404_NOT_FOUND)
+
+        return JsonResponse({"hits": hits})
@@ -10,6 +10,7 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 from typing import List
 from urllib.parse import urlparse
@@ -105,6 +106,62 @@ if "AWS_STORAGE_BUCKET_NAME" in os.environ:
     }
 UPLOADED_FILES_USE_URL = False
 
+# Cache for computed results, shared by the uwsgi processes. Keys include data
+# generations (antigenapi.models.DataGeneration), so entries are never stale.
+# Set DJANGO_CACHE_BACKEND/DJANGO_CACHE_LOCATION to use e.g. memcached.
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "DJANGO_CACHE_BACKEND",
+            (
+                "django.core.cache.backends.locmem.LocMemCache"
+                if IS_CI
+                else "django.core.cache.backends.filebased.FileBasedCache"
+            ),
+        ),
+        "LOCATION": os.environ.get(
+            "DJANGO_CACHE_LOCATION",
+            os.path.join(tempfile.gettempdir(), "antigenapp-cache"),
+        ),
+        "TIMEOUT": 24 * 60 * 60,
+    }
+}
+
+# Local directory for BLAST databases, which are rebuilt when sequences change
+BLAST_DB_ROOT = os.environ.get(
+    "BLAST_DB_ROOT", os.path.join(tempfile.gettempdir(), "antigenapp-blastdb")
+)
+
+# Concurrent file reads from remote (e.g. S3) storage; local files are read
+# serially
+STORAGE_READ_MAX_WORKERS = int(os.environ.get("STORAGE_READ_MAX_WORKERS", "8"))
+
+# Parsed AIRR and sequencing run results frames kept in memory by each process,
+# per cache (0 disables the caches)
+AIRR_FRAME_CACHE_SIZE = int(os.environ.get("AIRR_FRAME_CACHE_SIZE", "64"))
+
+# Fraction of identical residues for same-length CDR3s to be linked into a
+# clonal family; recluster in full (cluster_clonotypes --full) after changing
+CDR3_CLUSTER_IDENTITY = float(os.environ.get("CDR3_CLUSTER_IDENTITY", "0.8"))
+
+# IMGT/V-QUEST batch submission: batches in flight at once, and the maximum
+# rate at which batches are started
+VQUEST_MAX_WORKERS = int(os.environ.get("VQUEST_MAX_WORKERS", "4"))
+VQUEST_REQUESTS_PER_SECOND = float(os.environ.get("VQUEST_REQUESTS_PER_SECOND", "1"))
+# Days a cached V-QUEST result is used for, so annotations follow IMGT
+# reference releases (purge_vquest_cache clears the cache at once)
+VQUEST_CACHE_MAX_AGE = float(os.environ.get("VQUEST_CACHE_MAX_AGE", "30"))
+
+# Background jobs: seconds between a running job's heartbeats, and seconds
+# without one after which its worker is presumed dead and the job is run again
+JOB_HEARTBEAT_INTERVAL = float(os.environ.get("JOB_HEARTBEAT_INTERVAL", "30"))
+JOB_STALE_AFTER = float(os.environ.get("JOB_STALE_AFTER", "300"))
+
+# Worker processes parsing large bulk imports of ELISA files (1 parses
+# in-process). Each is a separate process with its own imports, so keep this
+# small.
+ELISA_PARSE_MAX_WORKERS = int(os.environ.get("ELISA_PARSE_MAX_WORKERS", "2"))
+
 
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
@@ -115,6 +115,18 @@ const SequencingResults = (props) => {
                     >
                       CDR3
                     </th>
+                    <th
+                      scope="col"
+                      className="px-3 py-3.5 text-left text-sm font-semibold text-gray-900"
+                    >
+                      CDR3 count (all runs)
+                    </th>
+                    <th
+                      scope="col"
+                      className="px-3 py-3.5 text-left text-sm font-semibold text-gray-900"
+                    >
+                      CDR3 cluster
+                    </th>
                     <th
                       scope="col"
                       className="px-3 py-3.5 text-left text-sm font-semibold text-gray-900"
@@ -126,7 +138,7 @@ const SequencingResults = (props) => {
                 <tbody className="bg-white">
                   {!sequencingResults.records.length && (
                     <tr>
-                      <td colSpan="11" className="py-4 font-medium text-center">
+                      <td colSpan="13" className="py-4 font-medium text-center">
                         No results
                       </td>
                     </tr>
@@ -169,6 +181,12 @@ const SequencingResults = (props) => {
                       <td className="whitespace-nowrap px-3 py-4 text-sm text-gray-500">
                         {row.cdr3_aa}
                       </td>
+                      <td className="whitespace-nowrap px-3 py-4 text-sm text-gray-500">
+                        {row.cdr3_aa_total_count}
+                      </td>
+                      <td className="whitespace-nowrap px-3 py-4 text-sm text-gray-500">
+                        {row.cdr3_cluster}
+                      </td>
                       <td className="whitespace-nowrap px-3 py-4 text-sm text-gray-500">
                         {row.sequence}
                       </td>
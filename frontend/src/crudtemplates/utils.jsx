@@ -332,6 +332,26 @@ export const displayFieldSingle = (field, record, context, props) => {
           </a>,
         );
     }
+    numPlates > 1 &&
+      retVal.push(
+        <a
+          key="seqPlateLinkAll"
+          href={
+            config.url.API_URL +
+            schema.sequencing.apiUrl +
+            "/" +
+            record.id +
+            "/submissionfiles/"
+          }
+        >
+          <button
+            type="button"
+            className="w-full sm:w-auto mb-2 mt-2 mr-2 sm:mb-0 relative inline-flex items-center justify-center rounded-md border border-transparent bg-indigo-600 px-4 py-2 text-sm font-medium text-white shadow-xs hover:bg-indigo-700 focus:outline-hidden focus:ring-2 focus:ring-indigo-500 focus:ring-offset-2"
+          >
+            Download all sequencing submission files (.zip)
+          </button>
+        </a>,
+      );
     return retVal;
   } else if (field.type === "platethreshold" && record[field.field]) {
     return (